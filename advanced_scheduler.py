@@ -2,52 +2,83 @@
 """
 元大ETF爬蟲進階定時執行器
 使用APScheduler實現更靈活的排程功能
+
+多個排程可能在同一時間觸發 (例如週一上午9:00三個排程同時觸發)，
+抓取相同資料的排程以 work_key 合併：同一工作當天執行中或已成功時不再重複執行，
+並以跨行程執行鎖 (utils/run_lock.py) 避免與其他排程器或手動執行同時抓取
 """
 
-import os
 import sys
-import subprocess
-from datetime import datetime, time
+import threading
+from datetime import datetime
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
+from scraper_runner import YUANTA_WORK_KEY, create_runner
+from utils.env import env_int
 from utils.logger import setup_logger
+from utils.run_lock import create_run_lock
 
 class AdvancedETFScraperScheduler:
     """進階ETF爬蟲定時執行器"""
     
-    def __init__(self):
+    def __init__(self, run_mode: str = None):
         self.logger = setup_logger("advanced_scheduler", "logs/advanced_scheduler.log")
-        self.scraper_script = os.path.join(os.getcwd(), "yuanta_etf_scraper.py")
-        self.scheduler = BlockingScheduler()
+        # inprocess: 常駐共用連線與瀏覽器；subprocess: 每次啟動新行程 (見 scraper_runner.py)
+        self.runner = create_runner(run_mode, self.logger)
+        
+        # 同一排程不重疊執行，錯過的觸發合併為一次，延遲超過寬限秒數則放棄
+        self.scheduler = BlockingScheduler(job_defaults={
+            "max_instances": 1,
+            "coalesce": True,
+            "misfire_grace_time": env_int("SCHEDULER_MISFIRE_GRACE", 900)
+        })
+        
+        # 跨排程合併: 執行中的工作，以及當天已成功的工作與完成時間
+        self.coalesce_window = env_int("SCHEDULER_COALESCE_WINDOW", 3600)
+        self._active = set()
+        self._completed = {}
+        self._work_lock = threading.Lock()
+        
+    def _claim(self, work: tuple) -> bool:
+        """登記工作開始執行，相同工作執行中或剛成功時回傳 False"""
+        with self._work_lock:
+            if work in self._active:
+                self.logger.info(f"工作 {work[0]} ({work[1]}) 執行中，合併本次觸發")
+                return False
+            
+            finished_at = self._completed.get(work)
+            if finished_at and (datetime.now() - finished_at).total_seconds() < self.coalesce_window:
+                self.logger.info(f"工作 {work[0]} ({work[1]}) 已於 {finished_at:%H:%M:%S} 完成，略過本次觸發")
+                return False
+            
+            self._active.add(work)
+            return True
+    
+    def run_scraper(self, work_key: str = YUANTA_WORK_KEY):
+        """執行爬蟲，相同 work_key 的觸發當天只執行一次"""
+        work = (work_key, datetime.now().strftime('%Y-%m-%d'))
+        if not self._claim(work):
+            return
         
-    def run_scraper(self):
-        """執行爬蟲腳本"""
         try:
             self.logger.info("=" * 50)
             self.logger.info("開始執行元大ETF爬蟲...")
-            start_time = datetime.now()
-            
-            # 執行爬蟲腳本
-            result = subprocess.run([
-                sys.executable, self.scraper_script
-            ], capture_output=True, text=True, cwd=os.getcwd())
-            
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+            # 執行鎖交給 runner，爬蟲真正結束 (包含逾時後的收尾) 時才釋放
+            lock = create_run_lock(work_key)
+            if not lock.acquire():
+                self.logger.warning(f"其他行程正在執行 {work_key}，略過本次觸發")
+                return
             
-            if result.returncode == 0:
-                self.logger.info(f"✅ 爬蟲執行成功！耗時: {duration:.2f}秒")
-                if result.stdout:
-                    self.logger.info(f"輸出: {result.stdout}")
-            else:
-                self.logger.error(f"❌ 爬蟲執行失敗！返回碼: {result.returncode}")
-                if result.stderr:
-                    self.logger.error(f"錯誤: {result.stderr}")
+            if self.runner.run(lock):
+                with self._work_lock:
+                    self._completed[work] = datetime.now()
                     
         except Exception as e:
             self.logger.error(f"❌ 執行爬蟲時發生錯誤: {e}")
         finally:
+            with self._work_lock:
+                self._active.discard(work)
             self.logger.info("=" * 50)
     
     def setup_schedules(self):
@@ -56,6 +87,7 @@ class AdvancedETFScraperScheduler:
         # 選項1: 每日上午9:00執行
         self.scheduler.add_job(
             func=self.run_scraper,
+            kwargs={"work_key": YUANTA_WORK_KEY},
             trigger=CronTrigger(hour=9, minute=0),
             id='daily_9am',
             name='每日上午9:00執行ETF爬蟲',
@@ -65,6 +97,7 @@ class AdvancedETFScraperScheduler:
         # 選項2: 每週一上午9:00執行
         self.scheduler.add_job(
             func=self.run_scraper,
+            kwargs={"work_key": YUANTA_WORK_KEY},
             trigger=CronTrigger(day_of_week='mon', hour=9, minute=0),
             id='weekly_monday',
             name='每週一上午9:00執行ETF爬蟲',
@@ -74,6 +107,7 @@ class AdvancedETFScraperScheduler:
         # 選項3: 每週一、三、五上午9:00執行
         self.scheduler.add_job(
             func=self.run_scraper,
+            kwargs={"work_key": YUANTA_WORK_KEY},
             trigger=CronTrigger(day_of_week='mon,wed,fri', hour=9, minute=0),
             id='weekdays_9am',
             name='每週一、三、五上午9:00執行ETF爬蟲',
@@ -83,6 +117,7 @@ class AdvancedETFScraperScheduler:
         # 選項4: 每4小時執行一次 (測試用)
         # self.scheduler.add_job(
         #     func=self.run_scraper,
+        #     kwargs={"work_key": YUANTA_WORK_KEY},
         #     trigger=IntervalTrigger(hours=4),
         #     id='every_4_hours',
         #     name='每4小時執行ETF爬蟲',
@@ -114,10 +149,15 @@ class AdvancedETFScraperScheduler:
             self.logger.info("排程器已停止")
             print("\n⏹️ 排程器已停止")
             self.scheduler.shutdown()
+        finally:
+            self.runner.close()
 
 def main():
-    """主函數"""
-    scheduler = AdvancedETFScraperScheduler()
+    """主函數
+    
+    用法: python advanced_scheduler.py [--subprocess]
+    """
+    scheduler = AdvancedETFScraperScheduler("subprocess" if "--subprocess" in sys.argv else None)
     scheduler.run_scheduler()
 
 if __name__ == "__main__":
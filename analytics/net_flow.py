@@ -0,0 +1,126 @@
+"""
+個股 ETF 淨買賣估計
+以 holdings_changes (每檔ETF相鄰兩個快照的股數變動) 為來源，
+依 (日期, 股票) 一次分組加總所有ETF的股數增減，估計當日ETF合計的買超/賣超股數。
+提供收盤價檔時另外換算金額，結果寫入 stock_net_flows 供直接查詢。
+
+收盤價檔為 CSV，欄位：date,stock_code,close
+"""
+
+import sys
+from typing import List, Dict, Any, Optional
+import pandas as pd
+from models.etf_data import ETFDataManager
+from utils.logger import setup_logger
+
+NET_FLOW_COLUMNS = [
+    "date", "stock_code", "stock_name", "net_shares", "bought_shares", "sold_shares",
+    "buyers", "sellers", "close", "net_value"
+]
+
+def load_close_prices(path: str) -> pd.DataFrame:
+    """讀取收盤價檔 (date,stock_code,close)"""
+    prices = pd.read_csv(path, dtype={"stock_code": str, "date": str})
+    missing = {"date", "stock_code", "close"} - set(prices.columns)
+    if missing:
+        raise ValueError(f"收盤價檔缺少欄位: {', '.join(sorted(missing))}")
+    
+    prices["date"] = pd.to_datetime(prices["date"]).dt.strftime("%Y-%m-%d")
+    return prices[["date", "stock_code", "close"]].drop_duplicates(["date", "stock_code"], keep="last")
+
+def compute_net_flows(changes: pd.DataFrame, prices: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """依 (日期, 股票) 加總所有ETF的股數變動，prices 提供時換算淨買賣金額"""
+    if changes.empty:
+        return pd.DataFrame(columns=NET_FLOW_COLUMNS)
+    
+    delta = changes["shares_delta"]
+    frame = changes.assign(
+        bought_shares=delta.clip(lower=0),
+        sold_shares=(-delta).clip(lower=0),
+        buyers=(delta > 0).astype("int64"),
+        sellers=(delta < 0).astype("int64")
+    )
+    
+    flows = frame.groupby(["date", "stock_code"], sort=True).agg(
+        stock_name=("stock_name", "last"),
+        net_shares=("shares_delta", "sum"),
+        bought_shares=("bought_shares", "sum"),
+        sold_shares=("sold_shares", "sum"),
+        buyers=("buyers", "sum"),
+        sellers=("sellers", "sum")
+    ).reset_index()
+    
+    if prices is not None:
+        flows = flows.merge(prices, on=["date", "stock_code"], how="left")
+        flows["net_value"] = flows["net_shares"] * flows["close"]
+    else:
+        flows["close"] = float("nan")
+        flows["net_value"] = float("nan")
+    
+    return flows[NET_FLOW_COLUMNS]
+
+class NetFlowEngine:
+    """ETF 合計淨買賣批次計算"""
+    
+    def __init__(self, etf_manager: ETFDataManager = None):
+        self.logger = setup_logger("net_flow", "logs/analytics.log")
+        self.etf_manager = etf_manager or ETFDataManager()
+    
+    def compute(self, start_date: str, end_date: str = None, price_file: str = None,
+                save: bool = True) -> pd.DataFrame:
+        """計算日期區間內每檔股票每日的ETF合計淨買賣，預設寫入 stock_net_flows"""
+        end_date = end_date or start_date
+        changes = pd.DataFrame(
+            list(self.etf_manager.iter_holdings_changes(start_date=start_date, end_date=end_date)),
+            columns=["date", "stock_code", "stock_name", "shares_delta"]
+        )
+        prices = load_close_prices(price_file) if price_file else None
+        flows = compute_net_flows(changes, prices)
+        
+        if save:
+            saved = set()
+            for date, daily in flows.groupby("date"):
+                # 缺少收盤價的欄位以 None 寫入
+                daily = daily.drop(columns="date")
+                records = daily.astype(object).where(daily.notna(), None).to_dict("records")
+                self.etf_manager.save_stock_net_flows(date, records)
+                saved.add(date)
+            
+            # 區間內有持股但已沒有任何變動的日期 (例如重寫後與前一日相同)，清除先前算出的結果
+            for date in self.etf_manager.get_holdings_dates(start_date, end_date):
+                if date not in saved:
+                    self.etf_manager.save_stock_net_flows(date, [])
+        
+        self.logger.info(f"淨買賣計算完成: {start_date} ~ {end_date}, 共 {len(flows)} 筆")
+        return flows
+    
+    def top(self, date: str, limit: int = 20, by: str = "net_shares") -> Dict[str, List[Dict[str, Any]]]:
+        """取得指定日期ETF合計買超與賣超前幾名"""
+        flows = self.etf_manager.get_stock_net_flows(start_date=date, end_date=date)
+        flows = [flow for flow in flows if flow.get(by) is not None]
+        flows.sort(key=lambda flow: flow[by])
+        return {
+            "buy": [flow for flow in reversed(flows[-limit:]) if flow[by] > 0],
+            "sell": [flow for flow in flows[:limit] if flow[by] < 0]
+        }
+
+def main():
+    """計算指定日期 (預設最新日期) 的ETF合計淨買賣
+    
+    用法: python -m analytics.net_flow [開始日期] [結束日期] [收盤價檔]
+    """
+    engine = NetFlowEngine()
+    args = sys.argv[1:]
+    start_date = args[0] if len(args) > 0 else engine.etf_manager.get_latest_date()
+    end_date = args[1] if len(args) > 1 else start_date
+    price_file = args[2] if len(args) > 2 else None
+    
+    if not start_date:
+        print("沒有持股資料")
+        return
+    
+    flows = engine.compute(start_date, end_date, price_file)
+    print(f"淨買賣計算完成: {start_date} ~ {end_date}, 共 {len(flows)} 筆")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+ETF 持股重疊分析
+將一天的持股快照建成 ETF×股票 的稀疏權重矩陣 (CSR)，以矩陣運算一次算出所有ETF兩兩之間的：
+
+- overlap: 加權重疊度 Σ min(w_i, w_j)，單位與權重相同 (%)
+- cosine: 權重向量的餘弦相似度
+- common_count: 共同持有的股票檔數
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from models.etf_data import ETFDataManager
+from utils.cache import TTLCache
+from utils.env import env_float, env_int
+from utils.logger import setup_logger
+
+def build_weight_matrix(holdings) -> Dict[str, Any]:
+    """由持股資料建立 ETF×股票 稀疏權重矩陣
+    
+    回傳 {"matrix": csr_matrix, "etf_tickers": [...], "stock_codes": [...]}，
+    矩陣的列、欄順序分別對應 etf_tickers、stock_codes
+    """
+    etf_index: Dict[str, int] = {}
+    stock_index: Dict[str, int] = {}
+    rows, cols, weights = [], [], []
+    
+    for holding in holdings:
+        rows.append(etf_index.setdefault(holding['etf_ticker'], len(etf_index)))
+        cols.append(stock_index.setdefault(holding['stock_code'], len(stock_index)))
+        weights.append(holding.get('weight') or 0.0)
+    
+    # 同一ETF重複列出的股票權重相加
+    matrix = sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float64),
+         (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+        shape=(len(etf_index), len(stock_index))
+    )
+    matrix.sum_duplicates()
+    
+    return {
+        "matrix": matrix,
+        "etf_tickers": list(etf_index),
+        "stock_codes": list(stock_index)
+    }
+
+def min_overlap(matrix: sparse.csr_matrix) -> np.ndarray:
+    """計算所有列兩兩之間的 Σ min(w_i, w_j)
+    
+    以欄 (股票) 為單位處理：同一欄內依權重由大到小排序後，
+    排在後面的權重就是它與前面每一列配對的較小值
+    """
+    n = matrix.shape[0]
+    csc = matrix.tocsc()
+    pair_rows, pair_cols, pair_values = [], [], []
+    
+    for k in range(csc.shape[1]):
+        start, end = csc.indptr[k], csc.indptr[k + 1]
+        if end - start < 2:
+            continue
+        
+        order = np.argsort(-csc.data[start:end], kind="stable")
+        etfs = csc.indices[start:end][order]
+        weights = csc.data[start:end][order]
+        
+        upper, lower = np.triu_indices(len(etfs), k=1)
+        pair_rows.append(etfs[upper])
+        pair_cols.append(etfs[lower])
+        pair_values.append(weights[lower])
+    
+    if not pair_rows:
+        overlap = np.zeros((n, n))
+    else:
+        # coo 轉換時會把相同 (i, j) 的值相加
+        overlap = sparse.coo_matrix(
+            (np.concatenate(pair_values), (np.concatenate(pair_rows), np.concatenate(pair_cols))),
+            shape=(n, n)
+        ).toarray()
+        overlap = overlap + overlap.T
+    
+    # 對角線為ETF本身的權重總和
+    overlap[np.diag_indices(n)] = np.asarray(matrix.sum(axis=1)).ravel()
+    return overlap
+
+def cosine_similarity(matrix: sparse.csr_matrix) -> np.ndarray:
+    """計算所有列兩兩之間的餘弦相似度"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = sparse.diags(1.0 / norms) @ matrix
+    return (normalized @ normalized.T).toarray()
+
+def common_count(matrix: sparse.csr_matrix) -> np.ndarray:
+    """計算所有列兩兩之間共同持有的股票檔數"""
+    binary = (matrix > 0).astype(np.int32)
+    return (binary @ binary.T).toarray()
+
+class OverlapEngine:
+    """ETF 持股重疊計算，結果依日期與持股寫入版本快取，寫入 (含其他程序的強制重寫) 後自動重算"""
+    
+    METRICS = ("overlap", "cosine", "common_count")
+    
+    def __init__(self, etf_manager: ETFDataManager = None, cache_size: int = None, cache_ttl: float = None):
+        self.logger = setup_logger("overlap", "logs/analytics.log")
+        self.etf_manager = etf_manager or ETFDataManager()
+        
+        if cache_size is None:
+            cache_size = env_int("ANALYTICS_CACHE_SIZE", 32)
+        if cache_ttl is None:
+            cache_ttl = env_float("ANALYTICS_CACHE_TTL", 3600.0)
+        self.cache = TTLCache(cache_size, cache_ttl)
+    
+    def compute(self, date: str, etf_tickers: List[str] = None) -> Optional[Dict[str, Any]]:
+        """計算指定日期所有ETF兩兩之間的重疊，etf_tickers 可限定部分ETF"""
+        result = self.cache.get_or_load(self._cache_key(date), lambda: self._compute(date), cache_none=False)
+        if result is None or not etf_tickers:
+            return result
+        
+        index = [result["etf_tickers"].index(ticker) for ticker in etf_tickers if ticker in result["etf_tickers"]]
+        subset = {"date": date, "etf_tickers": [result["etf_tickers"][i] for i in index]}
+        for metric in self.METRICS:
+            subset[metric] = result[metric][np.ix_(index, index)]
+        return subset
+    
+    def _cache_key(self, date: str) -> Tuple[str, str, Optional[str]]:
+        """快取鍵包含持股寫入版本，資料被寫入或重寫後舊結果不再命中"""
+        return ("overlap", date, self.etf_manager.get_holdings_version())
+    
+    def _compute(self, date: str) -> Optional[Dict[str, Any]]:
+        """讀取持股並計算重疊"""
+        try:
+            built = build_weight_matrix(self.etf_manager.iter_holdings_by_date(date))
+            if not built["etf_tickers"]:
+                self.logger.warning(f"{date} 沒有持股資料")
+                return None
+            
+            matrix = built["matrix"]
+            result = {
+                "date": date,
+                "etf_tickers": built["etf_tickers"],
+                "overlap": min_overlap(matrix),
+                "cosine": cosine_similarity(matrix),
+                "common_count": common_count(matrix)
+            }
+            self.logger.info(f"{date} 重疊計算完成: {matrix.shape[0]} 檔ETF, {matrix.shape[1]} 檔股票")
+            return result
+        
+        except Exception as e:
+            self.logger.error(f"計算 {date} 持股重疊失敗: {e}")
+            return None
+    
+    def invalidate(self, date: str):
+        """移除指定日期的快取結果"""
+        self.cache.invalidate(self._cache_key(date))
+    
+    def to_frame(self, date: str, metric: str = "overlap") -> pd.DataFrame:
+        """以 DataFrame 回傳指定指標的 ETF×ETF 矩陣"""
+        if metric not in self.METRICS:
+            raise ValueError(f"未知的指標: {metric}，可用: {', '.join(self.METRICS)}")
+        
+        result = self.compute(date)
+        if result is None:
+            return pd.DataFrame()
+        return pd.DataFrame(result[metric], index=result["etf_tickers"], columns=result["etf_tickers"])
+    
+    def top_pairs(self, date: str, metric: str = "overlap", limit: int = 20) -> List[Dict[str, Any]]:
+        """取得指定指標最高的ETF配對"""
+        if metric not in self.METRICS:
+            raise ValueError(f"未知的指標: {metric}，可用: {', '.join(self.METRICS)}")
+        
+        result = self.compute(date)
+        if result is None:
+            return []
+        
+        tickers = result["etf_tickers"]
+        upper, lower = np.triu_indices(len(tickers), k=1)
+        values = result[metric][upper, lower]
+        order = np.argsort(-values, kind="stable")[:limit]
+        
+        return [
+            {
+                "etf_a": tickers[upper[i]],
+                "etf_b": tickers[lower[i]],
+                "overlap": float(result["overlap"][upper[i], lower[i]]),
+                "cosine": float(result["cosine"][upper[i], lower[i]]),
+                "common_count": int(result["common_count"][upper[i], lower[i]])
+            }
+            for i in order
+        ]
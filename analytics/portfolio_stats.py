@@ -0,0 +1,115 @@
+"""
+ETF 每日投資組合統計
+每個寫入成功的快照在寫入當下計算一次，存入 etf_daily_stats (每檔ETF每日一筆)：
+
+- constituent_count / weight_sum / max_weight / top10_weight: 由當日持股直接計算
+- hhi: 集中度 Σ (w/100)²
+- adds / drops / count_change / turnover: 由當日相對前一個快照的調倉紀錄計算，
+  turnover 為 ½ Σ |weight_delta|，只計入股數有變動的股票 (不含單純股價造成的權重漂移)
+- hhi_change: 相對前一日統計值的變化
+"""
+
+import sys
+from itertools import groupby
+from typing import List, Dict, Any, Iterable
+import numpy as np
+from analytics.rebalance import CHANGE_ADD, CHANGE_DROP, diff_holdings
+from models.etf_data import ETFDataManager
+from models.holdings_validator import WEIGHT_SUM_TOLERANCE
+from utils.logger import setup_logger
+
+# 重建時每累積多少筆統計寫入一次
+REBUILD_BATCH_SIZE = 500
+
+def snapshot_stats(holdings: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """由單日持股計算權重相關統計"""
+    weights = np.fromiter((holding.get('weight') or 0.0 for holding in holdings), dtype=np.float64)
+    weight_sum = float(weights.sum())
+    top = np.partition(weights, len(weights) - 10)[-10:] if len(weights) > 10 else weights
+    
+    return {
+        "constituent_count": int(len(weights)),
+        "weight_sum": weight_sum,
+        "weight_sum_ok": bool(abs(weight_sum - 100.0) <= WEIGHT_SUM_TOLERANCE),
+        "max_weight": float(weights.max()) if len(weights) else 0.0,
+        "top10_weight": float(top.sum()),
+        "hhi": float(np.square(weights / 100.0).sum())
+    }
+
+def build_daily_stats(etf_ticker: str, date: str, holdings: List[Dict[str, Any]], previous_date: str = None,
+                      changes: List[Dict[str, Any]] = None, previous: Dict[str, Any] = None) -> Dict[str, Any]:
+    """組成一檔ETF單日的統計，changes 為相對 previous_date 的調倉紀錄，previous 為前一日的統計"""
+    stats = dict(snapshot_stats(holdings), etf_ticker=etf_ticker, date=date, previous_date=previous_date)
+    
+    if changes is None:
+        stats.update(adds=None, drops=None, count_change=None, turnover=None)
+    else:
+        adds = sum(1 for change in changes if change['change_type'] == CHANGE_ADD)
+        drops = sum(1 for change in changes if change['change_type'] == CHANGE_DROP)
+        stats.update(
+            adds=adds,
+            drops=drops,
+            count_change=adds - drops,
+            turnover=0.5 * sum(abs(change['weight_delta']) for change in changes)
+        )
+    
+    stats["hhi_change"] = stats["hhi"] - previous["hhi"] if previous else None
+    return stats
+
+class PortfolioStatsEngine:
+    """依歷史持股重建每日統計"""
+    
+    def __init__(self, etf_manager: ETFDataManager = None):
+        self.logger = setup_logger("portfolio_stats", "logs/analytics.log")
+        self.etf_manager = etf_manager or ETFDataManager()
+    
+    def rebuild(self, etf_ticker: str, start_date: str = None, end_date: str = None) -> int:
+        """重建一檔ETF的 etf_daily_stats，回傳寫入的日數"""
+        rebuilt = 0
+        pending = []
+        newer = None
+        history = self.etf_manager.iter_holdings_history(etf_ticker, start_date, end_date)
+        
+        # 歷史資料依日期由新到舊，較新一日的統計等讀到前一日後才能完成
+        for date, holdings in groupby(history, key=lambda holding: holding['date']):
+            older = {"date": date, "holdings": list(holdings)}
+            older["stats"] = build_daily_stats(etf_ticker, date, older["holdings"])
+            if newer is not None:
+                changes = diff_holdings(older["holdings"], newer["holdings"])
+                pending.append(build_daily_stats(etf_ticker, newer["date"], newer["holdings"],
+                                                 date, changes, older["stats"]))
+            newer = older
+            
+            if len(pending) >= REBUILD_BATCH_SIZE:
+                rebuilt += self._save(pending)
+                pending = []
+        
+        # 最舊的一日沒有前一個快照可比對
+        if newer is not None:
+            pending.append(newer["stats"])
+        rebuilt += self._save(pending)
+        
+        self.logger.info(f"ETF {etf_ticker} 每日統計重建完成: {rebuilt} 日")
+        return rebuilt
+    
+    def _save(self, stats: List[Dict[str, Any]]) -> int:
+        """寫入一批統計，回傳成功筆數"""
+        if not stats:
+            return 0
+        return len(stats) if self.etf_manager.save_etf_daily_stats(stats) else 0
+
+def main():
+    """重建指定ETF (預設為所有有持股資料的ETF) 的每日統計
+    
+    用法: python -m analytics.portfolio_stats [ETF代號...]
+    """
+    engine = PortfolioStatsEngine()
+    # etfs 集合不一定有資料 (爬蟲只寫入持股)，預設清單取自持股摘要
+    tickers = sys.argv[1:] or sorted(row['etf_ticker'] for row in engine.etf_manager.get_holdings_summary())
+    
+    for ticker in tickers:
+        rebuilt = engine.rebuild(ticker)
+        print(f"{ticker}: {rebuilt} 日")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+ETF 調倉比對
+比較兩個快照的持股，一次 outer merge 算出所有ETF的新增、剔除與股數增減：
+
+- add: 新納入的股票
+- drop: 被剔除的股票
+- increase / decrease: 股數增加或減少
+- unchanged: 股數不變 (權重仍可能因股價變動)
+"""
+
+from itertools import groupby
+from typing import List, Dict, Any, Iterable
+import numpy as np
+import pandas as pd
+from models.etf_data import ETFDataManager
+from utils.logger import setup_logger
+
+CHANGE_ADD = "add"
+CHANGE_DROP = "drop"
+CHANGE_INCREASE = "increase"
+CHANGE_DECREASE = "decrease"
+CHANGE_UNCHANGED = "unchanged"
+
+DIFF_KEYS = ["etf_ticker", "stock_code"]
+DIFF_VALUES = ["stock_name", "weight", "shares"]
+
+DIFF_COLUMNS = [
+    "etf_ticker", "stock_code", "stock_name", "change_type",
+    "shares_before", "shares_after", "shares_delta",
+    "weight_before", "weight_after", "weight_delta"
+]
+
+def holdings_frame(holdings: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """將持股資料轉為比對用的 DataFrame"""
+    frame = pd.DataFrame(list(holdings), columns=DIFF_KEYS + DIFF_VALUES)
+    frame["weight"] = frame["weight"].astype(float)
+    frame["shares"] = frame["shares"].astype("int64")
+    return frame
+
+def diff_frames(previous: pd.DataFrame, current: pd.DataFrame, include_unchanged: bool = False) -> pd.DataFrame:
+    """比對兩個快照，只比較兩邊都有資料的ETF，避免某天缺資料被當成整檔剔除"""
+    common = set(previous["etf_ticker"]) & set(current["etf_ticker"])
+    previous = previous[previous["etf_ticker"].isin(common)]
+    current = current[current["etf_ticker"].isin(common)]
+    
+    merged = previous.merge(current, on=DIFF_KEYS, how="outer", suffixes=("_before", "_after"), indicator=True)
+    
+    shares_before = merged["shares_before"].fillna(0).astype("int64")
+    shares_after = merged["shares_after"].fillna(0).astype("int64")
+    weight_before = merged["weight_before"].fillna(0.0)
+    weight_after = merged["weight_after"].fillna(0.0)
+    shares_delta = shares_after - shares_before
+    
+    change_type = np.select(
+        [
+            merged["_merge"] == "right_only",
+            merged["_merge"] == "left_only",
+            shares_delta > 0,
+            shares_delta < 0
+        ],
+        [CHANGE_ADD, CHANGE_DROP, CHANGE_INCREASE, CHANGE_DECREASE],
+        default=CHANGE_UNCHANGED
+    )
+    
+    result = pd.DataFrame({
+        "etf_ticker": merged["etf_ticker"],
+        "stock_code": merged["stock_code"],
+        "stock_name": merged["stock_name_after"].fillna(merged["stock_name_before"]),
+        "change_type": change_type,
+        "shares_before": shares_before,
+        "shares_after": shares_after,
+        "shares_delta": shares_delta,
+        "weight_before": weight_before,
+        "weight_after": weight_after,
+        "weight_delta": weight_after - weight_before
+    }, columns=DIFF_COLUMNS)
+    
+    if not include_unchanged:
+        result = result[result["change_type"] != CHANGE_UNCHANGED]
+    
+    return result.sort_values(["etf_ticker", "weight_delta"], ascending=[True, False]).reset_index(drop=True)
+
+def diff_holdings(previous: Iterable[Dict[str, Any]], current: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """比對兩組持股資料，回傳有變動的股票"""
+    return diff_frames(holdings_frame(previous), holdings_frame(current)).to_dict("records")
+
+class RebalanceEngine:
+    """ETF 調倉比對與歷史變動重建"""
+    
+    def __init__(self, etf_manager: ETFDataManager = None):
+        self.logger = setup_logger("rebalance", "logs/analytics.log")
+        self.etf_manager = etf_manager or ETFDataManager()
+    
+    def diff(self, previous_date: str, date: str, etf_tickers: List[str] = None,
+             include_unchanged: bool = False) -> pd.DataFrame:
+        """比對兩個日期所有ETF的持股"""
+        previous = holdings_frame(self.etf_manager.iter_holdings_by_date(previous_date))
+        current = holdings_frame(self.etf_manager.iter_holdings_by_date(date))
+        if etf_tickers:
+            previous = previous[previous["etf_ticker"].isin(etf_tickers)]
+            current = current[current["etf_ticker"].isin(etf_tickers)]
+        
+        result = diff_frames(previous, current, include_unchanged)
+        result.insert(1, "date", date)
+        result.insert(2, "previous_date", previous_date)
+        return result
+    
+    def rebuild(self, etf_ticker: str, start_date: str = None, end_date: str = None) -> int:
+        """依歷史持股重建一檔ETF的 holdings_changes，回傳寫入的日數"""
+        rebuilt = 0
+        newer = None
+        history = self.etf_manager.iter_holdings_history(etf_ticker, start_date, end_date)
+        
+        # 歷史資料依日期由新到舊，相鄰兩日兩兩比對
+        for date, holdings in groupby(history, key=lambda holding: holding['date']):
+            older = (date, list(holdings))
+            if newer is not None:
+                changes = diff_holdings(older[1], newer[1])
+                if self.etf_manager.save_holdings_changes(etf_ticker, newer[0], older[0], changes):
+                    rebuilt += 1
+            newer = older
+        
+        self.logger.info(f"ETF {etf_ticker} 調倉紀錄重建完成: {rebuilt} 日")
+        return rebuilt
@@ -0,0 +1,373 @@
+"""
+持股權重方塊 (日期 × ETF × 股票)
+把歷史持股存成兩個 memory-mapped 的稠密陣列，權重為 float32、股數為 int64：
+    
+    <root>/meta.json     日期、ETF代號、股票代號的整數編號與各軸容量
+    <root>/weights.bin   C-order，shape = (日期容量, ETF容量, 股票容量)
+    <root>/shares.bin
+
+新日期依序附加在日期軸尾端，ETF與股票軸預留容量，不夠時才整檔擴充。
+讀取依日期區間、單檔ETF或單檔股票切片，回傳的都是 memmap 的唯讀 view，不會複製資料。
+
+多個寫入程序 (例如多個 worker 與歷史回填) 以 <root>/writer.lock 檔案鎖互斥，
+取得鎖後若 meta.json 已被其他程序更新會先重新載入。寫入先更新陣列再原子替換 meta.json，
+中斷時尚未記錄在 meta.json 的資料會被忽略。
+"""
+
+import bisect
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config.database import get_weight_cube_dir
+from utils.logger import setup_logger
+from utils.run_lock import FileRunLock
+
+CUBE_FIELDS = {
+    "weights": np.float32,
+    "shares": np.int64,
+}
+
+# 方塊欄位對應的持股欄位
+CUBE_COLUMNS = {
+    "weights": "weight",
+    "shares": "shares",
+}
+
+# 各軸容量不足時一次擴充的大小
+DATE_BLOCK = 32
+ETF_BLOCK = 64
+STOCK_BLOCK = 512
+
+def _round_up(value: int, block: int) -> int:
+    """向上取整到 block 的倍數"""
+    return max(block, -(-value // block) * block)
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    """回傳唯讀 view，避免呼叫端改到檔案內容"""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+class WeightCube:
+    """以 memmap 保存的 日期×ETF×股票 權重與股數方塊"""
+    
+    def __init__(self, root_dir: str = None, etf_manager=None):
+        self.logger = setup_logger("weight_cube", "logs/analytics.log")
+        self.root_dir = root_dir or get_weight_cube_dir()
+        self._etf_manager = etf_manager
+        self._lock = threading.RLock()
+        self._writer = FileRunLock("writer", self.root_dir)
+        self._writer_depth = 0
+        
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._load()
+    
+    @property
+    def etf_manager(self):
+        """需要從儲存後端讀取時才建立 ETFDataManager"""
+        if self._etf_manager is None:
+            from models.etf_data import ETFDataManager
+            self._etf_manager = ETFDataManager()
+        return self._etf_manager
+    
+    # ==================== 檔案與編號 ====================
+    
+    def _path(self, name: str) -> str:
+        """取得方塊內檔案路徑"""
+        return os.path.join(self.root_dir, name)
+    
+    def _meta_stamp(self) -> Optional[Tuple[int, int]]:
+        """meta.json 的 (inode, 修改時間)，用來判斷是否被其他程序替換"""
+        try:
+            stat = os.stat(self._path("meta.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+    
+    def _load(self):
+        """讀取 meta.json 並開啟 memmap"""
+        meta_path = self._path("meta.json")
+        self._loaded_stamp = self._meta_stamp()
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        
+        self.dates: List[str] = meta.get("dates", [])
+        self.etf_tickers: List[str] = meta.get("etf_tickers", [])
+        self.stock_codes: List[str] = meta.get("stock_codes", [])
+        self.capacity: Tuple[int, int, int] = tuple(meta.get("capacity", (0, 0, 0)))
+        
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        self.etf_index = {ticker: i for i, ticker in enumerate(self.etf_tickers)}
+        self.stock_index = {code: i for i, code in enumerate(self.stock_codes)}
+        
+        self._arrays: Dict[str, np.ndarray] = {}
+        if all(self.capacity):
+            for field in CUBE_FIELDS:
+                self._arrays[field] = self._open(field, self.capacity)
+    
+    def _open(self, field: str, shape: Tuple[int, int, int], path: str = None) -> np.memmap:
+        """以讀寫模式開啟陣列檔"""
+        return np.memmap(path or self._path(f"{field}.bin"), dtype=CUBE_FIELDS[field], mode="r+", shape=shape)
+    
+    def _allocate(self, field: str, shape: Tuple[int, int, int], path: str):
+        """配置 (或延伸) 陣列檔，以 sparse file 配置，未寫入的區段不佔磁碟空間"""
+        size = int(np.prod(shape)) * np.dtype(CUBE_FIELDS[field]).itemsize
+        with open(path, "ab") as f:
+            f.truncate(size)
+    
+    def _save_meta(self):
+        """先寫暫存檔再改名，讀取端不會看到寫到一半的 meta.json"""
+        meta = {
+            "dates": self.dates,
+            "etf_tickers": self.etf_tickers,
+            "stock_codes": self.stock_codes,
+            "capacity": list(self.capacity)
+        }
+        tmp_path = self._path(".meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path("meta.json"))
+        self._loaded_stamp = self._meta_stamp()
+    
+    def _ensure_capacity(self, dates: int, etfs: int, stocks: int):
+        """容量不足時擴充陣列檔
+        
+        只有日期軸不足時，在檔尾延伸 (C-order 下既有資料位置不變)；
+        ETF或股票軸不足時，建立新檔複製已使用的區段後替換
+        """
+        capacity = (
+            max(self.capacity[0], _round_up(dates, DATE_BLOCK)),
+            max(self.capacity[1], _round_up(etfs, ETF_BLOCK)),
+            max(self.capacity[2], _round_up(stocks, STOCK_BLOCK))
+        )
+        if capacity == self.capacity:
+            return
+        
+        # 新編號已先配發，複製範圍以舊容量為上限
+        used = tuple(min(n, c) for n, c in zip((len(self.dates), len(self.etf_tickers), len(self.stock_codes)),
+                                               self.capacity))
+        for field in CUBE_FIELDS:
+            path = self._path(f"{field}.bin")
+            old = self._arrays.get(field)
+            
+            if old is None or capacity[1:] == self.capacity[1:]:
+                self._allocate(field, capacity, path)
+            else:
+                tmp_path = self._path(f".{field}.bin.tmp")
+                self._allocate(field, capacity, tmp_path)
+                resized = self._open(field, capacity, tmp_path)
+                resized[:used[0], :used[1], :used[2]] = old[:used[0], :used[1], :used[2]]
+                resized.flush()
+                del resized
+                os.replace(tmp_path, path)
+            
+            self._arrays[field] = self._open(field, capacity)
+        
+        self.logger.info(f"權重方塊擴充容量: {self.capacity} -> {capacity}")
+        self.capacity = capacity
+    
+    def _assign_ids(self, etf_tickers: Iterable[str], stock_codes: Iterable[str]):
+        """為新出現的ETF與股票配發編號"""
+        for ticker in etf_tickers:
+            if ticker not in self.etf_index:
+                self.etf_index[ticker] = len(self.etf_tickers)
+                self.etf_tickers.append(ticker)
+        for code in stock_codes:
+            if code not in self.stock_index:
+                self.stock_index[code] = len(self.stock_codes)
+                self.stock_codes.append(code)
+    
+    # ==================== 寫入 ====================
+    
+    @contextmanager
+    def _writing(self):
+        """持有跨程序寫入鎖 (可重入)，取得時載入其他程序寫入後的 meta.json"""
+        with self._lock:
+            if self._writer_depth == 0:
+                if not self._writer.acquire(blocking=True):
+                    raise OSError(f"無法取得寫入鎖 {self._writer.path}")
+                if self._meta_stamp() != self._loaded_stamp:
+                    self._load()
+            self._writer_depth += 1
+            try:
+                yield
+            finally:
+                self._writer_depth -= 1
+                if self._writer_depth == 0:
+                    self._writer.release()
+    
+    def _write(self, date: str, holdings: List[Dict[str, Any]], replace_date: bool) -> bool:
+        """寫入持股，replace_date 時清空整個日期，否則只清空出現的ETF"""
+        with self._writing():
+            if date not in self.date_index and self.dates and date < self.dates[-1]:
+                self.logger.warning(f"{date} 早於權重方塊最後日期 {self.dates[-1]}，需以 rebuild 重建")
+                return False
+            
+            frame = pd.DataFrame(holdings, columns=["etf_ticker", "stock_code", "weight", "shares"])
+            self._assign_ids(frame["etf_ticker"].unique(), frame["stock_code"].unique())
+            
+            if date not in self.date_index:
+                self.date_index[date] = len(self.dates)
+                self.dates.append(date)
+            self._ensure_capacity(len(self.dates), len(self.etf_tickers), len(self.stock_codes))
+            
+            d = self.date_index[date]
+            rows = frame["etf_ticker"].map(self.etf_index).to_numpy(dtype=np.int64)
+            cols = frame["stock_code"].map(self.stock_index).to_numpy(dtype=np.int64)
+            
+            for field, dtype in CUBE_FIELDS.items():
+                plane = self._arrays[field][d]
+                if replace_date:
+                    plane[:] = 0
+                else:
+                    plane[np.unique(rows)] = 0
+                
+                # 同一ETF重複列出的股票數值相加
+                values = frame[CUBE_COLUMNS[field]].fillna(0).to_numpy(dtype=dtype)
+                np.add.at(plane, (rows, cols), values)
+                self._arrays[field].flush()
+            
+            self._save_meta()
+            return True
+    
+    def write_snapshot(self, etf_ticker: str, date: str, holdings: List[Dict[str, Any]]) -> bool:
+        """寫入 (或取代) 一檔ETF單日的持股"""
+        try:
+            holdings = [dict(holding, etf_ticker=etf_ticker) for holding in holdings]
+            return self._write(date, holdings, replace_date=False)
+        except Exception as e:
+            self.logger.error(f"權重方塊寫入失敗 {etf_ticker} - {date}: {e}")
+            self._load()
+            return False
+    
+    def append_date(self, date: str, holdings: Iterable[Dict[str, Any]]) -> bool:
+        """寫入 (或取代) 一整天所有ETF的持股"""
+        try:
+            return self._write(date, list(holdings), replace_date=True)
+        except Exception as e:
+            self.logger.error(f"權重方塊寫入 {date} 失敗: {e}")
+            self._load()
+            return False
+    
+    def sync(self, end_date: str = None) -> int:
+        """從儲存後端附加方塊最後日期之後的新日期，回傳附加的日數"""
+        appended = 0
+        with self._writing():
+            start_date = self.dates[-1] if self.dates else None
+            for date in self.etf_manager.get_holdings_dates(start_date, end_date):
+                if date in self.date_index:
+                    continue
+                if self.append_date(date, self.etf_manager.iter_holdings_by_date(date)):
+                    appended += 1
+        
+        self.logger.info(f"權重方塊同步完成: 附加 {appended} 日, 共 {len(self.dates)} 日")
+        return appended
+    
+    def rebuild(self, start_date: str = None, end_date: str = None) -> int:
+        """清空方塊後從儲存後端重建，回傳寫入的日數"""
+        rebuilt = 0
+        with self._writing():
+            self._arrays.clear()
+            for name in ["meta.json"] + [f"{field}.bin" for field in CUBE_FIELDS]:
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._load()
+            
+            for date in self.etf_manager.get_holdings_dates(start_date, end_date):
+                if self.append_date(date, self.etf_manager.iter_holdings_by_date(date)):
+                    rebuilt += 1
+        
+        self.logger.info(f"權重方塊重建完成: {rebuilt} 日")
+        return rebuilt
+    
+    # ==================== 讀取 ====================
+    
+    def _date_range(self, start_date: str = None, end_date: str = None) -> slice:
+        """將日期區間轉為日期軸的切片"""
+        start = bisect.bisect_left(self.dates, start_date) if start_date else 0
+        end = bisect.bisect_right(self.dates, end_date) if end_date else len(self.dates)
+        return slice(start, end)
+    
+    def _field(self, field: str) -> np.ndarray:
+        """取得已使用範圍的陣列"""
+        if field not in CUBE_FIELDS:
+            raise ValueError(f"未知的欄位: {field}，可用: {', '.join(CUBE_FIELDS)}")
+        array = self._arrays.get(field)
+        if array is None:
+            return np.zeros((0, 0, 0), dtype=CUBE_FIELDS[field])
+        return array[:len(self.dates), :len(self.etf_tickers), :len(self.stock_codes)]
+    
+    def view(self, field: str = "weights", start_date: str = None,
+             end_date: str = None) -> Dict[str, Any]:
+        """取得日期區間的 日期×ETF×股票 唯讀 view 與各軸標籤"""
+        dates = self._date_range(start_date, end_date)
+        return {
+            "values": _readonly(self._field(field)[dates]),
+            "dates": self.dates[dates],
+            "etf_tickers": list(self.etf_tickers),
+            "stock_codes": list(self.stock_codes)
+        }
+    
+    def etf_slice(self, etf_ticker: str, field: str = "weights", start_date: str = None,
+                  end_date: str = None) -> Optional[np.ndarray]:
+        """取得一檔ETF的 日期×股票 唯讀 view"""
+        e = self.etf_index.get(etf_ticker)
+        if e is None:
+            return None
+        return _readonly(self._field(field)[self._date_range(start_date, end_date), e, :])
+    
+    def stock_slice(self, stock_code: str, field: str = "weights", start_date: str = None,
+                    end_date: str = None) -> Optional[np.ndarray]:
+        """取得一檔股票的 日期×ETF 唯讀 view"""
+        s = self.stock_index.get(stock_code)
+        if s is None:
+            return None
+        return _readonly(self._field(field)[self._date_range(start_date, end_date), :, s])
+    
+    def trajectory(self, etf_ticker: str, stock_code: str, field: str = "weights",
+                   start_date: str = None, end_date: str = None) -> Optional[np.ndarray]:
+        """取得一檔ETF持有一檔股票的逐日數值 (唯讀 view)"""
+        e, s = self.etf_index.get(etf_ticker), self.stock_index.get(stock_code)
+        if e is None or s is None:
+            return None
+        return _readonly(self._field(field)[self._date_range(start_date, end_date), e, s])
+    
+    def etf_frame(self, etf_ticker: str, field: str = "weights", start_date: str = None,
+                  end_date: str = None) -> pd.DataFrame:
+        """以 DataFrame 回傳一檔ETF的 日期×股票 數值，只保留曾經持有的股票"""
+        values = self.etf_slice(etf_ticker, field, start_date, end_date)
+        if values is None:
+            return pd.DataFrame()
+        
+        held = np.flatnonzero(values.any(axis=0))
+        return pd.DataFrame(values[:, held], index=self.dates[self._date_range(start_date, end_date)],
+                            columns=[self.stock_codes[i] for i in held])
+
+def main():
+    """同步權重方塊，加上 --rebuild 時整個重建
+    
+    用法: python -m analytics.weight_cube [--rebuild] [結束日期]
+    """
+    args = sys.argv[1:]
+    rebuild = "--rebuild" in args
+    args = [arg for arg in args if arg != "--rebuild"]
+    end_date = args[0] if args else None
+    
+    cube = WeightCube()
+    if rebuild:
+        written = cube.rebuild(end_date=end_date)
+        print(f"權重方塊重建完成: {written} 日")
+    else:
+        written = cube.sync(end_date)
+        print(f"權重方塊同步完成: 附加 {written} 日")
+    print(f"容量: {cube.capacity}, ETF {len(cube.etf_tickers)} 檔, 股票 {len(cube.stock_codes)} 檔")
+
+if __name__ == "__main__":
+    main()
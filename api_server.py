@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+ETF持股唯讀查詢服務 (aiohttp)
+所有查詢經由同一個 ETFDataManager，在執行緒池中執行，共用資料庫連線池
+
+端點:
+    GET /health
+    GET /etfs/{ticker}/holdings/latest?limit=10
+    GET /etfs/{ticker}/holdings?date=YYYY-MM-DD
+    GET /etfs/{ticker}/history?start=&end=&stock=
+    GET /stocks/{code}/holders?date=
+    GET /overlap?date=&metric=overlap&limit=20
+
+回應的 ETag 由請求路徑、資料的快照日期與寫入版本組成，資料沒有新日期也沒有被重寫時回傳 304；
+編碼後的回應另外依相同的鍵快取，並依 Accept-Encoding 以 brotli 或 gzip 壓縮；
+指定的日期沒有快照時回傳 404，不快取空結果
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+from aiohttp import web
+from models.etf_data import ETFDataManager
+from utils.cache import TTLCache
+from utils.env import env_float, env_int
+from utils.logger import setup_logger
+
+# 小於此大小的回應不壓縮
+MIN_COMPRESS_BYTES = 1024
+
+def _load_brotli():
+    """brotli 為選用套件，未安裝時只提供 gzip"""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+class HoldingsAPI:
+    """持股查詢服務"""
+    
+    def __init__(self, etf_manager: ETFDataManager = None, workers: int = None,
+                 cache_size: int = None, cache_ttl: float = None):
+        self.logger = setup_logger("api_server", "logs/api_server.log")
+        self.etf_manager = etf_manager or ETFDataManager()
+        self.executor = ThreadPoolExecutor(max_workers=workers or env_int("API_WORKERS", 8),
+                                           thread_name_prefix="api")
+        self.responses = TTLCache(
+            cache_size if cache_size is not None else env_int("API_CACHE_SIZE", 512),
+            cache_ttl if cache_ttl is not None else env_float("API_CACHE_TTL", 300.0)
+        )
+        self.brotli = _load_brotli()
+        self._overlap = None
+    
+    @property
+    def overlap(self):
+        """重疊分析需要 scipy，第一次呼叫時才建立"""
+        if self._overlap is None:
+            from analytics.overlap import OverlapEngine
+            self._overlap = OverlapEngine(self.etf_manager)
+        return self._overlap
+    
+    async def _run(self, func: Callable, *args) -> Any:
+        """在執行緒池中執行同步查詢"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+    
+    # ==================== 回應處理 ====================
+    
+    def _negotiate(self, accept_encoding: str) -> Optional[str]:
+        """依 Accept-Encoding 選擇壓縮方式，brotli 優先"""
+        if self.brotli is not None and "br" in accept_encoding:
+            return "br"
+        if "gzip" in accept_encoding:
+            return "gzip"
+        return None
+    
+    def _encode(self, payload: Any, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """將結果編碼為 JSON 並壓縮，回傳 (內容, Content-Encoding)"""
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+            return body, None
+        if encoding == "br":
+            return self.brotli.compress(body, quality=5), "br"
+        return gzip.compress(body, compresslevel=6), "gzip"
+    
+    async def _respond(self, request: web.Request, snapshot_date: Optional[str],
+                       loader: Callable[[], Any], etf_ticker: str = None) -> web.Response:
+        """以快照日期與寫入版本產生 ETag，命中時回傳 304，否則讀取快取或執行 loader
+        
+        寫入版本 (指定 etf_ticker 時只看該ETF) 讓強制重寫同一日期後 ETag 與快取鍵跟著改變
+        """
+        if snapshot_date is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "查無資料"}, ensure_ascii=False),
+                                   content_type="application/json")
+        
+        version = await self._run(self.etf_manager.get_holdings_version, etf_ticker)
+        key = f"{request.path_qs}|{snapshot_date}|{version}"
+        etag = '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=60", "Vary": "Accept-Encoding"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return web.Response(status=304, headers=headers)
+        
+        # 同一快照的回應依壓縮方式分別快取
+        encoding = self._negotiate(request.headers.get("Accept-Encoding", ""))
+        cached = self.responses.get((key, encoding))
+        if cached is None:
+            payload = await self._run(loader)
+            cached = await self._run(self._encode, payload, encoding)
+            self.responses.set((key, encoding), cached)
+        
+        body, content_encoding = cached
+        if content_encoding:
+            headers["Content-Encoding"] = content_encoding
+        return web.Response(body=body, content_type="application/json", charset="utf-8", headers=headers)
+    
+    @staticmethod
+    def _int_param(request: web.Request, name: str, default: int) -> int:
+        """讀取整數查詢參數"""
+        try:
+            return int(request.query.get(name, default))
+        except ValueError:
+            raise web.HTTPBadRequest(text=f"{name} 必須為整數")
+    
+    # ==================== 端點 ====================
+    
+    async def health(self, request: web.Request) -> web.Response:
+        """健康檢查"""
+        latest_date = await self._run(self.etf_manager.get_latest_date)
+        return web.json_response({"status": "ok", "latest_date": latest_date, "cache": self.responses.stats()})
+    
+    async def latest_holdings(self, request: web.Request) -> web.Response:
+        """一檔ETF最新一日的持股"""
+        ticker = request.match_info["ticker"]
+        limit = self._int_param(request, "limit", 0)
+        date = await self._run(self.etf_manager.get_latest_date, ticker)
+        return await self._respond(request, date, lambda: {
+            "etf_ticker": ticker,
+            "date": date,
+            "holdings": self.etf_manager.get_holdings(ticker, date)[:limit or None]
+        }, ticker)
+    
+    async def _requested_date(self, request: web.Request, etf_ticker: str = None) -> Optional[str]:
+        """取得查詢日期，未指定時為最新日期；指定的日期沒有快照時回傳 None (404)，
+        避免空結果的 ETag 與快取綁定在之後才會抓到資料的日期上
+        """
+        date = request.query.get("date")
+        if not date:
+            return await self._run(self.etf_manager.get_latest_date, etf_ticker)
+        if etf_ticker:
+            exists = await self._run(self.etf_manager.get_holdings_count, etf_ticker, date)
+        else:
+            exists = await self._run(self.etf_manager.get_holdings_dates, date, date)
+        return date if exists else None
+    
+    async def holdings(self, request: web.Request) -> web.Response:
+        """一檔ETF指定日期的持股"""
+        ticker = request.match_info["ticker"]
+        date = await self._requested_date(request, ticker)
+        return await self._respond(request, date, lambda: {
+            "etf_ticker": ticker,
+            "date": date,
+            "holdings": self.etf_manager.get_holdings(ticker, date)
+        }, ticker)
+    
+    async def history(self, request: web.Request) -> web.Response:
+        """一檔ETF的每日統計，指定 stock 時為該股票的逐日權重"""
+        ticker = request.match_info["ticker"]
+        start, end, stock = request.query.get("start"), request.query.get("end"), request.query.get("stock")
+        latest_date = await self._run(self.etf_manager.get_latest_date, ticker)
+        
+        def load():
+            if not stock:
+                return {"etf_ticker": ticker, "stats": self.etf_manager.get_etf_daily_stats(ticker, start, end)}
+            return {
+                "etf_ticker": ticker,
+                "stock_code": stock,
+                "history": [
+                    dict(holder, date=day['date'])
+                    for day in self.etf_manager.get_holders(stock, start, end)
+                    for holder in day['holders']
+                    if holder['etf_ticker'] == ticker
+                ]
+            }
+        
+        return await self._respond(request, latest_date, load, ticker)
+    
+    async def holders(self, request: web.Request) -> web.Response:
+        """持有某檔股票的ETF"""
+        code = request.match_info["code"]
+        date = await self._requested_date(request)
+        return await self._respond(request, date, lambda: {
+            "stock_code": code,
+            "date": date,
+            "holders": [
+                holder
+                for day in self.etf_manager.get_holders(code, date, date)
+                for holder in day['holders']
+            ]
+        })
+    
+    async def overlap_pairs(self, request: web.Request) -> web.Response:
+        """ETF兩兩重疊度最高的配對"""
+        metric = request.query.get("metric", "overlap")
+        if metric not in self.overlap.METRICS:
+            raise web.HTTPBadRequest(text=f"未知的指標: {metric}，可用: {', '.join(self.overlap.METRICS)}")
+        limit = self._int_param(request, "limit", 20)
+        date = await self._requested_date(request)
+        return await self._respond(request, date, lambda: {
+            "date": date,
+            "metric": metric,
+            "pairs": self.overlap.top_pairs(date, metric, limit)
+        })
+    
+    # ==================== 啟動 ====================
+    
+    def build_app(self) -> web.Application:
+        """建立 aiohttp 應用程式"""
+        app = web.Application()
+        app.add_routes([
+            web.get("/health", self.health),
+            web.get("/etfs/{ticker}/holdings/latest", self.latest_holdings),
+            web.get("/etfs/{ticker}/holdings", self.holdings),
+            web.get("/etfs/{ticker}/history", self.history),
+            web.get("/stocks/{code}/holders", self.holders),
+            web.get("/overlap", self.overlap_pairs),
+        ])
+        app.on_cleanup.append(self._cleanup)
+        return app
+    
+    async def _cleanup(self, app: web.Application):
+        """關閉執行緒池與資料庫連線"""
+        self.executor.shutdown(wait=False)
+        self.etf_manager.close()
+
+def main():
+    """啟動查詢服務
+    
+    用法: python api_server.py [--backend duckdb]
+    """
+    backend = None
+    if "--backend" in sys.argv:
+        backend = sys.argv[sys.argv.index("--backend") + 1]
+    
+    api = HoldingsAPI(ETFDataManager(backend=backend))
+    host = os.getenv("API_HOST", "127.0.0.1")
+    port = env_int("API_PORT", 8080)
+    api.logger.info(f"查詢服務啟動: http://{host}:{port}")
+    web.run_app(api.build_app(), host=host, port=port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+歷史持股回填
+以元大持股 API 的日期參數，對「日期區間 × ETF清單」平行抓取歷史持股，已存在的 (ETF, 日期) 直接略過。
+抓取由 BACKFILL_CONCURRENCY 個執行緒同時進行，寫入集中在主執行緒，每 BACKFILL_BATCH_SIZE 個快照批次寫入一次。
+
+回填的快照同樣經過寫入前檢查，API 回應標示的資料日期與要求的日期不同時 (例如假日改回傳最新資料) 不寫入。
+回填期間不逐筆計算調倉紀錄、每日統計與權重方塊，全部匯入後依受影響的日期範圍一次重建；
+--defer-indexes 時先移除持股集合的次要索引，匯入後再重建 (行程被強制終止時，下次回填會補建)
+
+用法:
+    python backfill.py --start 2025-01-01 --end 2025-12-31                 回填所有元大ETF
+    python backfill.py --start 2025-01-01 --end 2025-03-31 --etfs 0050 0056
+    python backfill.py --start 2025-01-01 --end 2025-12-31 --concurrency 8 --defer-indexes
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from utils.env import env_int
+from utils.logger import setup_logger
+
+logger = setup_logger("backfill", "logs/backfill.log")
+
+# 每個抓取執行緒使用自己的爬蟲 (requests.Session 不可跨執行緒共用)
+_local = threading.local()
+
+def _thread_scraper():
+    """取得目前執行緒的爬蟲"""
+    if not hasattr(_local, "scraper"):
+        from scrapers.yuanta_scraper import YuantaScraper
+        _local.scraper = YuantaScraper()
+    return _local.scraper
+
+def fetch_holdings(etf_ticker: str, date: str) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """抓取一檔ETF單日的持股，回傳 (回應標示的資料日期, 持股)；失敗或該日無資料時持股為空清單"""
+    snapshot = _thread_scraper().scrape_etf_snapshot({"ticker": etf_ticker}, date)
+    return snapshot['date'], snapshot['holdings']
+
+def trading_days(start_date: str, end_date: str) -> List[str]:
+    """區間內的週一到週五 (國定假日由 API 回傳空資料後略過)"""
+    day = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    days = []
+    while day <= end:
+        if day.weekday() < 5:
+            days.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return days
+
+def plan_pairs(manager, etf_tickers: List[str], dates: List[str], force: bool) -> List[Tuple[str, str]]:
+    """列出需要抓取的 (ETF, 日期)，非強制模式略過已存在的快照"""
+    pairs = []
+    for etf_ticker in etf_tickers:
+        existing = set() if force else set(manager.get_holdings_dates(dates[0], dates[-1], etf_ticker))
+        pairs.extend((etf_ticker, date) for date in dates if date not in existing)
+    return pairs
+
+class BackfillStats:
+    """回填進度與吞吐量"""
+    
+    def __init__(self, total: int):
+        self.total = total
+        self.fetched = 0
+        self.empty = 0
+        self.mismatched = 0
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+        self.rows = 0
+        self.started = time.monotonic()
+    
+    def summary(self) -> str:
+        """目前進度與每秒快照數、筆數"""
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (f"{self.fetched + self.empty + self.mismatched}/{self.total} 已抓取 "
+                f"(無資料 {self.empty}, 日期不符 {self.mismatched}), "
+                f"寫入 {self.written} 個快照 {self.rows} 筆, 略過 {self.skipped}, 失敗 {self.failed}, "
+                f"耗時 {elapsed:.1f}秒, {self.written / elapsed:.2f} 快照/秒, {self.rows / elapsed:.0f} 筆/秒")
+
+def flush(manager, pending: List[Dict[str, Any]], stats: BackfillStats, loaded: Dict[str, List[str]]):
+    """批次寫入已抓取的快照，記錄實際寫入的 (ETF, 日期) 供之後重建 (未通過寫入前檢查的快照計為失敗)"""
+    from models.base_store import WRITE_SKIPPED, WRITE_WRITTEN
+    
+    if not pending:
+        return
+    rows = {(snapshot['etf_ticker'], snapshot['date']): len(snapshot['holdings']) for snapshot in pending}
+    results = manager.write_holdings_snapshots(pending, deferred=True)
+    for key, count in rows.items():
+        status = results.get(key)
+        if status == WRITE_WRITTEN:
+            stats.written += 1
+            stats.rows += count
+            loaded.setdefault(key[0], []).append(key[1])
+        elif status == WRITE_SKIPPED:
+            stats.skipped += 1
+        else:
+            stats.failed += 1
+    pending.clear()
+    logger.info(stats.summary())
+
+def rebuild_derived(manager, loaded: Dict[str, List[str]]):
+    """依實際寫入的日期範圍重建調倉紀錄、每日統計與權重方塊"""
+    from analytics.portfolio_stats import PortfolioStatsEngine
+    from analytics.rebalance import RebalanceEngine
+    
+    rebalance = RebalanceEngine(manager)
+    portfolio_stats = PortfolioStatsEngine(manager)
+    for etf_ticker, dates in sorted(loaded.items()):
+        # 連同區間前後各一個既有快照，讓邊界兩日的變動也重新比對
+        start_date, end_date = min(dates), max(dates)
+        previous_date, _ = manager.get_adjacent_dates(etf_ticker, start_date)
+        _, next_date = manager.get_adjacent_dates(etf_ticker, end_date)
+        start_date, end_date = previous_date or start_date, next_date or end_date
+        
+        rebalance.rebuild(etf_ticker, start_date, end_date)
+        portfolio_stats.rebuild(etf_ticker, start_date, end_date)
+    
+    # 回填的是較舊的日期，權重方塊只能附加新日期，因此整個重建
+    if manager.weight_cube is not None and loaded:
+        manager.weight_cube.rebuild()
+
+def backfill(args) -> int:
+    """平行抓取並匯入歷史持股"""
+    from models.etf_data import ETFDataManager
+    
+    dates = trading_days(args.start, args.end)
+    if not dates:
+        print("日期區間內沒有交易日", file=sys.stderr)
+        return 1
+    
+    if args.etfs:
+        etf_tickers = args.etfs
+    else:
+        from yuanta_etf_scraper import YUANTA_ETF_LIST
+        etf_tickers = YUANTA_ETF_LIST
+    
+    manager = ETFDataManager(backend=args.backend)
+    try:
+        pairs = plan_pairs(manager, etf_tickers, dates, args.force)
+        print(f"{len(etf_tickers)} 檔ETF × {len(dates)} 日，需抓取 {len(pairs)} 個快照")
+        if not pairs:
+            return 0
+        
+        stats = BackfillStats(len(pairs))
+        loaded: Dict[str, List[str]] = {}
+        pending: List[Dict[str, Any]] = []
+        
+        if args.defer_indexes:
+            manager.suspend_holdings_indexes()
+        executor = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="backfill")
+        try:
+            futures = {executor.submit(fetch_holdings, etf_ticker, date): (etf_ticker, date)
+                       for etf_ticker, date in pairs}
+            for future in as_completed(futures):
+                etf_ticker, date = futures[future]
+                response_date, holdings = future.result()
+                if not holdings:
+                    stats.empty += 1
+                    continue
+                if response_date and response_date != date:
+                    # 非交易日時 API 可能回傳最新一日的持股，不能存成要求的日期
+                    logger.warning(f"ETF {etf_ticker} 要求 {date} 但回應為 {response_date} 的資料，略過")
+                    stats.mismatched += 1
+                    continue
+                
+                stats.fetched += 1
+                pending.append({"etf_ticker": etf_ticker, "date": date, "holdings": holdings,
+                                "force_update": args.force})
+                if len(pending) >= args.batch_size:
+                    flush(manager, pending, stats, loaded)
+        
+        except KeyboardInterrupt:
+            print("已中斷，寫入已抓取的快照後結束")
+        
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            flush(manager, pending, stats, loaded)
+            # 不論是否移除過都重建一次，補上先前中斷的回填遺留的缺漏
+            manager.restore_holdings_indexes()
+        
+        print(stats.summary())
+        
+        rebuild_start = time.monotonic()
+        rebuild_derived(manager, loaded)
+        if loaded:
+            print(f"調倉紀錄與每日統計重建完成，耗時 {time.monotonic() - rebuild_start:.1f}秒")
+        return 1 if stats.failed else 0
+    
+    finally:
+        manager.close()
+
+def build_parser() -> argparse.ArgumentParser:
+    """建立命令列參數"""
+    parser = argparse.ArgumentParser(description="歷史持股回填")
+    parser.add_argument("--start", required=True, help="開始日期 (YYYY-MM-DD)")
+    parser.add_argument("--end", default=datetime.now().strftime('%Y-%m-%d'), help="結束日期 (預設今天)")
+    parser.add_argument("--etfs", nargs="+", help="ETF代號 (預設所有元大ETF)")
+    parser.add_argument("--concurrency", type=int, default=env_int("BACKFILL_CONCURRENCY", 4),
+                        help="同時抓取的請求數 (預設 BACKFILL_CONCURRENCY 或4)")
+    parser.add_argument("--batch-size", type=int, default=env_int("BACKFILL_BATCH_SIZE", 50),
+                        help="每次批次寫入的快照數 (預設 BACKFILL_BATCH_SIZE 或50)")
+    parser.add_argument("--force", action="store_true", help="重新抓取並覆蓋已存在的快照")
+    parser.add_argument("--defer-indexes", action="store_true", help="匯入期間暫時移除持股次要索引")
+    parser.add_argument("--backend", help="儲存後端 (預設讀取 ETF_STORAGE_BACKEND)")
+    return parser
+
+def main(argv: List[str] = None) -> int:
+    """主函數"""
+    return backfill(build_parser().parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,42 +1,48 @@
+"""
+儲存後端設定
+ETF_STORAGE_BACKEND 選擇 ETFDataManager 使用的後端：
+- mongodb: MongoDB 伺服器 (預設)
+- duckdb: 嵌入式 DuckDB 檔案，不需伺服器，適合本機分析
+
+PARQUET_ARCHIVE_ENABLED=true 時，每個寫入成功的持股快照另外匯出到
+PARQUET_ARCHIVE_DIR 下的 Parquet 分區檔，供研究端以欄式格式讀取
+
+WEIGHT_CUBE_ENABLED=true 時，寫入成功的快照同步更新 WEIGHT_CUBE_DIR 下的
+日期×ETF×股票 memmap 權重方塊
+"""
+
 import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
-
-load_dotenv()
-
-# Supabase 設定
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-def get_supabase_client() -> Client:
-    """取得 Supabase 客戶端"""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise ValueError("請設定 SUPABASE_URL 和 SUPABASE_KEY 環境變數")
-    
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
-
-def init_database():
-    """初始化資料庫表格"""
-    supabase = get_supabase_client()
-    
-    # 建立 ETF 基本資料表格
-    supabase.table("etfs").upsert({
-        "id": "etf_id",
-        "name": "ETF名稱",
-        "ticker": "股票代碼",
-        "issuer": "發行商",
-        "created_at": "2024-01-01T00:00:00Z"
-    }).execute()
-    
-    # 建立持股資料表格
-    supabase.table("holdings").upsert({
-        "id": "holding_id",
-        "etf_id": "etf_id",
-        "stock_code": "股票代碼",
-        "stock_name": "股票名稱",
-        "weight": 0.0,
-        "shares": 0,
-        "market_value": 0.0,
-        "date": "2024-01-01",
-        "created_at": "2024-01-01T00:00:00Z"
-    }).execute()
+from utils.env import env_flag
+
+STORAGE_BACKENDS = ("mongodb", "duckdb")
+DEFAULT_STORAGE_BACKEND = "mongodb"
+DEFAULT_DUCKDB_PATH = "data/etf_analysis.duckdb"
+DEFAULT_PARQUET_ARCHIVE_DIR = "data/parquet/holdings"
+DEFAULT_WEIGHT_CUBE_DIR = "data/weight_cube"
+
+def get_storage_backend() -> str:
+    """取得目前設定的儲存後端名稱"""
+    backend = os.getenv("ETF_STORAGE_BACKEND", DEFAULT_STORAGE_BACKEND).strip().lower()
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"未知的儲存後端: {backend}，可用: {', '.join(STORAGE_BACKENDS)}")
+    return backend
+
+def get_duckdb_path() -> str:
+    """取得DuckDB資料庫檔案路徑"""
+    return os.getenv("DUCKDB_PATH", DEFAULT_DUCKDB_PATH)
+
+def is_parquet_archive_enabled() -> bool:
+    """是否在寫入持股後匯出 Parquet"""
+    return env_flag("PARQUET_ARCHIVE_ENABLED")
+
+def get_parquet_archive_dir() -> str:
+    """取得 Parquet 封存根目錄"""
+    return os.getenv("PARQUET_ARCHIVE_DIR", DEFAULT_PARQUET_ARCHIVE_DIR)
+
+def is_weight_cube_enabled() -> bool:
+    """是否在寫入持股後更新權重方塊"""
+    return env_flag("WEIGHT_CUBE_ENABLED")
+
+def get_weight_cube_dir() -> str:
+    """取得權重方塊目錄"""
+    return os.getenv("WEIGHT_CUBE_DIR", DEFAULT_WEIGHT_CUBE_DIR)
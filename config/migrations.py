@@ -0,0 +1,189 @@
+"""
+資料庫結構遷移
+每個遷移只會執行一次，完成後記錄於 schema_version 集合
+新增索引或集合時，在 MIGRATIONS 尾端加入新的版本即可
+"""
+
+from typing import List, Tuple
+from pymongo import UpdateOne
+from models.holdings_schema import LEGACY_FIELDS, normalize_holding
+from models.run_metrics import RUN_METRICS_RETENTION_DAYS
+
+# 批次改寫時每次 bulk_write 的筆數
+MIGRATION_BATCH_SIZE = 1000
+
+def holdings_secondary_indexes(mongodb) -> List[List[Tuple[str, int]]]:
+    """持股集合的次要索引 (寫入時判斷重複用的 etf_ticker+date 索引以外)，大量匯入時可暫時移除"""
+    stock_field = mongodb.holdings_field("stock_code")
+    date_field = mongodb.holdings_field("date")
+    if mongodb.holdings_timeseries:
+        stock_index = [(stock_field, 1), (date_field, 1)]
+    else:
+        stock_index = [(stock_field, 1)]
+    return [stock_index, [(date_field, 1)]]
+
+def _v1_initial_indexes(mongodb):
+    """建立基本索引"""
+    # ETFs 集合索引
+    mongodb.etfs.create_index("ticker", unique=True)
+    mongodb.etfs.create_index("issuer")
+    mongodb.etfs.create_index("updated_at")
+    
+    # Holdings 集合索引
+    etf_field = mongodb.holdings_field("etf_ticker")
+    date_field = mongodb.holdings_field("date")
+    mongodb.holdings.create_index([(etf_field, 1), (date_field, 1)])
+    for keys in holdings_secondary_indexes(mongodb):
+        mongodb.holdings.create_index(keys)
+    
+    # Scraper logs 集合索引
+    mongodb.scraper_logs.create_index("timestamp")
+    mongodb.scraper_logs.create_index("issuer")
+
+def _v2_canonical_holdings(mongodb):
+    """將舊版爬蟲寫入的持股文件改寫為標準格式"""
+    legacy_filter = {"$or": [{field: {"$exists": True}} for field in LEGACY_FIELDS]}
+    cursor = mongodb.holdings.find(legacy_filter, {"created_at": 0}).batch_size(MIGRATION_BATCH_SIZE)
+    unset_fields = {field: "" for field in LEGACY_FIELDS}
+    operations = []
+    skipped = 0
+    for doc in cursor:
+        doc_id = doc["_id"]
+        try:
+            holding = normalize_holding(mongodb.from_holdings_document(doc))
+        except (TypeError, ValueError) as e:
+            # 無法解析的文件保留原樣，不中斷後續版本的遷移
+            mongodb.logger.warning(f"持股文件 {doc_id} 無法轉為標準格式，保留原樣: {e}")
+            skipped += 1
+            continue
+        
+        # stock_code 在時間序列集合中屬於 meta，保持不動
+        holding.pop("stock_code")
+        operations.append(UpdateOne({"_id": doc_id}, {"$set": holding, "$unset": unset_fields}))
+        
+        if len(operations) >= MIGRATION_BATCH_SIZE:
+            mongodb.holdings.bulk_write(operations, ordered=False)
+            operations = []
+    
+    if operations:
+        mongodb.holdings.bulk_write(operations, ordered=False)
+    if skipped:
+        mongodb.logger.warning(f"共 {skipped} 筆持股文件無法轉為標準格式，需人工檢查")
+
+def _v3_run_metrics(mongodb):
+    """建立執行指標索引，爬蟲日誌改為依保存天數自動刪除"""
+    retention_seconds = RUN_METRICS_RETENTION_DAYS * 86400
+    
+    mongodb.run_metrics.create_index("timestamp", expireAfterSeconds=retention_seconds)
+    mongodb.run_metrics.create_index([("issuer", 1), ("kind", 1), ("timestamp", -1)])
+    mongodb.run_metrics.create_index("run_id")
+    mongodb.run_metrics_daily.create_index([("date", 1), ("issuer", 1)], unique=True)
+    
+    # 既有的 timestamp 索引換成 TTL 索引
+    if "timestamp_1" in mongodb.scraper_logs.index_information():
+        mongodb.scraper_logs.drop_index("timestamp_1")
+    mongodb.scraper_logs.create_index("timestamp", expireAfterSeconds=retention_seconds)
+
+def _v4_stock_holders(mongodb):
+    """建立「股票→持有ETF」反向索引，並由既有持股一次回填"""
+    mongodb.stock_holders.create_index([("stock_code", 1), ("date", 1)], unique=True)
+    
+    date_field = "$" + mongodb.holdings_field("date")
+    if mongodb.holdings_timeseries:
+        date_field = {"$dateToString": {"format": "%Y-%m-%d", "date": date_field}}
+    
+    pipeline = [
+        {"$sort": {"weight": -1}},
+        {"$group": {
+            "_id": {"stock_code": "$" + mongodb.holdings_field("stock_code"), "date": date_field},
+            "holders": {"$push": {
+                "etf_ticker": "$" + mongodb.holdings_field("etf_ticker"),
+                "weight": "$weight",
+                "shares": "$shares"
+            }}
+        }},
+        {"$project": {"_id": 0, "stock_code": "$_id.stock_code", "date": "$_id.date", "holders": 1}},
+        {"$merge": {
+            "into": mongodb.stock_holders.name,
+            "on": ["stock_code", "date"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+    mongodb.holdings.aggregate(pipeline, allowDiskUse=True)
+
+def _v5_holdings_changes(mongodb):
+    """建立持股變動索引"""
+    mongodb.holdings_changes.create_index([("etf_ticker", 1), ("date", -1)])
+    mongodb.holdings_changes.create_index([("stock_code", 1), ("date", -1)])
+    mongodb.holdings_changes.create_index([("date", -1), ("change_type", 1)])
+
+def _v6_stock_net_flows(mongodb):
+    """建立個股淨買賣索引"""
+    mongodb.stock_net_flows.create_index([("date", -1), ("stock_code", 1)], unique=True)
+    mongodb.stock_net_flows.create_index([("stock_code", 1), ("date", -1)])
+
+def _v7_etf_daily_stats(mongodb):
+    """建立ETF每日統計索引"""
+    mongodb.etf_daily_stats.create_index([("etf_ticker", 1), ("date", -1)], unique=True)
+    mongodb.etf_daily_stats.create_index([("date", -1)])
+
+def _v8_holdings_summary(mongodb):
+    """建立每檔ETF的持股摘要，並由既有持股一次回填"""
+    mongodb.holdings_summary.create_index("etf_ticker", unique=True)
+    
+    date_field = "$" + mongodb.holdings_field("date")
+    if mongodb.holdings_timeseries:
+        date_field = {"$dateToString": {"format": "%Y-%m-%d", "date": date_field}}
+    
+    days = {"$objectToArray": "$days"}
+    pipeline = [
+        {"$group": {
+            "_id": {"etf_ticker": "$" + mongodb.holdings_field("etf_ticker"), "date": date_field},
+            "rows": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": "$_id.etf_ticker",
+            "days": {"$push": {"k": "$_id.date", "v": "$rows"}}
+        }},
+        {"$project": {"_id": 0, "etf_ticker": "$_id", "days": {"$arrayToObject": "$days"}}},
+        {"$set": {
+            "rows": {"$sum": {"$map": {"input": days, "in": "$$this.v"}}},
+            "dates": {"$size": days},
+            "first_date": {"$min": {"$map": {"input": days, "in": "$$this.k"}}},
+            "latest_date": {"$max": {"$map": {"input": days, "in": "$$this.k"}}},
+            "updated_at": "$$NOW"
+        }},
+        {"$merge": {
+            "into": mongodb.holdings_summary.name,
+            "on": "etf_ticker",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+    mongodb.holdings.aggregate(pipeline, allowDiskUse=True)
+
+def _v9_holdings_quarantine(mongodb):
+    """建立持股隔離區索引"""
+    mongodb.holdings_quarantine.create_index([("etf_ticker", 1), ("date", -1)], unique=True)
+    mongodb.holdings_quarantine.create_index([("status", 1), ("date", -1)])
+
+def _v10_scrape_tasks(mongodb):
+    """建立抓取任務索引"""
+    mongodb.scrape_tasks.create_index([("issuer", 1), ("run_date", -1), ("status", 1), ("position", 1)])
+
+# (版本, 說明, 遷移函數)
+MIGRATIONS = [
+    (1, "建立基本索引", _v1_initial_indexes),
+    (2, "持股文件改寫為標準格式", _v2_canonical_holdings),
+    (3, "執行指標索引與日誌保存期限", _v3_run_metrics),
+    (4, "股票持有ETF反向索引", _v4_stock_holders),
+    (5, "持股變動索引", _v5_holdings_changes),
+    (6, "個股淨買賣索引", _v6_stock_net_flows),
+    (7, "ETF每日統計索引", _v7_etf_daily_stats),
+    (8, "持股摘要", _v8_holdings_summary),
+    (9, "持股隔離區", _v9_holdings_quarantine),
+    (10, "抓取任務佇列", _v10_scrape_tasks),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
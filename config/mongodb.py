@@ -1,38 +1,126 @@
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
-from typing import Optional
+import threading
+from datetime import datetime, timedelta
+from pymongo import MongoClient, ReadPreference
+from pymongo.errors import CollectionInvalid, ConnectionFailure, DuplicateKeyError, ServerSelectionTimeoutError
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+from typing import Any, Dict, Optional
+from config.migrations import MIGRATIONS, SCHEMA_VERSION
+from utils.env import env_flag, env_int
 from utils.logger import setup_logger
 
+# 時間序列持股集合設定
+HOLDINGS_TIMESERIES_COLLECTION = "holdings_ts"
+HOLDINGS_TIME_FIELD = "ts"
+HOLDINGS_META_FIELD = "meta"
+HOLDINGS_META_KEYS = ("etf_ticker", "stock_code")
+
+# 資料庫結構版本設定
+SCHEMA_COLLECTION = "schema_version"
+SCHEMA_LOCK_SECONDS = 600
+
+# 連線設定檔：ingest 供爬蟲寫入，analytics 供查詢分析
+MONGODB_PROFILES = {
+    "ingest": {
+        "write_concern": "1",
+        "journal": True,
+        "read_preference": "primary",
+        "read_concern": "local"
+    },
+    "analytics": {
+        "write_concern": "1",
+        "journal": False,
+        "read_preference": "secondaryPreferred",
+        "read_concern": "local"
+    }
+}
+DEFAULT_MONGODB_PROFILE = "ingest"
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST
+}
+
+def build_client_options() -> Dict[str, Any]:
+    """從環境變數建立MongoClient連線池與壓縮設定"""
+    options = {
+        "serverSelectionTimeoutMS": env_int("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": env_int("MONGODB_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": env_int("MONGODB_SOCKET_TIMEOUT_MS", 30000),
+        "maxPoolSize": env_int("MONGODB_MAX_POOL_SIZE", 50),
+        "minPoolSize": env_int("MONGODB_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": env_int("MONGODB_MAX_IDLE_TIME_MS", 300000),
+        "appname": "etf_analysis"
+    }
+    
+    # 傳輸壓縮，例如 "zstd,snappy,zlib"，伺服器會選擇第一個雙方都支援的演算法
+    compressors = os.getenv("MONGODB_COMPRESSORS", "").strip()
+    if compressors:
+        options["compressors"] = compressors
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = env_int("MONGODB_ZLIB_LEVEL", 6)
+    
+    return options
+
+def resolve_profile(profile: str = None) -> Dict[str, Any]:
+    """取得連線設定檔，環境變數可覆寫寫入確認與讀取偏好"""
+    name = profile or os.getenv("MONGODB_PROFILE", DEFAULT_MONGODB_PROFILE)
+    if name not in MONGODB_PROFILES:
+        raise ValueError(f"未知的MongoDB設定檔: {name}")
+    
+    settings = dict(MONGODB_PROFILES[name])
+    settings["name"] = name
+    
+    prefix = f"MONGODB_{name.upper()}_"
+    settings["write_concern"] = os.getenv(prefix + "WRITE_CONCERN", settings["write_concern"])
+    settings["journal"] = env_flag(prefix + "JOURNAL", settings["journal"])
+    settings["read_preference"] = os.getenv(prefix + "READ_PREFERENCE", settings["read_preference"])
+    settings["read_concern"] = os.getenv(prefix + "READ_CONCERN", settings["read_concern"])
+    
+    if settings["read_preference"] not in READ_PREFERENCES:
+        raise ValueError(f"未知的讀取偏好: {settings['read_preference']}")
+    
+    return settings
+
 class MongoDBManager:
     """MongoDB 資料庫管理器"""
     
-    def __init__(self, connection_string: str = None, database_name: str = "etf_analysis"):
+    def __init__(self, connection_string: str = None, database_name: str = "etf_analysis",
+                 holdings_timeseries: bool = None, profile: str = None,
+                 client: MongoClient = None):
         self.logger = setup_logger("mongodb", "logs/mongodb.log")
         self.database_name = database_name
+        self.profile = resolve_profile(profile)
+        
+        # 是否使用MongoDB原生時間序列集合儲存持股 (選用)
+        if holdings_timeseries is None:
+            holdings_timeseries = env_flag("MONGODB_HOLDINGS_TIMESERIES")
+        self.holdings_timeseries = holdings_timeseries
         
         # 如果沒有提供連接字串，使用預設的本地連接
         if connection_string is None:
             connection_string = "mongodb://localhost:27017/"
         
         try:
-            # 建立MongoDB客戶端
-            self.client = MongoClient(
-                connection_string,
-                serverSelectionTimeoutMS=5000,  # 5秒超時
-                connectTimeoutMS=5000,
-                socketTimeoutMS=5000
-            )
-            
-            # 測試連接
-            self.client.admin.command('ping')
-            self.logger.info("MongoDB 連接成功")
+            # 建立MongoDB客戶端 (可與其他設定檔共用同一個連線池)
+            self.owns_client = client is None
+            self.client = client or MongoClient(connection_string, **build_client_options())
             
-            # 取得資料庫
-            self.db = self.client[database_name]
+            # 取得資料庫，套用設定檔的寫入確認與讀取偏好
+            self.db = self.client.get_database(
+                database_name,
+                write_concern=self._build_write_concern(),
+                read_preference=READ_PREFERENCES[self.profile["read_preference"]],
+                read_concern=ReadConcern(self.profile["read_concern"])
+            )
             
-            # 初始化集合
+            # 初始化集合 (結構版本檢查即為連線測試，不另外ping)
             self._init_collections()
+            self.logger.info(f"MongoDB 連接成功 (設定檔: {self.profile['name']})")
             
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
             self.logger.error(f"MongoDB 連接失敗: {e}")
@@ -41,6 +129,13 @@ class MongoDBManager:
             self.logger.error(f"MongoDB 初始化失敗: {e}")
             raise
     
+    def _build_write_concern(self) -> WriteConcern:
+        """依設定檔建立寫入確認"""
+        w = self.profile["write_concern"]
+        if isinstance(w, str) and w.isdigit():
+            w = int(w)
+        return WriteConcern(w=w, j=self.profile["journal"] or None)
+    
     def _init_collections(self):
         """初始化資料庫集合"""
         try:
@@ -48,13 +143,47 @@ class MongoDBManager:
             self.etfs = self.db.etfs
             
             # 持股資料集合
-            self.holdings = self.db.holdings
+            if self.holdings_timeseries:
+                self.holdings = self.db[HOLDINGS_TIMESERIES_COLLECTION]
+            else:
+                self.holdings = self.db.holdings
             
             # 爬蟲日誌集合
             self.scraper_logs = self.db.scraper_logs
             
-            # 建立索引
-            self._create_indexes()
+            # 股票→持有ETF 反向索引 (每檔股票每日一筆)
+            self.stock_holders = self.db.stock_holders
+            
+            # 持股變動 (相鄰兩個快照的調倉紀錄)
+            self.holdings_changes = self.db.holdings_changes
+            
+            # 每檔ETF的持股摘要 (筆數、日期範圍)，供狀態查詢不必掃描 holdings
+            self.holdings_summary = self.db.holdings_summary
+            
+            # 寫入前檢查未通過的持股快照
+            self.holdings_quarantine = self.db.holdings_quarantine
+            
+            # ETF每日投資組合統計 (每檔ETF每日一筆)
+            self.etf_daily_stats = self.db.etf_daily_stats
+            
+            # 個股ETF合計淨買賣 (每檔股票每日一筆)
+            self.stock_net_flows = self.db.stock_net_flows
+            
+            # 執行指標集合與每日彙總
+            self.run_metrics = self.db.run_metrics
+            self.run_metrics_daily = self.db.run_metrics_daily
+            
+            # 每檔ETF一個的抓取任務 (狀態檢查點，重跑時只處理未完成的ETF)
+            self.scrape_tasks = self.db.scrape_tasks
+            
+            # 跨行程執行鎖租約 (utils/run_lock.py)
+            self.run_locks = self.db.run_locks
+            
+            # 資料庫結構版本集合
+            self.schema_versions = self.db[SCHEMA_COLLECTION]
+            
+            # 檢查結構版本 (同時作為連線測試)
+            self._ensure_schema()
             
             self.logger.info("MongoDB 集合初始化完成")
             
@@ -62,28 +191,179 @@ class MongoDBManager:
             self.logger.error(f"集合初始化失敗: {e}")
             raise
     
-    def _create_indexes(self):
-        """建立資料庫索引"""
+    def _init_timeseries_holdings(self):
+        """建立時間序列持股集合"""
+        name = HOLDINGS_TIMESERIES_COLLECTION
+        
+        if name not in self.db.list_collection_names(filter={"name": name}):
+            try:
+                # metaField 放 etf_ticker/stock_code，timeField 為交易日期
+                self.db.create_collection(
+                    name,
+                    timeseries={
+                        "timeField": HOLDINGS_TIME_FIELD,
+                        "metaField": HOLDINGS_META_FIELD,
+                        "granularity": "hours"
+                    }
+                )
+                self.logger.info(f"已建立時間序列持股集合: {name}")
+            except CollectionInvalid:
+                # 其他程序已先建立
+                pass
+    
+    # ==================== 資料庫結構版本 ====================
+    
+    def get_schema_version(self) -> int:
+        """取得目前的資料庫結構版本"""
+        state = self.schema_versions.find_one({"_id": self.holdings.name}, {"version": 1})
+        return state.get("version", 0) if state else 0
+    
+    def _ensure_schema(self):
+        """啟動時只做一次版本檢查，版本落後才執行遷移"""
+        version = self.get_schema_version()
+        if version >= SCHEMA_VERSION:
+            return
+        
+        # 時間序列集合必須在第一次寫入前建立，不能放到背景執行
+        if self.holdings_timeseries:
+            self._init_timeseries_holdings()
+        
+        # 預設同步執行：背景執行緒會隨短暫的爬蟲或排程行程結束而中斷 (租約要到期後才釋放)，
+        # v4/v8 的回填也會與同時寫入的 stock_holders / holdings_summary 互相覆蓋
+        if env_flag("MONGODB_SCHEMA_BACKGROUND", False):
+            thread = threading.Thread(
+                target=self.migrate_schema,
+                name="mongodb-schema-migration",
+                daemon=True
+            )
+            thread.start()
+            self.logger.info(f"資料庫結構版本 v{version} 落後於 v{SCHEMA_VERSION}，已於背景執行遷移")
+        else:
+            self.migrate_schema()
+    
+    def _acquire_schema_lock(self) -> bool:
+        """取得遷移租約，避免多個程序同時執行遷移"""
+        now = datetime.now()
         try:
-            # ETFs 集合索引
-            self.etfs.create_index("ticker", unique=True)
-            self.etfs.create_index("issuer")
-            self.etfs.create_index("updated_at")
-            
-            # Holdings 集合索引
-            self.holdings.create_index([("etf_ticker", 1), ("date", 1)])
-            self.holdings.create_index("stock_code")
-            self.holdings.create_index("date")
+            self.schema_versions.find_one_and_update(
+                {
+                    "_id": self.holdings.name,
+                    "$or": [
+                        {"locked_until": {"$exists": False}},
+                        {"locked_until": {"$lt": now}}
+                    ]
+                },
+                {
+                    "$set": {"locked_until": now + timedelta(seconds=SCHEMA_LOCK_SECONDS)},
+                    "$setOnInsert": {"version": 0}
+                },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # 文件已存在且租約未過期
+            return False
+    
+    def migrate_schema(self) -> bool:
+        """執行尚未套用的結構遷移"""
+        try:
+            if not self._acquire_schema_lock():
+                self.logger.info("其他程序正在執行資料庫遷移，略過")
+                return False
             
-            # Scraper logs 集合索引
-            self.scraper_logs.create_index("timestamp")
-            self.scraper_logs.create_index("issuer")
+            try:
+                current = self.get_schema_version()
+                for version, description, migrate in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    
+                    self.logger.info(f"執行資料庫遷移 v{version}: {description}")
+                    migrate(self)
+                    self.schema_versions.update_one(
+                        {"_id": self.holdings.name},
+                        {"$set": {"version": version, "updated_at": datetime.now()}}
+                    )
+            finally:
+                self.schema_versions.update_one(
+                    {"_id": self.holdings.name},
+                    {"$unset": {"locked_until": ""}}
+                )
             
-            self.logger.info("MongoDB 索引建立完成")
+            self.logger.info(f"資料庫結構已更新至 v{SCHEMA_VERSION}")
+            return True
             
         except Exception as e:
-            self.logger.error(f"索引建立失敗: {e}")
-            raise
+            self.logger.error(f"資料庫遷移失敗: {e}")
+            return False
+    
+    # ==================== 持股集合欄位對應 ====================
+    
+    def holdings_field(self, field: str) -> str:
+        """取得持股欄位在實際集合中的路徑"""
+        if not self.holdings_timeseries:
+            return field
+        if field in HOLDINGS_META_KEYS:
+            return f"{HOLDINGS_META_FIELD}.{field}"
+        if field == "date":
+            return HOLDINGS_TIME_FIELD
+        return field
+    
+    def holdings_date_value(self, date: str) -> Any:
+        """將 YYYY-MM-DD 日期字串轉為集合中的日期值"""
+        if self.holdings_timeseries:
+            return datetime.strptime(date, "%Y-%m-%d")
+        return date
+    
+    @staticmethod
+    def holdings_date_string(value: Any) -> Optional[str]:
+        """將集合中的日期值轉回 YYYY-MM-DD 字串"""
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d")
+        return value
+    
+    def holdings_filter(self, etf_ticker: str = None, date: str = None, start_date: str = None,
+                        end_date: str = None, stock_code: str = None) -> Dict[str, Any]:
+        """建立持股查詢條件，依集合型態對應欄位"""
+        query = {}
+        if etf_ticker:
+            query[self.holdings_field("etf_ticker")] = etf_ticker
+        if stock_code:
+            query[self.holdings_field("stock_code")] = stock_code
+        
+        date_field = self.holdings_field("date")
+        if date:
+            query[date_field] = self.holdings_date_value(date)
+        else:
+            date_range = {}
+            if start_date:
+                date_range["$gte"] = self.holdings_date_value(start_date)
+            if end_date:
+                date_range["$lte"] = self.holdings_date_value(end_date)
+            if date_range:
+                query[date_field] = date_range
+        
+        return query
+    
+    def to_holdings_document(self, holding: Dict[str, Any]) -> Dict[str, Any]:
+        """將扁平持股資料轉為集合儲存格式"""
+        if not self.holdings_timeseries:
+            return holding
+        
+        document = dict(holding)
+        document[HOLDINGS_META_FIELD] = {
+            key: document.pop(key, None) for key in HOLDINGS_META_KEYS
+        }
+        document[HOLDINGS_TIME_FIELD] = self.holdings_date_value(document.pop("date"))
+        return document
+    
+    def from_holdings_document(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """將集合文件轉回扁平持股資料，並移除_id欄位"""
+        document.pop('_id', None)
+        if HOLDINGS_META_FIELD in document:
+            document.update(document.pop(HOLDINGS_META_FIELD) or {})
+        if HOLDINGS_TIME_FIELD in document:
+            document["date"] = self.holdings_date_string(document.pop(HOLDINGS_TIME_FIELD))
+        return document
     
     def test_connection(self) -> bool:
         """測試資料庫連接"""
@@ -119,32 +399,70 @@ class MongoDBManager:
     def close_connection(self):
         """關閉資料庫連接"""
         try:
-            if self.client:
+            # 共用的連線池由 close_mongodb_connection 統一關閉
+            if self.client and self.owns_client:
                 self.client.close()
                 self.logger.info("MongoDB 連接已關閉")
         except Exception as e:
             self.logger.error(f"關閉連接失敗: {e}")
 
-# 全域MongoDB管理器實例
-_mongodb_manager: Optional[MongoDBManager] = None
+# 全域MongoDB管理器實例 (每個設定檔一個，共用同一個MongoClient連線池)
+_mongodb_managers: Dict[str, MongoDBManager] = {}
+_mongodb_client: Optional[MongoClient] = None
+_mongodb_lock = threading.Lock()
+_mongodb_pid = os.getpid()
 
-def get_mongodb_manager() -> MongoDBManager:
-    """取得MongoDB管理器實例"""
-    global _mongodb_manager
-    
-    if _mongodb_manager is None:
-        # 從環境變數讀取設定
-        connection_string = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-        database_name = os.getenv("MONGODB_DB", "etf_analysis")
-        
-        _mongodb_manager = MongoDBManager(connection_string, database_name)
+def _reset_after_fork():
+    """fork後的子程序不可沿用父程序的連線池，丟棄繼承來的實例"""
+    global _mongodb_client, _mongodb_lock, _mongodb_pid
+    
+    _mongodb_managers.clear()
+    _mongodb_client = None
+    _mongodb_lock = threading.Lock()
+    _mongodb_pid = os.getpid()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_mongodb_manager(profile: str = None) -> MongoDBManager:
+    """取得MongoDB管理器實例 (執行緒安全、fork安全)"""
+    global _mongodb_client
+    
+    # 無 register_at_fork 的平台以PID偵測fork
+    if os.getpid() != _mongodb_pid:
+        _reset_after_fork()
+    
+    profile_name = resolve_profile(profile)["name"]
+    manager = _mongodb_managers.get(profile_name)
+    if manager is not None:
+        return manager
+    
+    with _mongodb_lock:
+        manager = _mongodb_managers.get(profile_name)
+        if manager is None:
+            # 從環境變數讀取設定
+            connection_string = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+            database_name = os.getenv("MONGODB_DB", "etf_analysis")
+            
+            if _mongodb_client is None:
+                _mongodb_client = MongoClient(connection_string, **build_client_options())
+            
+            manager = MongoDBManager(
+                connection_string,
+                database_name,
+                profile=profile_name,
+                client=_mongodb_client
+            )
+            _mongodb_managers[profile_name] = manager
     
-    return _mongodb_manager
+    return manager
 
 def close_mongodb_connection():
     """關閉MongoDB連接"""
-    global _mongodb_manager
+    global _mongodb_client
     
-    if _mongodb_manager:
-        _mongodb_manager.close_connection()
-        _mongodb_manager = None
+    with _mongodb_lock:
+        if _mongodb_client:
+            _mongodb_client.close()
+        _mongodb_managers.clear()
+        _mongodb_client = None
@@ -103,6 +103,7 @@ SCRAPER_SETTINGS = {
 # 資料庫設定
 DATABASE_SETTINGS = {
     'batch_size': 100,
+    'cursor_batch_size': 1000,
     'max_retries': 3,
     'retry_delay': 1
 }
@@ -0,0 +1,252 @@
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+# 持股快照寫入結果
+WRITE_WRITTEN = "written"
+WRITE_SKIPPED = "skipped"
+WRITE_FAILED = "failed"
+WRITE_QUARANTINED = "quarantined"
+
+# 抓取任務狀態
+TASK_PENDING = "pending"
+TASK_RUNNING = "running"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+def scrape_task_id(issuer: str, run_date: str, etf_ticker: str) -> str:
+    """抓取任務的識別碼，同一發行商同一天每檔ETF一個任務"""
+    return f"{issuer}:{run_date}:{etf_ticker}"
+
+class BaseHoldingsStore:
+    """儲存後端基礎類別 - ETFDataManager 透過此介面存取資料
+    
+    日期一律使用 YYYY-MM-DD 字串，讀取結果為扁平的 dict
+    """
+    
+    # ==================== ETF基本資料操作 ====================
+    
+    def save_etf(self, etf_data: Dict[str, Any]) -> bool:
+        """儲存ETF基本資料"""
+        raise NotImplementedError("子類別必須實作 save_etf 方法")
+    
+    def get_etf(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """取得單一ETF資料"""
+        raise NotImplementedError("子類別必須實作 get_etf 方法")
+    
+    def iter_etfs(self, issuer: str = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """逐筆串流ETF資料"""
+        raise NotImplementedError("子類別必須實作 iter_etfs 方法")
+    
+    def update_etf(self, ticker: str, update_data: Dict[str, Any]) -> bool:
+        """更新ETF資料"""
+        raise NotImplementedError("子類別必須實作 update_etf 方法")
+    
+    def delete_etf(self, ticker: str) -> bool:
+        """刪除ETF資料"""
+        raise NotImplementedError("子類別必須實作 delete_etf 方法")
+    
+    # ==================== 持股資料操作 ====================
+    
+    def write_holdings_snapshots(self, snapshots: List[Dict[str, Any]]) -> Dict[Tuple[str, str], str]:
+        """批次寫入持股快照，已存在且非強制更新時跳過
+        
+        回傳 {(etf_ticker, date): WRITE_WRITTEN / WRITE_SKIPPED / WRITE_FAILED}
+        """
+        raise NotImplementedError("子類別必須實作 write_holdings_snapshots 方法")
+    
+    def save_holdings(self, etf_ticker: str, holdings: List[Dict[str, Any]], date: str = None, force_update: bool = False) -> bool:
+        """儲存持股資料，已存在且非強制更新時跳過"""
+        date = date or datetime.now().strftime('%Y-%m-%d')
+        results = self.write_holdings_snapshots([{
+            "etf_ticker": etf_ticker,
+            "holdings": holdings,
+            "date": date,
+            "force_update": force_update
+        }])
+        return results.get((etf_ticker, date), WRITE_FAILED) in (WRITE_WRITTEN, WRITE_SKIPPED)
+    
+    def save_holdings_batch(self, snapshots: List[Dict[str, Any]]) -> Dict[Tuple[str, str], bool]:
+        """批次儲存多檔ETF的持股資料，回傳 {(etf_ticker, date): 是否成功}"""
+        results = self.write_holdings_snapshots(snapshots)
+        return {key: status in (WRITE_WRITTEN, WRITE_SKIPPED) for key, status in results.items()}
+    
+    def iter_holdings(self, etf_ticker: str, date: str = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股資料，依權重由大到小"""
+        raise NotImplementedError("子類別必須實作 iter_holdings 方法")
+    
+    def iter_holdings_by_date(self, date: str, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取指定日期的所有持股資料"""
+        raise NotImplementedError("子類別必須實作 iter_holdings_by_date 方法")
+    
+    def iter_holdings_history(self, etf_ticker: str, start_date: str = None, end_date: str = None,
+                              batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股歷史資料，依日期由新到舊"""
+        raise NotImplementedError("子類別必須實作 iter_holdings_history 方法")
+    
+    def refresh_stock_holders(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """以剛寫入的快照更新「股票→持有ETF」反向索引，不需要維護索引的後端可不實作"""
+        return True
+    
+    def refresh_holdings_summary(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """以剛寫入的快照更新每檔ETF的持股摘要，不需要維護摘要的後端可不實作"""
+        return True
+    
+    def suspend_holdings_indexes(self) -> bool:
+        """大量匯入前暫時移除寫入時用不到的持股次要索引，沒有次要索引的後端可不實作"""
+        return True
+    
+    def restore_holdings_indexes(self) -> bool:
+        """重建 suspend_holdings_indexes 移除的索引，索引已存在時不做任何事"""
+        return True
+    
+    def get_holdings_summary(self, etf_ticker: str = None) -> List[Dict[str, Any]]:
+        """取得每檔ETF的持股摘要 {etf_ticker, rows, dates, first_date, latest_date}，依筆數由多到少"""
+        raise NotImplementedError("子類別必須實作 get_holdings_summary 方法")
+    
+    def iter_holders(self, stock_code: str, start_date: str = None, end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持有指定股票的ETF，每日一筆 {date, stock_code, holders}，依日期由新到舊"""
+        raise NotImplementedError("子類別必須實作 iter_holders 方法")
+    
+    def get_adjacent_dates(self, etf_ticker: str, date: str) -> Tuple[Optional[str], Optional[str]]:
+        """取得一檔ETF在指定日期前一個與後一個有資料的日期"""
+        raise NotImplementedError("子類別必須實作 get_adjacent_dates 方法")
+    
+    # ==================== 調倉紀錄操作 ====================
+    
+    def save_holdings_changes(self, etf_ticker: str, date: str, previous_date: str,
+                              changes: List[Dict[str, Any]]) -> bool:
+        """儲存一檔ETF單日相對前一個快照的持股變動，取代該日既有紀錄"""
+        raise NotImplementedError("子類別必須實作 save_holdings_changes 方法")
+    
+    def iter_holdings_changes(self, etf_ticker: str = None, stock_code: str = None, start_date: str = None,
+                              end_date: str = None, change_types: List[str] = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股變動，依日期由新到舊"""
+        raise NotImplementedError("子類別必須實作 iter_holdings_changes 方法")
+    
+    # ==================== 每日統計操作 ====================
+    
+    def save_etf_daily_stats(self, stats: List[Dict[str, Any]]) -> bool:
+        """寫入 (或取代) ETF每日統計，每筆以 (etf_ticker, date) 識別"""
+        raise NotImplementedError("子類別必須實作 save_etf_daily_stats 方法")
+    
+    def iter_etf_daily_stats(self, etf_ticker: str = None, start_date: str = None,
+                             end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取ETF每日統計，依日期由新到舊"""
+        raise NotImplementedError("子類別必須實作 iter_etf_daily_stats 方法")
+    
+    # ==================== 隔離區操作 ====================
+    
+    def save_quarantine(self, etf_ticker: str, date: str, holdings: List[Dict[str, Any]],
+                        issues: List[Dict[str, Any]]) -> bool:
+        """將未通過檢查的快照存入隔離區，同一 (ETF, 日期) 以最新一次為準"""
+        raise NotImplementedError("子類別必須實作 save_quarantine 方法")
+    
+    def iter_quarantine(self, etf_ticker: str = None, status: str = "pending") -> Iterator[Dict[str, Any]]:
+        """讀取隔離區的快照，status 為 None 時不限狀態，依日期由新到舊"""
+        raise NotImplementedError("子類別必須實作 iter_quarantine 方法")
+    
+    def update_quarantine_status(self, etf_ticker: str, date: str, status: str) -> bool:
+        """更新隔離快照的狀態 (pending / released / discarded)"""
+        raise NotImplementedError("子類別必須實作 update_quarantine_status 方法")
+    
+    # ==================== 個股淨買賣操作 ====================
+    
+    def save_stock_net_flows(self, date: str, flows: List[Dict[str, Any]]) -> bool:
+        """儲存單日各股票的ETF合計淨買賣，取代該日既有資料"""
+        raise NotImplementedError("子類別必須實作 save_stock_net_flows 方法")
+    
+    def iter_stock_net_flows(self, stock_code: str = None, start_date: str = None,
+                             end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取個股淨買賣，依日期由新到舊"""
+        raise NotImplementedError("子類別必須實作 iter_stock_net_flows 方法")
+    
+    def get_holdings_page(self, etf_ticker: str = None, date: str = None, start_date: str = None,
+                          end_date: str = None, after: str = None,
+                          limit: int = 1000) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """以 keyset 分頁讀取持股資料，回傳 (本頁資料, 下一頁游標)"""
+        raise NotImplementedError("子類別必須實作 get_holdings_page 方法")
+    
+    # ==================== 抓取任務操作 ====================
+    
+    def enqueue_scrape_tasks(self, issuer: str, run_date: str, etf_tickers: List[str]) -> int:
+        """建立一批抓取任務，已存在的任務保留原狀態，失敗的任務改回 pending
+        
+        回傳待執行 (pending) 的任務數，失敗時回傳 -1
+        """
+        raise NotImplementedError("子類別必須實作 enqueue_scrape_tasks 方法")
+    
+    def claim_scrape_task(self, issuer: str, run_date: str, worker: str,
+                          lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """以原子操作取出下一個任務並標記為 running，租約 lease_seconds 秒
+        
+        pending 任務，以及租約已過期的 running 任務 (持有者已失聯) 都可以被取出，
+        沒有任務或資料庫錯誤時回傳 None
+        """
+        raise NotImplementedError("子類別必須實作 claim_scrape_task 方法")
+    
+    def heartbeat_scrape_task(self, task_id: str, worker: str, lease_seconds: int) -> bool:
+        """延長自己持有的任務租約，任務已被其他 worker 接手時回傳 False"""
+        raise NotImplementedError("子類別必須實作 heartbeat_scrape_task 方法")
+    
+    def finish_scrape_task(self, task_id: str, status: str, error: str = None, worker: str = None) -> bool:
+        """記錄任務結果 (done / failed)，指定 worker 時只在仍持有租約時更新"""
+        raise NotImplementedError("子類別必須實作 finish_scrape_task 方法")
+    
+    def iter_scrape_tasks(self, issuer: str = None, run_date: str = None,
+                          status: str = None) -> Iterator[Dict[str, Any]]:
+        """讀取抓取任務，依建立順序"""
+        raise NotImplementedError("子類別必須實作 iter_scrape_tasks 方法")
+    
+    # ==================== 爬蟲日誌操作 ====================
+    
+    def save_scraper_log(self, issuer: str, action: str, details: Dict[str, Any], status: str = "success") -> bool:
+        """儲存爬蟲日誌"""
+        raise NotImplementedError("子類別必須實作 save_scraper_log 方法")
+    
+    def iter_scraper_logs(self, issuer: str = None, limit: int = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取爬蟲日誌，依時間由新到舊"""
+        raise NotImplementedError("子類別必須實作 iter_scraper_logs 方法")
+    
+    # ==================== 執行指標操作 ====================
+    
+    def save_run_metrics(self, run: Dict[str, Any], etf_runs: List[Dict[str, Any]]) -> bool:
+        """一次寫入整次執行與每檔ETF的指標，並累加每日彙總"""
+        raise NotImplementedError("子類別必須實作 save_run_metrics 方法")
+    
+    def iter_runs(self, issuer: str = None, limit: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取執行紀錄，依時間由新到舊"""
+        raise NotImplementedError("子類別必須實作 iter_runs 方法")
+    
+    def iter_etf_runs(self, run_id: str) -> Iterator[Dict[str, Any]]:
+        """讀取一次執行中每檔ETF的指標"""
+        raise NotImplementedError("子類別必須實作 iter_etf_runs 方法")
+    
+    def get_daily_rollups(self, issuer: str = None, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """取得每日彙總，依日期由新到舊"""
+        raise NotImplementedError("子類別必須實作 get_daily_rollups 方法")
+    
+    # ==================== 統計查詢操作 ====================
+    
+    def get_etf_count(self, issuer: str = None) -> int:
+        """取得ETF數量"""
+        raise NotImplementedError("子類別必須實作 get_etf_count 方法")
+    
+    def get_holdings_count(self, etf_ticker: str = None, date: str = None) -> int:
+        """取得持股資料數量"""
+        raise NotImplementedError("子類別必須實作 get_holdings_count 方法")
+    
+    def get_holdings_dates(self, start_date: str = None, end_date: str = None, etf_ticker: str = None) -> List[str]:
+        """取得有持股資料的日期，由舊到新，指定 etf_ticker 時只取該ETF的日期"""
+        raise NotImplementedError("子類別必須實作 get_holdings_dates 方法")
+    
+    def get_latest_date(self, etf_ticker: str = None) -> Optional[str]:
+        """取得最新的資料日期，指定 etf_ticker 時取得該ETF的最新日期"""
+        raise NotImplementedError("子類別必須實作 get_latest_date 方法")
+    
+    def get_holdings_version(self, etf_ticker: str = None) -> Optional[str]:
+        """取得持股資料的寫入版本 (最後寫入時間)，強制重寫同一日期後也會改變，指定 etf_ticker 時只看該ETF"""
+        raise NotImplementedError("子類別必須實作 get_holdings_version 方法")
+    
+    def close(self):
+        """釋放後端資源"""
+        pass
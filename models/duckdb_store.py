@@ -0,0 +1,1081 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import duckdb
+import pandas as pd
+from config.database import get_duckdb_path
+from config.scraper_config import DATABASE_SETTINGS
+from models.base_store import (BaseHoldingsStore, TASK_FAILED, TASK_PENDING, TASK_RUNNING,
+                               WRITE_FAILED, WRITE_SKIPPED, WRITE_WRITTEN, scrape_task_id)
+from models.holdings_schema import HOLDING_FIELDS, normalize_holdings
+from models.run_metrics import RUN_METRICS_RETENTION_DAYS, build_daily_rollup
+from utils.logger import setup_logger
+
+# 持股資料表欄位 (讀取時不含 created_at)
+HOLDINGS_COLUMNS = ["etf_ticker", "date", "stock_code", "stock_name", "weight", "shares", "market_value"]
+
+HOLDINGS_SELECT = """
+    SELECT etf_ticker, strftime(date, '%Y-%m-%d') AS date, stock_code, stock_name,
+           weight, shares, market_value
+    FROM holdings
+"""
+
+SCRAPE_TASK_SELECT = """
+    task_id, issuer, etf_ticker, strftime(run_date, '%Y-%m-%d') AS run_date, position, status,
+    attempts, error, worker, lease_until, created_at, started_at, finished_at, updated_at
+"""
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS etfs (
+        ticker VARCHAR PRIMARY KEY,
+        issuer VARCHAR,
+        data VARCHAR,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS holdings (
+        etf_ticker VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        stock_code VARCHAR,
+        stock_name VARCHAR,
+        weight DOUBLE,
+        shares BIGINT,
+        market_value DOUBLE,
+        created_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scraper_logs (
+        issuer VARCHAR,
+        action VARCHAR,
+        details VARCHAR,
+        timestamp TIMESTAMP,
+        status VARCHAR
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS holdings_changes (
+        etf_ticker VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        previous_date DATE,
+        stock_code VARCHAR,
+        stock_name VARCHAR,
+        change_type VARCHAR,
+        shares_before BIGINT,
+        shares_after BIGINT,
+        shares_delta BIGINT,
+        weight_before DOUBLE,
+        weight_after DOUBLE,
+        weight_delta DOUBLE,
+        created_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS etf_daily_stats (
+        etf_ticker VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        previous_date DATE,
+        constituent_count INTEGER,
+        weight_sum DOUBLE,
+        weight_sum_ok BOOLEAN,
+        max_weight DOUBLE,
+        top10_weight DOUBLE,
+        hhi DOUBLE,
+        adds INTEGER,
+        drops INTEGER,
+        count_change INTEGER,
+        turnover DOUBLE,
+        hhi_change DOUBLE,
+        updated_at TIMESTAMP,
+        PRIMARY KEY (etf_ticker, date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_net_flows (
+        date DATE NOT NULL,
+        stock_code VARCHAR NOT NULL,
+        stock_name VARCHAR,
+        net_shares BIGINT,
+        bought_shares BIGINT,
+        sold_shares BIGINT,
+        buyers INTEGER,
+        sellers INTEGER,
+        close DOUBLE,
+        net_value DOUBLE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scrape_tasks (
+        task_id VARCHAR PRIMARY KEY,
+        issuer VARCHAR,
+        etf_ticker VARCHAR,
+        run_date DATE,
+        position INTEGER,
+        status VARCHAR,
+        attempts INTEGER,
+        error VARCHAR,
+        worker VARCHAR,
+        lease_until TIMESTAMP,
+        created_at TIMESTAMP,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS holdings_quarantine (
+        etf_ticker VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        holdings VARCHAR,
+        issues VARCHAR,
+        status VARCHAR,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        PRIMARY KEY (etf_ticker, date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS run_metrics (
+        run_id VARCHAR NOT NULL,
+        kind VARCHAR NOT NULL,
+        issuer VARCHAR,
+        etf_ticker VARCHAR,
+        timestamp TIMESTAMP,
+        outcome VARCHAR,
+        data VARCHAR
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS run_metrics_daily (
+        date DATE NOT NULL,
+        issuer VARCHAR NOT NULL,
+        runs BIGINT,
+        etfs BIGINT,
+        succeeded BIGINT,
+        failed BIGINT,
+        duration_seconds DOUBLE,
+        bytes_downloaded BIGINT,
+        rows_parsed BIGINT,
+        retries BIGINT,
+        updated_at TIMESTAMP,
+        PRIMARY KEY (date, issuer)
+    )
+    """
+]
+
+HOLDINGS_CHANGES_COLUMNS = [
+    "etf_ticker", "date", "previous_date", "stock_code", "stock_name", "change_type",
+    "shares_before", "shares_after", "shares_delta", "weight_before", "weight_after", "weight_delta"
+]
+
+DAILY_STATS_COLUMNS = [
+    "etf_ticker", "date", "previous_date", "constituent_count", "weight_sum", "weight_sum_ok",
+    "max_weight", "top10_weight", "hhi", "adds", "drops", "count_change", "turnover", "hhi_change"
+]
+
+NET_FLOW_COLUMNS = [
+    "date", "stock_code", "stock_name", "net_shares", "bought_shares", "sold_shares",
+    "buyers", "sellers", "close", "net_value"
+]
+
+ROLLUP_FIELDS = ["runs", "etfs", "succeeded", "failed", "duration_seconds", "bytes_downloaded", "rows_parsed", "retries"]
+
+class DuckDBHoldingsStore(BaseHoldingsStore):
+    """DuckDB 嵌入式儲存後端 - 不需MongoDB伺服器，適合本機分析"""
+    
+    def __init__(self, database_path: str = None):
+        self.logger = setup_logger("duckdb_store", "logs/duckdb_store.log")
+        self.database_path = database_path or get_duckdb_path()
+        
+        if self.database_path != ":memory:":
+            os.makedirs(os.path.dirname(self.database_path) or ".", exist_ok=True)
+        
+        self.conn = duckdb.connect(self.database_path)
+        # 寫入需序列化，讀取則各自使用獨立游標
+        self._write_lock = threading.Lock()
+        
+        for sql in SCHEMA_SQL:
+            self.conn.execute(sql)
+        
+        self.logger.info(f"DuckDB 連接成功: {self.database_path}")
+    
+    def _cursor(self):
+        """取得執行緒專用的游標 (DuckDB連線不可跨執行緒共用)"""
+        return self.conn.cursor()
+    
+    @staticmethod
+    def _fetch_dicts(cursor, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """分批取出查詢結果並轉為 dict"""
+        columns = [column[0] for column in cursor.description]
+        batch_size = batch_size or DATABASE_SETTINGS['cursor_batch_size']
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+    
+    @staticmethod
+    def _etf_from_row(row: Tuple) -> Dict[str, Any]:
+        """將 etfs 資料列還原為 dict"""
+        ticker, issuer, data, created_at, updated_at = row
+        etf = json.loads(data) if data else {}
+        etf.update({"ticker": ticker, "created_at": created_at, "updated_at": updated_at})
+        if issuer is not None:
+            etf["issuer"] = issuer
+        return etf
+    
+    # ==================== ETF基本資料操作 ====================
+    
+    def save_etf(self, etf_data: Dict[str, Any]) -> bool:
+        """儲存ETF基本資料"""
+        try:
+            now = datetime.now()
+            ticker = etf_data['ticker']
+            
+            with self._write_lock:
+                cursor = self._cursor()
+                existing = self.get_etf(ticker) or {}
+                
+                # 與既有欄位合併，行為同MongoDB的 $set
+                merged = {key: value for key, value in existing.items() if key not in ("created_at", "updated_at")}
+                merged.update({key: value for key, value in etf_data.items() if key not in ("created_at", "updated_at")})
+                
+                cursor.execute(
+                    "INSERT OR REPLACE INTO etfs VALUES (?, ?, ?, ?, ?)",
+                    [ticker, merged.get('issuer'), json.dumps(merged, ensure_ascii=False, default=str), now, now]
+                )
+            
+            self.logger.info(f"ETF資料儲存成功: {ticker}")
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存ETF資料失敗: {e}")
+            return False
+    
+    def get_etf(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """取得單一ETF資料"""
+        try:
+            row = self._cursor().execute(
+                "SELECT ticker, issuer, data, created_at, updated_at FROM etfs WHERE ticker = ?",
+                [ticker]
+            ).fetchone()
+            return self._etf_from_row(row) if row else None
+        except Exception as e:
+            self.logger.error(f"取得ETF資料失敗: {e}")
+            return None
+    
+    def iter_etfs(self, issuer: str = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """逐筆串流ETF資料"""
+        sql = "SELECT ticker, issuer, data, created_at, updated_at FROM etfs"
+        params = []
+        if issuer:
+            sql += " WHERE issuer = ?"
+            params.append(issuer)
+        
+        cursor = self._cursor().execute(sql + " ORDER BY ticker", params)
+        while True:
+            rows = cursor.fetchmany(batch_size or DATABASE_SETTINGS['cursor_batch_size'])
+            if not rows:
+                break
+            for row in rows:
+                yield self._etf_from_row(row)
+    
+    def update_etf(self, ticker: str, update_data: Dict[str, Any]) -> bool:
+        """更新ETF資料"""
+        try:
+            if self.get_etf(ticker) is None:
+                self.logger.warning(f"ETF資料更新無變化: {ticker}")
+                return False
+            return self.save_etf(dict(update_data, ticker=ticker))
+        except Exception as e:
+            self.logger.error(f"更新ETF資料失敗: {e}")
+            return False
+    
+    def delete_etf(self, ticker: str) -> bool:
+        """刪除ETF資料"""
+        try:
+            with self._write_lock:
+                deleted = self._cursor().execute(
+                    "DELETE FROM etfs WHERE ticker = ? RETURNING ticker", [ticker]
+                ).fetchall()
+            
+            if deleted:
+                self.logger.info(f"ETF資料刪除成功: {ticker}")
+                return True
+            else:
+                self.logger.warning(f"ETF資料不存在: {ticker}")
+                return False
+        
+        except Exception as e:
+            self.logger.error(f"刪除ETF資料失敗: {e}")
+            return False
+    
+    # ==================== 持股資料操作 ====================
+    
+    def _build_holdings_frame(self, etf_ticker: str, holdings: List[Dict[str, Any]], date: str) -> pd.DataFrame:
+        """將持股清單轉為可直接寫入的標準格式DataFrame"""
+        frame = pd.DataFrame(normalize_holdings(holdings), columns=list(HOLDING_FIELDS))
+        frame.insert(0, "etf_ticker", etf_ticker)
+        frame.insert(1, "date", pd.Timestamp(date))
+        frame["created_at"] = datetime.now()
+        return frame
+    
+    def _insert_frame(self, cursor, frame: pd.DataFrame):
+        """以向量化方式寫入整個DataFrame"""
+        cursor.register("new_holdings", frame)
+        try:
+            columns = ", ".join(HOLDINGS_COLUMNS + ["created_at"])
+            cursor.execute(f"INSERT INTO holdings ({columns}) SELECT {columns} FROM new_holdings")
+        finally:
+            cursor.unregister("new_holdings")
+    
+    def write_holdings_snapshots(self, snapshots: List[Dict[str, Any]]) -> Dict[Tuple[str, str], str]:
+        """批次寫入多檔ETF的持股資料，在同一個交易中完成"""
+        results = {}
+        if not snapshots:
+            return results
+        
+        today = datetime.now().strftime('%Y-%m-%d')
+        pending = {}
+        for snapshot in snapshots:
+            pending[(snapshot['etf_ticker'], snapshot.get('date') or today)] = snapshot
+        
+        try:
+            with self._write_lock:
+                cursor = self._cursor()
+                cursor.execute("BEGIN TRANSACTION")
+                try:
+                    frames = []
+                    for key, snapshot in pending.items():
+                        etf_ticker, date = key
+                        existing_count = cursor.execute(
+                            "SELECT count(*) FROM holdings WHERE etf_ticker = ? AND date = ?",
+                            [etf_ticker, date]
+                        ).fetchone()[0]
+                        
+                        if existing_count > 0 and not snapshot.get('force_update', False):
+                            self.logger.info(f"ETF {etf_ticker} 在 {date} 的數據已存在 ({existing_count} 筆)，跳過寫入")
+                            results[key] = WRITE_SKIPPED
+                            continue
+                        
+                        if not snapshot['holdings']:
+                            self.logger.warning(f"沒有持股資料需要儲存: {etf_ticker} - {date}")
+                            results[key] = WRITE_FAILED
+                            continue
+                        
+                        if existing_count > 0:
+                            cursor.execute(
+                                "DELETE FROM holdings WHERE etf_ticker = ? AND date = ?",
+                                [etf_ticker, date]
+                            )
+                            self.logger.info(f"強制更新：已刪除 {existing_count} 筆舊數據")
+                        
+                        frames.append(self._build_holdings_frame(etf_ticker, snapshot['holdings'], date))
+                        results[key] = WRITE_WRITTEN
+                    
+                    if frames:
+                        frame = pd.concat(frames, ignore_index=True)
+                        self._insert_frame(cursor, frame)
+                        self.logger.info(f"持股資料儲存成功: {len(frames)} 檔ETF, 共 {len(frame)} 筆")
+                    
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            
+            return results
+        
+        except Exception as e:
+            self.logger.error(f"儲存持股資料失敗: {e}")
+            return {key: WRITE_FAILED for key in pending}
+    
+    def _stream_holdings(self, where: str, params: List[Any], order_by: str = None,
+                         batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """分批讀取持股資料"""
+        sql = HOLDINGS_SELECT + f" WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        cursor = self._cursor().execute(sql, params)
+        return self._fetch_dicts(cursor, batch_size)
+    
+    def iter_holdings(self, etf_ticker: str, date: str = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股資料，依權重由大到小"""
+        where, params = "etf_ticker = ?", [etf_ticker]
+        if date:
+            where += " AND date = ?"
+            params.append(date)
+        return self._stream_holdings(where, params, "weight DESC", batch_size)
+    
+    def iter_holdings_by_date(self, date: str, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取指定日期的所有持股資料"""
+        return self._stream_holdings("date = ?", [date], batch_size=batch_size)
+    
+    def iter_holdings_history(self, etf_ticker: str, start_date: str = None, end_date: str = None,
+                              batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股歷史資料，依日期由新到舊"""
+        where, params = "etf_ticker = ?", [etf_ticker]
+        if start_date:
+            where += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            where += " AND date <= ?"
+            params.append(end_date)
+        return self._stream_holdings(where, params, "date DESC", batch_size)
+    
+    def get_holdings_summary(self, etf_ticker: str = None) -> List[Dict[str, Any]]:
+        """取得每檔ETF的持股摘要 {etf_ticker, rows, dates, first_date, latest_date}，依筆數由多到少
+        
+        欄式儲存下彙總只讀 etf_ticker、date 兩欄，直接計算不另外維護摘要
+        """
+        try:
+            sql = (
+                "SELECT etf_ticker, count(*) AS rows, count(DISTINCT date) AS dates, "
+                "strftime(min(date), '%Y-%m-%d') AS first_date, strftime(max(date), '%Y-%m-%d') AS latest_date "
+                "FROM holdings"
+            )
+            params = []
+            if etf_ticker:
+                sql += " WHERE etf_ticker = ?"
+                params.append(etf_ticker)
+            sql += " GROUP BY etf_ticker ORDER BY rows DESC"
+            return list(self._fetch_dicts(self._cursor().execute(sql, params)))
+        except Exception as e:
+            self.logger.error(f"取得持股摘要失敗: {e}")
+            return []
+    
+    def iter_holders(self, stock_code: str, start_date: str = None, end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持有指定股票的ETF，每日一筆 {date, stock_code, holders}，依日期由新到舊
+        
+        DuckDB 為欄式儲存，直接分組查詢即可，不另外維護反向索引
+        """
+        where, params = "stock_code = ?", [stock_code]
+        if start_date:
+            where += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            where += " AND date <= ?"
+            params.append(end_date)
+        
+        sql = f"""
+            SELECT strftime(date, '%Y-%m-%d') AS date, stock_code,
+                   list({{'etf_ticker': etf_ticker, 'weight': weight, 'shares': shares}} ORDER BY weight DESC) AS holders
+            FROM holdings
+            WHERE {where}
+            GROUP BY date, stock_code
+            ORDER BY date DESC
+        """
+        return self._fetch_dicts(self._cursor().execute(sql, params))
+    
+    def get_adjacent_dates(self, etf_ticker: str, date: str) -> Tuple[Optional[str], Optional[str]]:
+        """取得一檔ETF在指定日期前一個與後一個有資料的日期"""
+        row = self._cursor().execute(
+            """
+            SELECT strftime(max(date) FILTER (WHERE date < ?), '%Y-%m-%d'),
+                   strftime(min(date) FILTER (WHERE date > ?), '%Y-%m-%d')
+            FROM holdings
+            WHERE etf_ticker = ?
+            """,
+            [date, date, etf_ticker]
+        ).fetchone()
+        return row[0], row[1]
+    
+    # ==================== 調倉紀錄操作 ====================
+    
+    def save_holdings_changes(self, etf_ticker: str, date: str, previous_date: str,
+                              changes: List[Dict[str, Any]]) -> bool:
+        """儲存一檔ETF單日相對前一個快照的持股變動，取代該日既有紀錄"""
+        try:
+            frame = pd.DataFrame(changes, columns=HOLDINGS_CHANGES_COLUMNS)
+            frame["etf_ticker"] = etf_ticker
+            frame["date"] = pd.Timestamp(date)
+            frame["previous_date"] = pd.Timestamp(previous_date)
+            frame["created_at"] = datetime.now()
+            columns = ", ".join(HOLDINGS_CHANGES_COLUMNS + ["created_at"])
+            
+            with self._write_lock:
+                cursor = self._cursor()
+                cursor.execute("BEGIN TRANSACTION")
+                try:
+                    cursor.execute("DELETE FROM holdings_changes WHERE etf_ticker = ? AND date = ?", [etf_ticker, date])
+                    if not frame.empty:
+                        cursor.register("new_changes", frame)
+                        try:
+                            cursor.execute(f"INSERT INTO holdings_changes ({columns}) SELECT {columns} FROM new_changes")
+                        finally:
+                            cursor.unregister("new_changes")
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            
+            self.logger.info(f"持股變動儲存成功: {etf_ticker} {previous_date} -> {date}, 共 {len(changes)} 筆")
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存持股變動失敗: {e}")
+            return False
+    
+    def iter_holdings_changes(self, etf_ticker: str = None, stock_code: str = None, start_date: str = None,
+                              end_date: str = None, change_types: List[str] = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股變動，依日期由新到舊"""
+        conditions, params = ["TRUE"], []
+        if etf_ticker:
+            conditions.append("etf_ticker = ?")
+            params.append(etf_ticker)
+        if stock_code:
+            conditions.append("stock_code = ?")
+            params.append(stock_code)
+        if start_date:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        if change_types:
+            conditions.append(f"change_type IN ({', '.join('?' for _ in change_types)})")
+            params.extend(change_types)
+        
+        select = ", ".join(
+            f"strftime({column}, '%Y-%m-%d') AS {column}" if column in ("date", "previous_date") else column
+            for column in HOLDINGS_CHANGES_COLUMNS
+        )
+        sql = f"""
+            SELECT {select} FROM holdings_changes
+            WHERE {' AND '.join(conditions)}
+            ORDER BY date DESC, etf_ticker, weight_delta DESC
+        """
+        return self._fetch_dicts(self._cursor().execute(sql, params))
+    
+    # ==================== 每日統計操作 ====================
+    
+    def save_etf_daily_stats(self, stats: List[Dict[str, Any]]) -> bool:
+        """寫入 (或取代) ETF每日統計，每筆以 (etf_ticker, date) 識別"""
+        try:
+            if not stats:
+                return True
+            
+            columns = ", ".join(DAILY_STATS_COLUMNS + ["updated_at"])
+            placeholders = ", ".join("?" for _ in range(len(DAILY_STATS_COLUMNS) + 1))
+            updates = ", ".join(f"{column} = excluded.{column}" for column in DAILY_STATS_COLUMNS[2:] + ["updated_at"])
+            updated_at = datetime.now()
+            rows = [[item.get(column) for column in DAILY_STATS_COLUMNS] + [updated_at] for item in stats]
+            
+            with self._write_lock:
+                cursor = self._cursor()
+                cursor.execute("BEGIN TRANSACTION")
+                try:
+                    cursor.executemany(
+                        f"INSERT INTO etf_daily_stats ({columns}) VALUES ({placeholders}) "
+                        f"ON CONFLICT (etf_ticker, date) DO UPDATE SET {updates}",
+                        rows
+                    )
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存每日統計失敗: {e}")
+            return False
+    
+    def iter_etf_daily_stats(self, etf_ticker: str = None, start_date: str = None,
+                             end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取ETF每日統計，依日期由新到舊"""
+        conditions, params = ["TRUE"], []
+        if etf_ticker:
+            conditions.append("etf_ticker = ?")
+            params.append(etf_ticker)
+        if start_date:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        
+        select = ", ".join(
+            f"strftime({column}, '%Y-%m-%d') AS {column}" if column in ("date", "previous_date") else column
+            for column in DAILY_STATS_COLUMNS + ["updated_at"]
+        )
+        sql = f"SELECT {select} FROM etf_daily_stats WHERE {' AND '.join(conditions)} ORDER BY date DESC, etf_ticker"
+        return self._fetch_dicts(self._cursor().execute(sql, params))
+    
+    # ==================== 隔離區操作 ====================
+    
+    def save_quarantine(self, etf_ticker: str, date: str, holdings: List[Dict[str, Any]],
+                        issues: List[Dict[str, Any]]) -> bool:
+        """將未通過檢查的快照存入隔離區，同一 (ETF, 日期) 以最新一次為準"""
+        try:
+            now = datetime.now()
+            with self._write_lock:
+                self._cursor().execute(
+                    "INSERT INTO holdings_quarantine VALUES (?, ?, ?, ?, 'pending', ?, ?) "
+                    "ON CONFLICT (etf_ticker, date) DO UPDATE SET holdings = excluded.holdings, "
+                    "issues = excluded.issues, status = 'pending', updated_at = excluded.updated_at",
+                    [etf_ticker, date, json.dumps(holdings, ensure_ascii=False, default=str),
+                     json.dumps(issues, ensure_ascii=False, default=str), now, now]
+                )
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存隔離快照失敗: {e}")
+            return False
+    
+    def iter_quarantine(self, etf_ticker: str = None, status: str = "pending") -> Iterator[Dict[str, Any]]:
+        """讀取隔離區的快照，status 為 None 時不限狀態，依日期由新到舊"""
+        conditions, params = ["TRUE"], []
+        if etf_ticker:
+            conditions.append("etf_ticker = ?")
+            params.append(etf_ticker)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        
+        sql = f"""
+            SELECT etf_ticker, strftime(date, '%Y-%m-%d') AS date, holdings, issues, status, created_at, updated_at
+            FROM holdings_quarantine WHERE {' AND '.join(conditions)}
+            ORDER BY date DESC, etf_ticker
+        """
+        for record in self._fetch_dicts(self._cursor().execute(sql, params)):
+            record['holdings'] = json.loads(record['holdings']) if record['holdings'] else []
+            record['issues'] = json.loads(record['issues']) if record['issues'] else []
+            yield record
+    
+    def update_quarantine_status(self, etf_ticker: str, date: str, status: str) -> bool:
+        """更新隔離快照的狀態 (pending / released / discarded)"""
+        try:
+            with self._write_lock:
+                updated = self._cursor().execute(
+                    "UPDATE holdings_quarantine SET status = ?, updated_at = ? "
+                    "WHERE etf_ticker = ? AND date = ? RETURNING etf_ticker",
+                    [status, datetime.now(), etf_ticker, date]
+                ).fetchall()
+            return bool(updated)
+        
+        except Exception as e:
+            self.logger.error(f"更新隔離快照狀態失敗: {e}")
+            return False
+    
+    # ==================== 個股淨買賣操作 ====================
+    
+    def save_stock_net_flows(self, date: str, flows: List[Dict[str, Any]]) -> bool:
+        """儲存單日各股票的ETF合計淨買賣，取代該日既有資料"""
+        try:
+            frame = pd.DataFrame(flows, columns=NET_FLOW_COLUMNS)
+            frame["date"] = pd.Timestamp(date)
+            columns = ", ".join(NET_FLOW_COLUMNS)
+            
+            with self._write_lock:
+                cursor = self._cursor()
+                cursor.execute("BEGIN TRANSACTION")
+                try:
+                    cursor.execute("DELETE FROM stock_net_flows WHERE date = ?", [date])
+                    if not frame.empty:
+                        cursor.register("new_flows", frame)
+                        try:
+                            cursor.execute(f"INSERT INTO stock_net_flows ({columns}) SELECT {columns} FROM new_flows")
+                        finally:
+                            cursor.unregister("new_flows")
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            
+            self.logger.info(f"個股淨買賣儲存成功: {date}, 共 {len(flows)} 筆")
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存個股淨買賣失敗: {e}")
+            return False
+    
+    def iter_stock_net_flows(self, stock_code: str = None, start_date: str = None,
+                             end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取個股淨買賣，依日期由新到舊"""
+        conditions, params = ["TRUE"], []
+        if stock_code:
+            conditions.append("stock_code = ?")
+            params.append(stock_code)
+        if start_date:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        
+        select = ", ".join(
+            "strftime(date, '%Y-%m-%d') AS date" if column == "date" else column
+            for column in NET_FLOW_COLUMNS
+        )
+        sql = f"SELECT {select} FROM stock_net_flows WHERE {' AND '.join(conditions)} ORDER BY date DESC, stock_code"
+        return self._fetch_dicts(self._cursor().execute(sql, params))
+    
+    def get_holdings_page(self, etf_ticker: str = None, date: str = None, start_date: str = None,
+                          end_date: str = None, after: str = None,
+                          limit: int = 1000) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """以 keyset 分頁讀取持股資料，游標為 (date, etf_ticker, stock_code)"""
+        try:
+            conditions, params = ["TRUE"], []
+            if etf_ticker:
+                conditions.append("etf_ticker = ?")
+                params.append(etf_ticker)
+            if date:
+                conditions.append("date = ?")
+                params.append(date)
+            if start_date:
+                conditions.append("date >= ?")
+                params.append(start_date)
+            if end_date:
+                conditions.append("date <= ?")
+                params.append(end_date)
+            if after:
+                after_date, after_etf, after_stock = json.loads(after)
+                conditions.append(
+                    "(date > ? OR (date = ? AND (etf_ticker > ? OR (etf_ticker = ? AND stock_code > ?))))"
+                )
+                params.extend([after_date, after_date, after_etf, after_etf, after_stock])
+            
+            sql = HOLDINGS_SELECT + f" WHERE {' AND '.join(conditions)} ORDER BY date, etf_ticker, stock_code LIMIT {int(limit)}"
+            holdings = list(self._fetch_dicts(self._cursor().execute(sql, params)))
+            
+            next_cursor = None
+            if len(holdings) == limit:
+                last = holdings[-1]
+                next_cursor = json.dumps([last['date'], last['etf_ticker'], last['stock_code']])
+            return holdings, next_cursor
+        
+        except Exception as e:
+            self.logger.error(f"分頁取得持股資料失敗: {e}")
+            return [], None
+    
+    # ==================== 抓取任務操作 ====================
+    
+    def enqueue_scrape_tasks(self, issuer: str, run_date: str, etf_tickers: List[str]) -> int:
+        """建立一批抓取任務，已存在的任務保留原狀態，失敗的任務改回 pending"""
+        try:
+            now = datetime.now()
+            rows = [
+                [scrape_task_id(issuer, run_date, etf_ticker), issuer, etf_ticker, run_date, position,
+                 TASK_PENDING, 0, now, now]
+                for position, etf_ticker in enumerate(etf_tickers)
+            ]
+            
+            with self._write_lock:
+                cursor = self._cursor()
+                cursor.execute("BEGIN TRANSACTION")
+                try:
+                    if rows:
+                        cursor.executemany(
+                            "INSERT INTO scrape_tasks (task_id, issuer, etf_ticker, run_date, position, "
+                            "status, attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT (task_id) DO NOTHING",
+                            rows
+                        )
+                    # running 的任務由租約處理，過期後 claim 時自動接手
+                    cursor.execute(
+                        "UPDATE scrape_tasks SET status = ?, updated_at = ? "
+                        "WHERE issuer = ? AND run_date = ? AND status = ?",
+                        [TASK_PENDING, now, issuer, run_date, TASK_FAILED]
+                    )
+                    pending = cursor.execute(
+                        "SELECT COUNT(*) FROM scrape_tasks WHERE issuer = ? AND run_date = ? AND status = ?",
+                        [issuer, run_date, TASK_PENDING]
+                    ).fetchone()[0]
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            return pending
+        
+        except Exception as e:
+            self.logger.error(f"建立抓取任務失敗: {e}")
+            return -1
+    
+    def claim_scrape_task(self, issuer: str, run_date: str, worker: str,
+                          lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """以原子操作取出下一個 pending 或租約已過期的任務並標記為 running"""
+        try:
+            now = datetime.now()
+            with self._write_lock:
+                cursor = self._cursor().execute(
+                    f"""
+                    UPDATE scrape_tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1,
+                           started_at = ?, updated_at = ?
+                    WHERE task_id = (
+                        SELECT task_id FROM scrape_tasks
+                        WHERE issuer = ? AND run_date = ?
+                          AND (status = ? OR (status = ? AND (lease_until IS NULL OR lease_until < ?)))
+                        ORDER BY position LIMIT 1
+                    )
+                    RETURNING {SCRAPE_TASK_SELECT}
+                    """,
+                    [TASK_RUNNING, worker, now + timedelta(seconds=lease_seconds), now, now,
+                     issuer, run_date, TASK_PENDING, TASK_RUNNING, now]
+                )
+                return next(self._fetch_dicts(cursor), None)
+        
+        except Exception as e:
+            self.logger.error(f"領取抓取任務失敗: {e}")
+            return None
+    
+    def heartbeat_scrape_task(self, task_id: str, worker: str, lease_seconds: int) -> bool:
+        """延長自己持有的任務租約"""
+        try:
+            now = datetime.now()
+            with self._write_lock:
+                updated = self._cursor().execute(
+                    "UPDATE scrape_tasks SET lease_until = ?, updated_at = ? "
+                    "WHERE task_id = ? AND worker = ? AND status = ? RETURNING task_id",
+                    [now + timedelta(seconds=lease_seconds), now, task_id, worker, TASK_RUNNING]
+                ).fetchall()
+            return bool(updated)
+        
+        except Exception as e:
+            self.logger.error(f"延長抓取任務 {task_id} 租約失敗: {e}")
+            return False
+    
+    def finish_scrape_task(self, task_id: str, status: str, error: str = None, worker: str = None) -> bool:
+        """記錄任務結果 (done / failed)，指定 worker 時只在仍持有租約時更新"""
+        try:
+            now = datetime.now()
+            sql = ("UPDATE scrape_tasks SET status = ?, error = ?, lease_until = NULL, finished_at = ?, updated_at = ? "
+                   "WHERE task_id = ?")
+            params = [status, error, now, now, task_id]
+            if worker:
+                sql += " AND worker = ? AND status = ?"
+                params += [worker, TASK_RUNNING]
+            with self._write_lock:
+                updated = self._cursor().execute(sql + " RETURNING task_id", params).fetchall()
+            return bool(updated)
+        
+        except Exception as e:
+            self.logger.error(f"更新抓取任務 {task_id} 失敗: {e}")
+            return False
+    
+    def iter_scrape_tasks(self, issuer: str = None, run_date: str = None,
+                          status: str = None) -> Iterator[Dict[str, Any]]:
+        """讀取抓取任務，依建立順序"""
+        conditions, params = ["TRUE"], []
+        if issuer:
+            conditions.append("issuer = ?")
+            params.append(issuer)
+        if run_date:
+            conditions.append("run_date = ?")
+            params.append(run_date)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        
+        sql = f"""
+            SELECT {SCRAPE_TASK_SELECT} FROM scrape_tasks WHERE {' AND '.join(conditions)}
+            ORDER BY run_date DESC, position
+        """
+        return self._fetch_dicts(self._cursor().execute(sql, params))
+    
+    # ==================== 爬蟲日誌操作 ====================
+    
+    def save_scraper_log(self, issuer: str, action: str, details: Dict[str, Any], status: str = "success") -> bool:
+        """儲存爬蟲日誌"""
+        try:
+            with self._write_lock:
+                self._cursor().execute(
+                    "INSERT INTO scraper_logs VALUES (?, ?, ?, ?, ?)",
+                    [issuer, action, json.dumps(details, ensure_ascii=False, default=str), datetime.now(), status]
+                )
+            self.logger.info(f"爬蟲日誌儲存成功: {issuer} - {action}")
+            return True
+        except Exception as e:
+            self.logger.error(f"儲存爬蟲日誌失敗: {e}")
+            return False
+    
+    def iter_scraper_logs(self, issuer: str = None, limit: int = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取爬蟲日誌，依時間由新到舊"""
+        sql = "SELECT issuer, action, details, timestamp, status FROM scraper_logs"
+        params = []
+        if issuer:
+            sql += " WHERE issuer = ?"
+            params.append(issuer)
+        # 同一時間的日誌依寫入順序 (rowid)，與 MongoDB 以 _id 排序一致
+        sql += " ORDER BY timestamp DESC, rowid DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        
+        for log in self._fetch_dicts(self._cursor().execute(sql, params), batch_size):
+            log['details'] = json.loads(log['details']) if log['details'] else {}
+            yield log
+    
+    # ==================== 執行指標操作 ====================
+    
+    def save_run_metrics(self, run: Dict[str, Any], etf_runs: List[Dict[str, Any]]) -> bool:
+        """一次寫入整次執行與每檔ETF的指標，累加每日彙總並刪除超過保存天數的紀錄"""
+        try:
+            rows = [[run['run_id'], "run", run['issuer'], None, run['timestamp'], run['outcome'],
+                     json.dumps(run, ensure_ascii=False, default=str)]]
+            for etf_run in etf_runs:
+                rows.append([etf_run['run_id'], "etf", etf_run['issuer'], etf_run['etf_ticker'], etf_run['timestamp'],
+                             etf_run['outcome'], json.dumps(etf_run, ensure_ascii=False, default=str)])
+            
+            rollup = build_daily_rollup(run, etf_runs)
+            columns = ", ".join(ROLLUP_FIELDS)
+            placeholders = ", ".join("?" for _ in ROLLUP_FIELDS)
+            updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in ROLLUP_FIELDS)
+            
+            with self._write_lock:
+                cursor = self._cursor()
+                cursor.execute("BEGIN TRANSACTION")
+                try:
+                    cursor.executemany("INSERT INTO run_metrics VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                    cursor.execute(
+                        f"INSERT INTO run_metrics_daily (date, issuer, {columns}, updated_at) "
+                        f"VALUES (?, ?, {placeholders}, ?) "
+                        f"ON CONFLICT (date, issuer) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+                        [run['timestamp'].date(), run['issuer']] + [rollup[field] for field in ROLLUP_FIELDS] + [datetime.now()]
+                    )
+                    cursor.execute(
+                        "DELETE FROM run_metrics WHERE timestamp < ?",
+                        [datetime.now() - timedelta(days=RUN_METRICS_RETENTION_DAYS)]
+                    )
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存執行指標失敗: {e}")
+            return False
+    
+    def _iter_run_data(self, where: str, params: List[Any], limit: int = None) -> Iterator[Dict[str, Any]]:
+        """讀取執行指標的完整內容"""
+        sql = f"SELECT data FROM run_metrics WHERE {where} ORDER BY timestamp DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        for row in self._fetch_dicts(self._cursor().execute(sql, params)):
+            yield json.loads(row['data'])
+    
+    def iter_runs(self, issuer: str = None, limit: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取執行紀錄，依時間由新到舊"""
+        where, params = "kind = 'run'", []
+        if issuer:
+            where += " AND issuer = ?"
+            params.append(issuer)
+        return self._iter_run_data(where, params, limit)
+    
+    def iter_etf_runs(self, run_id: str) -> Iterator[Dict[str, Any]]:
+        """讀取一次執行中每檔ETF的指標"""
+        return self._iter_run_data("kind = 'etf' AND run_id = ?", [run_id])
+    
+    def get_daily_rollups(self, issuer: str = None, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """取得每日彙總，依日期由新到舊"""
+        try:
+            sql = f"SELECT strftime(date, '%Y-%m-%d') AS date, issuer, {', '.join(ROLLUP_FIELDS)}, updated_at FROM run_metrics_daily"
+            conditions, params = [], []
+            if issuer:
+                conditions.append("issuer = ?")
+                params.append(issuer)
+            if start_date:
+                conditions.append("date >= ?")
+                params.append(start_date)
+            if end_date:
+                conditions.append("date <= ?")
+                params.append(end_date)
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY date DESC"
+            return list(self._fetch_dicts(self._cursor().execute(sql, params)))
+        except Exception as e:
+            self.logger.error(f"取得每日彙總失敗: {e}")
+            return []
+    
+    # ==================== 統計查詢操作 ====================
+    
+    def get_etf_count(self, issuer: str = None) -> int:
+        """取得ETF數量"""
+        try:
+            sql, params = "SELECT count(*) FROM etfs", []
+            if issuer:
+                sql += " WHERE issuer = ?"
+                params.append(issuer)
+            return self._cursor().execute(sql, params).fetchone()[0]
+        except Exception as e:
+            self.logger.error(f"取得ETF數量失敗: {e}")
+            return 0
+    
+    def get_holdings_count(self, etf_ticker: str = None, date: str = None) -> int:
+        """取得持股資料數量"""
+        try:
+            conditions, params = ["TRUE"], []
+            if etf_ticker:
+                conditions.append("etf_ticker = ?")
+                params.append(etf_ticker)
+            if date:
+                conditions.append("date = ?")
+                params.append(date)
+            sql = f"SELECT count(*) FROM holdings WHERE {' AND '.join(conditions)}"
+            return self._cursor().execute(sql, params).fetchone()[0]
+        except Exception as e:
+            self.logger.error(f"取得持股數量失敗: {e}")
+            return 0
+    
+    def get_holdings_dates(self, start_date: str = None, end_date: str = None, etf_ticker: str = None) -> List[str]:
+        """取得有持股資料的日期，由舊到新，指定 etf_ticker 時只取該ETF的日期"""
+        try:
+            conditions, params = ["TRUE"], []
+            if etf_ticker:
+                conditions.append("etf_ticker = ?")
+                params.append(etf_ticker)
+            if start_date:
+                conditions.append("date >= ?")
+                params.append(start_date)
+            if end_date:
+                conditions.append("date <= ?")
+                params.append(end_date)
+            
+            rows = self._cursor().execute(
+                f"SELECT DISTINCT strftime(date, '%Y-%m-%d') AS date FROM holdings "
+                f"WHERE {' AND '.join(conditions)} ORDER BY date",
+                params
+            ).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            self.logger.error(f"取得持股日期失敗: {e}")
+            return []
+    
+    def get_latest_date(self, etf_ticker: str = None) -> Optional[str]:
+        """取得最新的資料日期，指定 etf_ticker 時取得該ETF的最新日期"""
+        try:
+            sql, params = "SELECT strftime(max(date), '%Y-%m-%d') FROM holdings", []
+            if etf_ticker:
+                sql += " WHERE etf_ticker = ?"
+                params.append(etf_ticker)
+            row = self._cursor().execute(sql, params).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            self.logger.error(f"取得最新日期失敗: {e}")
+            return None
+    
+    def get_holdings_version(self, etf_ticker: str = None) -> Optional[str]:
+        """取得持股資料的寫入版本，以最後寫入的 created_at 表示 (強制重寫會刪除舊資料後重新寫入)"""
+        try:
+            sql, params = "SELECT CAST(max(created_at) AS VARCHAR) FROM holdings", []
+            if etf_ticker:
+                sql += " WHERE etf_ticker = ?"
+                params.append(etf_ticker)
+            row = self._cursor().execute(sql, params).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            self.logger.error(f"取得持股寫入版本失敗: {e}")
+            return None
+    
+    def close(self):
+        """關閉DuckDB連線"""
+        try:
+            self.conn.close()
+            self.logger.info("DuckDB 連接已關閉")
+        except Exception as e:
+            self.logger.error(f"關閉DuckDB連接失敗: {e}")
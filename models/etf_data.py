@@ -1,196 +1,356 @@
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from bson import ObjectId
-from config.mongodb import get_mongodb_manager
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from config.database import get_storage_backend, is_parquet_archive_enabled, is_weight_cube_enabled
+from models.base_store import BaseHoldingsStore, WRITE_FAILED, WRITE_QUARANTINED, WRITE_SKIPPED, WRITE_WRITTEN
+from models.holdings_schema import normalize_holdings
+from models.holdings_validator import get_validation_mode, validate_snapshot
+from utils.cache import TTLCache
+from utils.env import env_float, env_int
 from utils.logger import setup_logger
 
+def create_store(backend: str = None) -> BaseHoldingsStore:
+    """依名稱建立儲存後端，未指定時讀取 ETF_STORAGE_BACKEND 環境變數"""
+    backend = (backend or get_storage_backend()).lower()
+    
+    if backend == "mongodb":
+        from models.mongo_store import MongoHoldingsStore
+        return MongoHoldingsStore()
+    if backend == "duckdb":
+        from models.duckdb_store import DuckDBHoldingsStore
+        return DuckDBHoldingsStore()
+    
+    raise ValueError(f"未知的儲存後端: {backend}")
+
 class ETFDataManager:
-    """ETF資料管理器 - MongoDB操作"""
+    """ETF資料管理器 - 透過可替換的儲存後端存取資料
     
-    def __init__(self):
-        self.mongodb = get_mongodb_manager()
+    get_etf、get_holdings、get_latest_date 的結果會快取在記憶體中，
+    經由本物件寫入時精確失效；其他程序寫入的資料最多延遲 ETF_CACHE_TTL 秒才會看到
+    """
+    
+    def __init__(self, backend: str = None, store: BaseHoldingsStore = None,
+                 cache_size: int = None, cache_ttl: float = None):
         self.logger = setup_logger("etf_data", "logs/etf_data.log")
+        self.store = store or create_store(backend)
+        
+        # 讀取快取，容量設為0即停用
+        if cache_size is None:
+            cache_size = env_int("ETF_CACHE_SIZE", 256)
+        if cache_ttl is None:
+            cache_ttl = env_float("ETF_CACHE_TTL", 300.0)
+        self.cache = TTLCache(cache_size, cache_ttl)
+        
+        # MongoDB 後端保留 mongodb 屬性，供既有程式直接存取集合
+        self.mongodb = getattr(self.store, "mongodb", None)
+        
+        # 選用的 Parquet 封存，寫入成功的快照會另外匯出
+        self.archive = None
+        if is_parquet_archive_enabled():
+            from models.parquet_archive import HoldingsParquetArchive
+            self.archive = HoldingsParquetArchive()
+        
+        # 選用的權重方塊，寫入成功的快照同步更新
+        self.weight_cube = None
+        if is_weight_cube_enabled():
+            from analytics.weight_cube import WeightCube
+            self.weight_cube = WeightCube(etf_manager=self)
+    
+    def close(self):
+        """釋放儲存後端資源"""
+        self.cache.clear()
+        self.store.close()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """取得讀取快取的命中統計"""
+        return self.cache.stats()
+    
+    def _invalidate_holdings(self, etf_ticker: str, date: str):
+        """持股寫入後移除受影響的快取項目"""
+        self.cache.invalidate(("holdings", etf_ticker, date))
+        self.cache.invalidate(("holdings", etf_ticker, None))
+        self.cache.invalidate(("latest_date", None))
+        self.cache.invalidate(("latest_date", etf_ticker))
     
     # ==================== ETF基本資料操作 ====================
     
     def save_etf(self, etf_data: Dict[str, Any]) -> bool:
         """儲存ETF基本資料"""
-        try:
-            # 添加時間戳
-            etf_data['created_at'] = datetime.now()
-            etf_data['updated_at'] = datetime.now()
-            
-            # 使用upsert操作，如果ticker已存在則更新
-            result = self.mongodb.etfs.update_one(
-                {"ticker": etf_data['ticker']},
-                {"$set": etf_data},
-                upsert=True
-            )
-            
-            if result.upserted_id or result.modified_count > 0:
-                self.logger.info(f"ETF資料儲存成功: {etf_data['ticker']}")
-                return True
-            else:
-                self.logger.warning(f"ETF資料儲存無變化: {etf_data['ticker']}")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"儲存ETF資料失敗: {e}")
-            return False
+        success = self.store.save_etf(etf_data)
+        self.cache.invalidate(("etf", etf_data.get('ticker')))
+        return success
     
     def get_etf(self, ticker: str) -> Optional[Dict[str, Any]]:
         """取得單一ETF資料"""
-        try:
-            etf = self.mongodb.etfs.find_one({"ticker": ticker})
-            if etf:
-                # 移除MongoDB的_id欄位
-                etf.pop('_id', None)
-            return etf
-        except Exception as e:
-            self.logger.error(f"取得ETF資料失敗: {e}")
-            return None
+        etf = self.cache.get_or_load(("etf", ticker), lambda: self.store.get_etf(ticker), cache_none=False)
+        return dict(etf) if etf is not None else None
     
     def get_all_etfs(self, issuer: str = None) -> List[Dict[str, Any]]:
         """取得所有ETF資料"""
         try:
-            filter_query = {}
-            if issuer:
-                filter_query['issuer'] = issuer
-            
-            etfs = list(self.mongodb.etfs.find(filter_query))
-            
-            # 移除MongoDB的_id欄位
-            for etf in etfs:
-                etf.pop('_id', None)
-            
-            return etfs
-            
+            return list(self.store.iter_etfs(issuer))
         except Exception as e:
             self.logger.error(f"取得所有ETF資料失敗: {e}")
             return []
     
+    def iter_etfs(self, issuer: str = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """逐筆串流ETF資料"""
+        return self.store.iter_etfs(issuer, batch_size)
+    
     def update_etf(self, ticker: str, update_data: Dict[str, Any]) -> bool:
         """更新ETF資料"""
-        try:
-            update_data['updated_at'] = datetime.now()
-            
-            result = self.mongodb.etfs.update_one(
-                {"ticker": ticker},
-                {"$set": update_data}
-            )
-            
-            if result.modified_count > 0:
-                self.logger.info(f"ETF資料更新成功: {ticker}")
-                return True
-            else:
-                self.logger.warning(f"ETF資料更新無變化: {ticker}")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"更新ETF資料失敗: {e}")
-            return False
+        success = self.store.update_etf(ticker, update_data)
+        self.cache.invalidate(("etf", ticker))
+        return success
     
     def delete_etf(self, ticker: str) -> bool:
         """刪除ETF資料"""
-        try:
-            result = self.mongodb.etfs.delete_one({"ticker": ticker})
-            
-            if result.deleted_count > 0:
-                self.logger.info(f"ETF資料刪除成功: {ticker}")
-                return True
-            else:
-                self.logger.warning(f"ETF資料不存在: {ticker}")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"刪除ETF資料失敗: {e}")
-            return False
+        success = self.store.delete_etf(ticker)
+        self.cache.invalidate(("etf", ticker))
+        return success
     
     # ==================== 持股資料操作 ====================
     
     def save_holdings(self, etf_ticker: str, holdings: List[Dict[str, Any]], date: str = None, force_update: bool = False) -> bool:
         """儲存持股資料 - 智能重複檢查版本"""
-        try:
-            if date is None:
-                date = datetime.now().strftime('%Y-%m-%d')
-            
-            # 檢查是否已存在相同的數據
-            existing_count = self.mongodb.holdings.count_documents({
-                "etf_ticker": etf_ticker,
-                "date": date
-            })
-            
-            if existing_count > 0 and not force_update:
-                self.logger.info(f"ETF {etf_ticker} 在 {date} 的數據已存在 ({existing_count} 筆)，跳過寫入")
-                return True
-            
-            # 如果強制更新，先刪除舊數據
-            if force_update and existing_count > 0:
-                delete_result = self.mongodb.holdings.delete_many({
-                    "etf_ticker": etf_ticker,
-                    "date": date
-                })
-                self.logger.info(f"強制更新：已刪除 {delete_result.deleted_count} 筆舊數據")
-            
-            # 準備新資料
-            holdings_data = []
-            for holding in holdings:
-                holding_data = {
-                    "etf_ticker": etf_ticker,
-                    "date": date,
-                    "stock_code": holding.get('stock_code', ''),
-                    "stock_name": holding.get('stock_name', ''),
-                    "weight": holding.get('weight', 0.0),
-                    "shares": holding.get('shares', 0),
-                    "market_value": holding.get('market_value', 0.0),
-                    "created_at": datetime.now()
-                }
-                holdings_data.append(holding_data)
-            
-            # 批量插入新資料
-            if holdings_data:
-                result = self.mongodb.holdings.insert_many(holdings_data)
-                action = "更新" if force_update and existing_count > 0 else "儲存"
-                self.logger.info(f"持股資料{action}成功: {etf_ticker} - {date}, 共 {len(result.inserted_ids)} 筆")
-                return True
+        date = date or datetime.now().strftime('%Y-%m-%d')
+        results = self.write_holdings_snapshots([{
+            "etf_ticker": etf_ticker,
+            "holdings": holdings,
+            "date": date,
+            "force_update": force_update
+        }])
+        return results.get((etf_ticker, date), WRITE_FAILED) in (WRITE_WRITTEN, WRITE_SKIPPED)
+    
+    def save_holdings_batch(self, snapshots: List[Dict[str, Any]]) -> Dict[Tuple[str, str], bool]:
+        """批次儲存多檔ETF的持股資料，被隔離的快照視為失敗"""
+        results = self.write_holdings_snapshots(snapshots)
+        return {key: status in (WRITE_WRITTEN, WRITE_SKIPPED) for key, status in results.items()}
+    
+    def write_holdings_snapshots(self, snapshots: List[Dict[str, Any]], deferred: bool = False) -> Dict[Tuple[str, str], str]:
+        """寫入持股快照並對實際寫入的快照執行後續處理，回傳各快照的寫入結果
+        
+        deferred 供歷史回填使用：寫入前檢查照常執行，但不逐筆計算調倉紀錄、每日統計與權重方塊，
+        由呼叫端在匯入完成後以 RebalanceEngine / PortfolioStatsEngine / WeightCube 一次重建
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        
+        # 補上日期並轉為標準欄位，同一批次內相同 (ETF, 日期) 以最後一筆為準；
+        # 無法轉換的快照 (例如權重為 "N/A") 只讓該快照失敗，不影響同批次其他ETF
+        pending = {}
+        rejected = {}
+        for snapshot in snapshots:
+            key = (snapshot['etf_ticker'], snapshot.get('date') or today)
+            try:
+                pending[key] = dict(snapshot, date=key[1], holdings=normalize_holdings(snapshot['holdings']))
+                rejected.pop(key, None)
+            except (TypeError, ValueError) as e:
+                self.logger.error(f"ETF {key[0]} {key[1]} 持股資料格式錯誤，不寫入: {e}")
+                pending.pop(key, None)
+                rejected[key] = WRITE_FAILED
+        
+        quarantined = self._validate_snapshots(pending)
+        for key in quarantined:
+            del pending[key]
+        
+        results = self.store.write_holdings_snapshots(list(pending.values())) if pending else {}
+        results.update(quarantined)
+        results.update(rejected)
+        
+        written = [snapshot for key, snapshot in pending.items() if results.get(key) == WRITE_WRITTEN]
+        for snapshot in written:
+            self._invalidate_holdings(snapshot['etf_ticker'], snapshot['date'])
+        if written:
+            self._after_holdings_saved(written, deferred)
+        
+        return results
+    
+    def _validate_snapshots(self, pending: Dict[Tuple[str, str], Dict[str, Any]]) -> Dict[Tuple[str, str], str]:
+        """寫入前檢查快照，回傳被隔離的快照 {(etf_ticker, date): WRITE_QUARANTINED}
+        
+        讀到的前一個快照存回 snapshot['previous']，寫入後計算調倉時不必重讀
+        """
+        mode = get_validation_mode()
+        if mode == "off":
+            return {}
+        
+        quarantined = {}
+        for key, snapshot in pending.items():
+            if snapshot.get('skip_validation') or not snapshot['holdings']:
+                continue
+            
+            etf_ticker, date = key
+            try:
+                previous_date, _ = self.store.get_adjacent_dates(etf_ticker, date)
+                previous = list(self.store.iter_holdings(etf_ticker, previous_date)) if previous_date else None
+                snapshot['previous'] = (previous_date, previous)
+                issues = validate_snapshot(snapshot['holdings'], previous)
+            except Exception as e:
+                self.logger.error(f"檢查 {etf_ticker} {date} 持股失敗，照常寫入: {e}")
+                continue
+            
+            if not issues:
+                continue
+            
+            messages = "; ".join(issue['message'] for issue in issues)
+            if mode == "warn":
+                self.logger.warning(f"ETF {etf_ticker} {date} 持股檢查未通過 (僅記錄): {messages}")
+                continue
+            
+            self.logger.warning(f"ETF {etf_ticker} {date} 持股檢查未通過，已隔離: {messages}")
+            if self.store.save_quarantine(etf_ticker, date, snapshot['holdings'], issues):
+                quarantined[key] = WRITE_QUARANTINED
             else:
-                self.logger.warning(f"沒有持股資料需要儲存: {etf_ticker} - {date}")
-                return False
-                
+                quarantined[key] = WRITE_FAILED
+        
+        return quarantined
+    
+    def _after_holdings_saved(self, snapshots: List[Dict[str, Any]], deferred: bool = False):
+        """持股寫入成功後的後續處理，失敗只記錄不影響寫入結果；deferred 時略過需逐筆讀取相鄰日期的部分"""
+        if not self.store.refresh_stock_holders(snapshots):
+            keys = [(snapshot['etf_ticker'], snapshot['date']) for snapshot in snapshots]
+            self.logger.error(f"股票持有ETF索引更新失敗: {keys}")
+        
+        if not self.store.refresh_holdings_summary(snapshots):
+            keys = [(snapshot['etf_ticker'], snapshot['date']) for snapshot in snapshots]
+            self.logger.error(f"持股摘要更新失敗: {keys}")
+        
+        if not deferred:
+            for snapshot in snapshots:
+                self._refresh_holdings_changes(snapshot)
+        
+        if self.archive is not None:
+            for snapshot in snapshots:
+                self.archive.write_snapshot(snapshot['etf_ticker'], snapshot['date'], snapshot['holdings'])
+        
+        if self.weight_cube is not None and not deferred:
+            for snapshot in sorted(snapshots, key=lambda snapshot: snapshot['date']):
+                self.weight_cube.write_snapshot(snapshot['etf_ticker'], snapshot['date'], snapshot['holdings'])
+    
+    def _refresh_holdings_changes(self, snapshot: Dict[str, Any]):
+        """重新計算受此快照影響的調倉紀錄與每日統計：本日相對前一日，以及下一日相對本日 (補寫舊日期時)
+        
+        每日統計由當日持股與調倉紀錄算出，集中度變化則沿用前一日已存的統計值，不重讀歷史；
+        調倉比對失敗時仍寫入不含調倉欄位的統計
+        """
+        from analytics.portfolio_stats import build_daily_stats
+        
+        etf_ticker, date = snapshot['etf_ticker'], snapshot['date']
+        # 標準格式的持股不含 etf_ticker，比對時以 (etf_ticker, stock_code) 合併，需補上
+        holdings = [dict(holding, etf_ticker=etf_ticker) for holding in snapshot['holdings']]
+        try:
+            previous_date, next_date = self.store.get_adjacent_dates(etf_ticker, date)
+        except Exception as e:
+            self.logger.error(f"取得 {etf_ticker} {date} 相鄰日期失敗: {e}")
+            return
+        
+        changes, previous_stats = None, None
+        if previous_date:
+            # 寫入前檢查已讀過前一個快照時直接沿用
+            checked_date, previous = snapshot.get('previous') or (None, None)
+            if checked_date != previous_date:
+                previous = None
+            changes = self._save_holdings_changes(etf_ticker, date, previous_date, previous, holdings)
+            try:
+                previous_stats = next(self.store.iter_etf_daily_stats(etf_ticker, previous_date, previous_date), None)
+            except Exception as e:
+                self.logger.error(f"讀取 {etf_ticker} {previous_date} 每日統計失敗: {e}")
+        
+        stats = [build_daily_stats(etf_ticker, date, holdings, previous_date, changes, previous_stats)]
+        
+        if next_date:
+            try:
+                following = [dict(holding, etf_ticker=etf_ticker)
+                             for holding in self.store.iter_holdings(etf_ticker, next_date)]
+            except Exception as e:
+                self.logger.error(f"讀取 {etf_ticker} {next_date} 持股失敗: {e}")
+                following = None
+            if following is not None:
+                changes = self._save_holdings_changes(etf_ticker, next_date, date, holdings, following)
+                stats.append(build_daily_stats(etf_ticker, next_date, following, date, changes, stats[0]))
+        
+        if not self.store.save_etf_daily_stats(stats):
+            self.logger.error(f"ETF {etf_ticker} {date} 每日統計寫入失敗")
+    
+    def _save_holdings_changes(self, etf_ticker: str, date: str, previous_date: str,
+                               previous: Optional[List[Dict[str, Any]]],
+                               current: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """比對兩個快照並寫入調倉紀錄，previous 為 None 時從儲存後端讀取；失敗時回傳 None"""
+        from analytics.rebalance import diff_holdings
+        
+        try:
+            if previous is None:
+                previous = self.store.iter_holdings(etf_ticker, previous_date)
+            changes = diff_holdings(previous, current)
+        except Exception as e:
+            self.logger.error(f"計算 {etf_ticker} {date} 調倉紀錄失敗: {e}")
+            return None
+        
+        if not self.store.save_holdings_changes(etf_ticker, date, previous_date, changes):
+            self.logger.error(f"ETF {etf_ticker} {date} 調倉紀錄寫入失敗")
+        return changes
+    
+    def suspend_holdings_indexes(self) -> bool:
+        """大量匯入前暫時移除持股次要索引"""
+        return self.store.suspend_holdings_indexes()
+    
+    def restore_holdings_indexes(self) -> bool:
+        """重建暫時移除的持股次要索引"""
+        return self.store.restore_holdings_indexes()
+    
+    # ==================== 隔離區操作 ====================
+    
+    def get_quarantined(self, etf_ticker: str = None, status: str = "pending") -> List[Dict[str, Any]]:
+        """取得被隔離的快照，依日期由新到舊"""
+        try:
+            return list(self.store.iter_quarantine(etf_ticker, status))
         except Exception as e:
-            self.logger.error(f"儲存持股資料失敗: {e}")
+            self.logger.error(f"取得隔離快照失敗: {e}")
+            return []
+    
+    def release_quarantined(self, etf_ticker: str, date: str) -> bool:
+        """確認隔離的快照無誤後略過檢查寫入"""
+        record = next((item for item in self.store.iter_quarantine(etf_ticker, None) if item['date'] == date), None)
+        if record is None:
+            self.logger.warning(f"隔離區沒有 {etf_ticker} {date} 的快照")
             return False
+        
+        results = self.write_holdings_snapshots([{
+            "etf_ticker": etf_ticker,
+            "date": date,
+            "holdings": record['holdings'],
+            "force_update": True,
+            "skip_validation": True
+        }])
+        if results.get((etf_ticker, date)) != WRITE_WRITTEN:
+            return False
+        return self.store.update_quarantine_status(etf_ticker, date, "released")
+    
+    def discard_quarantined(self, etf_ticker: str, date: str) -> bool:
+        """捨棄隔離的快照"""
+        return self.store.update_quarantine_status(etf_ticker, date, "discarded")
     
     def get_holdings(self, etf_ticker: str, date: str = None) -> List[Dict[str, Any]]:
         """取得持股資料"""
         try:
-            filter_query = {"etf_ticker": etf_ticker}
-            if date:
-                filter_query["date"] = date
-            
-            holdings = list(self.mongodb.holdings.find(filter_query).sort("weight", -1))
-            
-            # 移除MongoDB的_id欄位
-            for holding in holdings:
-                holding.pop('_id', None)
-            
-            return holdings
-            
+            holdings = self.cache.get_or_load(("holdings", etf_ticker, date),
+                                              lambda: list(self.store.iter_holdings(etf_ticker, date)))
+            return [dict(holding) for holding in holdings]
         except Exception as e:
             self.logger.error(f"取得持股資料失敗: {e}")
             return []
     
+    def get_latest_holdings(self, etf_ticker: str, limit: int = None) -> List[Dict[str, Any]]:
+        """取得一檔ETF最新一日的持股 (依權重由大到小)，先查最新日期再只讀該日資料"""
+        date = self.get_latest_date(etf_ticker)
+        if not date:
+            return []
+        holdings = self.get_holdings(etf_ticker, date)
+        return holdings[:limit] if limit else holdings
+    
     def get_holdings_by_date(self, date: str) -> List[Dict[str, Any]]:
         """取得指定日期的所有持股資料"""
         try:
-            holdings = list(self.mongodb.holdings.find({"date": date}))
-            
-            # 移除MongoDB的_id欄位
-            for holding in holdings:
-                holding.pop('_id', None)
-            
-            return holdings
-            
+            return list(self.store.iter_holdings_by_date(date))
         except Exception as e:
             self.logger.error(f"取得日期持股資料失敗: {e}")
             return []
@@ -198,125 +358,205 @@ class ETFDataManager:
     def get_holdings_history(self, etf_ticker: str, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """取得持股歷史資料"""
         try:
-            filter_query = {"etf_ticker": etf_ticker}
-            
-            if start_date and end_date:
-                filter_query["date"] = {"$gte": start_date, "$lte": end_date}
-            elif start_date:
-                filter_query["date"] = {"$gte": start_date}
-            elif end_date:
-                filter_query["date"] = {"$lte": end_date}
-            
-            holdings = list(self.mongodb.holdings.find(filter_query).sort("date", -1))
-            
-            # 移除MongoDB的_id欄位
-            for holding in holdings:
-                holding.pop('_id', None)
-            
-            return holdings
-            
+            return list(self.store.iter_holdings_history(etf_ticker, start_date, end_date))
         except Exception as e:
             self.logger.error(f"取得持股歷史資料失敗: {e}")
             return []
     
-    # ==================== 爬蟲日誌操作 ====================
+    def get_holders(self, stock_code: str, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """取得持有指定股票的ETF，每日一筆 {date, stock_code, holders: [{etf_ticker, weight, shares}]}
+        
+        只查單日時 start_date 與 end_date 設為同一天
+        """
+        try:
+            return list(self.store.iter_holders(stock_code, start_date, end_date))
+        except Exception as e:
+            self.logger.error(f"取得股票持有ETF失敗: {e}")
+            return []
     
-    def save_scraper_log(self, issuer: str, action: str, details: Dict[str, Any]) -> bool:
-        """儲存爬蟲日誌"""
+    def get_adjacent_dates(self, etf_ticker: str, date: str) -> Tuple[Optional[str], Optional[str]]:
+        """取得一檔ETF在指定日期前一個與後一個有資料的日期"""
+        return self.store.get_adjacent_dates(etf_ticker, date)
+    
+    # ==================== 調倉紀錄操作 ====================
+    
+    def save_holdings_changes(self, etf_ticker: str, date: str, previous_date: str,
+                              changes: List[Dict[str, Any]]) -> bool:
+        """儲存一檔ETF單日相對前一個快照的持股變動"""
+        return self.store.save_holdings_changes(etf_ticker, date, previous_date, changes)
+    
+    def get_holdings_changes(self, etf_ticker: str = None, stock_code: str = None, start_date: str = None,
+                             end_date: str = None, change_types: List[str] = None) -> List[Dict[str, Any]]:
+        """取得持股變動 (調倉紀錄)，依日期由新到舊"""
         try:
-            log_data = {
-                "issuer": issuer,
-                "action": action,
-                "details": details,
-                "timestamp": datetime.now(),
-                "status": "success"
-            }
-            
-            result = self.mongodb.scraper_logs.insert_one(log_data)
-            
-            if result.inserted_id:
-                self.logger.info(f"爬蟲日誌儲存成功: {issuer} - {action}")
-                return True
-            else:
-                return False
-                
+            return list(self.store.iter_holdings_changes(etf_ticker, stock_code, start_date, end_date, change_types))
         except Exception as e:
-            self.logger.error(f"儲存爬蟲日誌失敗: {e}")
-            return False
+            self.logger.error(f"取得持股變動失敗: {e}")
+            return []
+    
+    def iter_holdings_changes(self, etf_ticker: str = None, stock_code: str = None, start_date: str = None,
+                              end_date: str = None, change_types: List[str] = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股變動，依日期由新到舊"""
+        return self.store.iter_holdings_changes(etf_ticker, stock_code, start_date, end_date, change_types)
+    
+    # ==================== 每日統計操作 ====================
+    
+    def save_etf_daily_stats(self, stats: List[Dict[str, Any]]) -> bool:
+        """寫入 (或取代) ETF每日統計"""
+        return self.store.save_etf_daily_stats(stats)
+    
+    def get_etf_daily_stats(self, etf_ticker: str = None, start_date: str = None,
+                            end_date: str = None) -> List[Dict[str, Any]]:
+        """取得ETF每日統計 (集中度、成分股數、換手率等)，依日期由新到舊"""
+        try:
+            return list(self.store.iter_etf_daily_stats(etf_ticker, start_date, end_date))
+        except Exception as e:
+            self.logger.error(f"取得每日統計失敗: {e}")
+            return []
+    
+    # ==================== 個股淨買賣操作 ====================
+    
+    def save_stock_net_flows(self, date: str, flows: List[Dict[str, Any]]) -> bool:
+        """儲存單日各股票的ETF合計淨買賣"""
+        return self.store.save_stock_net_flows(date, flows)
+    
+    def get_stock_net_flows(self, stock_code: str = None, start_date: str = None,
+                            end_date: str = None) -> List[Dict[str, Any]]:
+        """取得個股ETF合計淨買賣，依日期由新到舊"""
+        try:
+            return list(self.store.iter_stock_net_flows(stock_code, start_date, end_date))
+        except Exception as e:
+            self.logger.error(f"取得個股淨買賣失敗: {e}")
+            return []
+    
+    # ==================== 持股資料串流讀取 ====================
+    
+    def iter_holdings(self, etf_ticker: str, date: str = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股資料，依權重由大到小"""
+        return self.store.iter_holdings(etf_ticker, date, batch_size)
+    
+    def iter_holdings_by_date(self, date: str, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取指定日期的所有持股資料"""
+        return self.store.iter_holdings_by_date(date, batch_size)
+    
+    def iter_holdings_history(self, etf_ticker: str, start_date: str = None, end_date: str = None,
+                              batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股歷史資料，依日期由新到舊"""
+        return self.store.iter_holdings_history(etf_ticker, start_date, end_date, batch_size)
+    
+    def get_holdings_page(self, etf_ticker: str = None, date: str = None, start_date: str = None,
+                          end_date: str = None, after: str = None,
+                          limit: int = 1000) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """以 keyset 分頁讀取持股資料，回傳 (本頁資料, 下一頁游標)"""
+        return self.store.get_holdings_page(etf_ticker, date, start_date, end_date, after, limit)
+    
+    # ==================== 抓取任務操作 ====================
+    
+    def enqueue_scrape_tasks(self, issuer: str, run_date: str, etf_tickers: List[str]) -> int:
+        """建立一批抓取任務，回傳待執行的任務數 (失敗時 -1)"""
+        return self.store.enqueue_scrape_tasks(issuer, run_date, etf_tickers)
+    
+    def claim_scrape_task(self, issuer: str, run_date: str, worker: str,
+                          lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """取出下一個待執行 (或租約已過期) 的抓取任務"""
+        try:
+            return self.store.claim_scrape_task(issuer, run_date, worker, lease_seconds)
+        except Exception as e:
+            self.logger.error(f"取出抓取任務失敗: {e}")
+            return None
+    
+    def heartbeat_scrape_task(self, task_id: str, worker: str, lease_seconds: int) -> bool:
+        """延長抓取任務的租約"""
+        return self.store.heartbeat_scrape_task(task_id, worker, lease_seconds)
+    
+    def finish_scrape_task(self, task_id: str, status: str, error: str = None, worker: str = None) -> bool:
+        """記錄抓取任務結果"""
+        return self.store.finish_scrape_task(task_id, status, error, worker)
+    
+    def get_scrape_tasks(self, issuer: str = None, run_date: str = None, status: str = None) -> List[Dict[str, Any]]:
+        """取得抓取任務"""
+        try:
+            return list(self.store.iter_scrape_tasks(issuer, run_date, status))
+        except Exception as e:
+            self.logger.error(f"取得抓取任務失敗: {e}")
+            return []
+    
+    # ==================== 爬蟲日誌操作 ====================
+    
+    def save_scraper_log(self, issuer: str, action: str, details: Dict[str, Any], status: str = "success") -> bool:
+        """儲存爬蟲日誌"""
+        return self.store.save_scraper_log(issuer, action, details, status)
     
     def get_scraper_logs(self, issuer: str = None, limit: int = 100) -> List[Dict[str, Any]]:
         """取得爬蟲日誌"""
         try:
-            filter_query = {}
-            if issuer:
-                filter_query["issuer"] = issuer
-            
-            logs = list(self.mongodb.scraper_logs.find(filter_query).sort("timestamp", -1).limit(limit))
-            
-            # 移除MongoDB的_id欄位
-            for log in logs:
-                log.pop('_id', None)
-            
-            return logs
-            
+            return list(self.store.iter_scraper_logs(issuer, limit))
         except Exception as e:
             self.logger.error(f"取得爬蟲日誌失敗: {e}")
             return []
     
+    def iter_scraper_logs(self, issuer: str = None, limit: int = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取爬蟲日誌，依時間由新到舊"""
+        return self.store.iter_scraper_logs(issuer, limit, batch_size)
+    
+    # ==================== 執行指標操作 ====================
+    
+    def save_run_metrics(self, run: Dict[str, Any], etf_runs: List[Dict[str, Any]]) -> bool:
+        """一次寫入整次執行與每檔ETF的指標，並累加每日彙總"""
+        return self.store.save_run_metrics(run, etf_runs)
+    
+    def get_runs(self, issuer: str = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """取得最近的執行紀錄"""
+        try:
+            return list(self.store.iter_runs(issuer, limit))
+        except Exception as e:
+            self.logger.error(f"取得執行紀錄失敗: {e}")
+            return []
+    
+    def get_etf_runs(self, run_id: str) -> List[Dict[str, Any]]:
+        """取得一次執行中每檔ETF的指標"""
+        try:
+            return list(self.store.iter_etf_runs(run_id))
+        except Exception as e:
+            self.logger.error(f"取得ETF執行指標失敗: {e}")
+            return []
+    
+    def get_daily_rollups(self, issuer: str = None, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """取得每日彙總，依日期由新到舊"""
+        return self.store.get_daily_rollups(issuer, start_date, end_date)
+    
     # ==================== 統計查詢操作 ====================
     
     def get_etf_count(self, issuer: str = None) -> int:
         """取得ETF數量"""
-        try:
-            filter_query = {}
-            if issuer:
-                filter_query["issuer"] = issuer
-            
-            count = self.mongodb.etfs.count_documents(filter_query)
-            return count
-            
-        except Exception as e:
-            self.logger.error(f"取得ETF數量失敗: {e}")
-            return 0
+        return self.store.get_etf_count(issuer)
     
     def get_holdings_count(self, etf_ticker: str = None, date: str = None) -> int:
         """取得持股資料數量"""
-        try:
-            filter_query = {}
-            if etf_ticker:
-                filter_query["etf_ticker"] = etf_ticker
-            if date:
-                filter_query["date"] = date
-            
-            count = self.mongodb.holdings.count_documents(filter_query)
-            return count
-            
-        except Exception as e:
-            self.logger.error(f"取得持股數量失敗: {e}")
-            return 0
+        return self.store.get_holdings_count(etf_ticker, date)
     
-    def get_latest_date(self) -> Optional[str]:
-        """取得最新的資料日期"""
-        try:
-            latest = self.mongodb.holdings.find_one(
-                {},
-                sort=[("date", -1)]
-            )
-            
-            return latest["date"] if latest else None
-            
-        except Exception as e:
-            self.logger.error(f"取得最新日期失敗: {e}")
-            return None
+    def get_holdings_summary(self, etf_ticker: str = None) -> List[Dict[str, Any]]:
+        """取得每檔ETF的持股摘要 (筆數、日期數、最早/最新日期)"""
+        return self.store.get_holdings_summary(etf_ticker)
+    
+    def get_holdings_dates(self, start_date: str = None, end_date: str = None, etf_ticker: str = None) -> List[str]:
+        """取得有持股資料的日期，由舊到新，指定 etf_ticker 時只取該ETF的日期"""
+        return self.store.get_holdings_dates(start_date, end_date, etf_ticker)
+    
+    def get_latest_date(self, etf_ticker: str = None) -> Optional[str]:
+        """取得最新的資料日期，指定 etf_ticker 時取得該ETF的最新日期"""
+        return self.cache.get_or_load(("latest_date", etf_ticker),
+                                      lambda: self.store.get_latest_date(etf_ticker), cache_none=False)
+    
+    def get_holdings_version(self, etf_ticker: str = None) -> Optional[str]:
+        """取得持股資料的寫入版本，不經過快取 (需反映其他程序的寫入)"""
+        return self.store.get_holdings_version(etf_ticker)
     
     def check_duplicate_holdings(self, etf_ticker: str, holdings: List[Dict[str, Any]], date: str) -> Dict[str, Any]:
         """檢查持股數據是否重複"""
         try:
             # 獲取現有的持股數據
-            existing_holdings = list(self.mongodb.holdings.find({
-                "etf_ticker": etf_ticker,
-                "date": date
-            }))
+            existing_holdings = list(self.store.iter_holdings(etf_ticker, date))
             
             if not existing_holdings:
                 return {
@@ -363,7 +603,7 @@ class ETFDataManager:
                 "common_count": len(common_keys),
                 "message": f"數據有差異，現有{len(existing_holdings)}筆，新{len(holdings)}筆，共同{len(common_keys)}筆"
             }
-            
+        
         except Exception as e:
             self.logger.error(f"檢查重複數據時發生錯誤: {e}")
             return {
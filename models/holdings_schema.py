@@ -0,0 +1,49 @@
+"""
+持股資料標準格式
+所有寫入端在寫入前都轉成相同欄位，讀取端不必再處理舊格式：
+    
+    etf_ticker, date, stock_code, stock_name, weight, shares, market_value, created_at
+
+舊版爬蟲寫入的 quantity 對應為 shares，download_date、file_path、updated_at 不再保存
+"""
+
+from typing import List, Dict, Any
+
+# 單筆持股的標準欄位 (不含 etf_ticker、date、created_at)
+HOLDING_FIELDS = ("stock_code", "stock_name", "weight", "shares", "market_value")
+
+# 舊版寫入端留下的欄位
+LEGACY_FIELDS = ("quantity", "download_date", "file_path", "updated_at")
+
+def _to_float(value: Any) -> float:
+    """轉為浮點數，支援千分位與百分比字串"""
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, str):
+        value = value.replace(",", "").replace("%", "").strip()
+        # 空白或單一破折號表示無資料
+        if not value or value == "-":
+            return 0.0
+    return float(value)
+
+def _to_int(value: Any) -> int:
+    """轉為整數，支援千分位字串"""
+    return int(round(_to_float(value)))
+
+def normalize_holding(holding: Dict[str, Any]) -> Dict[str, Any]:
+    """將單筆持股轉為標準欄位，shares 缺少時改用舊版的 quantity"""
+    shares = holding.get('shares')
+    if shares is None:
+        shares = holding.get('quantity')
+    
+    return {
+        "stock_code": str(holding.get('stock_code') or '').strip(),
+        "stock_name": str(holding.get('stock_name') or '').strip(),
+        "weight": _to_float(holding.get('weight')),
+        "shares": _to_int(shares),
+        "market_value": _to_float(holding.get('market_value'))
+    }
+
+def normalize_holdings(holdings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """將持股清單轉為標準欄位"""
+    return [normalize_holding(holding) for holding in holdings]
@@ -0,0 +1,79 @@
+"""
+持股快照寫入前檢查
+在寫入資料庫之前以向量運算檢查快照，可疑的快照改存到隔離區，不寫入 holdings：
+
+- weight_sum: 權重合計與 100% 相差超過 WEIGHT_SUM_TOLERANCE 個百分點 (下載或表格截斷)
+- constituent_count: 成分股數少於前一個快照的 VALIDATION_MIN_COUNT_RATIO 倍
+- duplicate_codes: 同一快照中股票代號重複
+- share_outliers: 與前一個快照共同持有的股票中，超過 VALIDATION_SHARE_OUTLIER_FRACTION 比例
+  的股數變動倍數超過 VALIDATION_MAX_SHARE_RATIO (單位錯置或欄位錯位)
+
+VALIDATION_MODE 控制檢查結果：quarantine (預設，隔離不寫入) / warn (只記錄) / off (不檢查)
+"""
+
+import os
+from typing import List, Dict, Any, Optional
+import numpy as np
+from utils.env import env_float
+
+VALIDATION_MODES = ("quarantine", "warn", "off")
+
+# 權重合計與 100% 的容許誤差 (百分點)
+WEIGHT_SUM_TOLERANCE = env_float("WEIGHT_SUM_TOLERANCE", 2.0)
+
+VALIDATION_MIN_COUNT_RATIO = env_float("VALIDATION_MIN_COUNT_RATIO", 0.8)
+VALIDATION_MAX_SHARE_RATIO = env_float("VALIDATION_MAX_SHARE_RATIO", 20.0)
+VALIDATION_SHARE_OUTLIER_FRACTION = env_float("VALIDATION_SHARE_OUTLIER_FRACTION", 0.2)
+
+def get_validation_mode() -> str:
+    """取得目前的檢查模式"""
+    mode = os.getenv("VALIDATION_MODE", "quarantine").strip().lower()
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f"未知的檢查模式: {mode}，可用: {', '.join(VALIDATION_MODES)}")
+    return mode
+
+def _issue(check: str, message: str, **details) -> Dict[str, Any]:
+    """組成一筆檢查結果"""
+    return {"check": check, "message": message, **details}
+
+def validate_snapshot(holdings: List[Dict[str, Any]],
+                      previous: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """檢查一檔ETF單日的標準格式持股，previous 為前一個快照，回傳發現的問題 (空清單表示通過)"""
+    issues = []
+    codes = np.array([holding['stock_code'] for holding in holdings], dtype=object)
+    weights = np.fromiter((holding['weight'] for holding in holdings), dtype=np.float64, count=len(holdings))
+    shares = np.fromiter((holding['shares'] for holding in holdings), dtype=np.float64, count=len(holdings))
+    
+    weight_sum = float(weights.sum())
+    if abs(weight_sum - 100.0) > WEIGHT_SUM_TOLERANCE:
+        issues.append(_issue("weight_sum", f"權重合計 {weight_sum:.2f}% 超出容許範圍", weight_sum=weight_sum))
+    
+    unique_codes, counts = np.unique(codes.astype(str), return_counts=True)
+    duplicates = unique_codes[counts > 1].tolist()
+    if duplicates:
+        issues.append(_issue("duplicate_codes", f"股票代號重複: {', '.join(duplicates[:10])}",
+                             duplicates=duplicates))
+    
+    if not previous:
+        return issues
+    
+    previous_count = len(previous)
+    if len(holdings) < previous_count * VALIDATION_MIN_COUNT_RATIO:
+        issues.append(_issue("constituent_count", f"成分股數 {len(holdings)} 檔，前一個快照 {previous_count} 檔",
+                             count=len(holdings), previous_count=previous_count))
+    
+    # 共同持有且兩邊股數都大於0的股票，比較股數變動倍數
+    previous_shares = {holding['stock_code']: holding['shares'] for holding in previous}
+    before = np.fromiter((previous_shares.get(code, 0) for code in codes), dtype=np.float64, count=len(codes))
+    common = (before > 0) & (shares > 0)
+    if common.any():
+        ratio = np.abs(np.log(shares[common] / before[common]))
+        outliers = ratio > np.log(VALIDATION_MAX_SHARE_RATIO)
+        if outliers.mean() > VALIDATION_SHARE_OUTLIER_FRACTION:
+            issues.append(_issue(
+                "share_outliers",
+                f"{int(outliers.sum())}/{int(common.sum())} 檔股票的股數變動超過 {VALIDATION_MAX_SHARE_RATIO:g} 倍",
+                outliers=codes[common][outliers].astype(str).tolist()[:20]
+            ))
+    
+    return issues
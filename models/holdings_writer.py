@@ -0,0 +1,151 @@
+import atexit
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from models.base_store import WRITE_FAILED, WRITE_QUARANTINED
+from models.etf_data import ETFDataManager
+from utils.env import env_int
+from utils.logger import setup_logger
+
+# 佇列結束標記
+_STOP = object()
+
+class HoldingsWriteQueue:
+    """持股資料背景寫入佇列 (write-behind)
+    
+    爬蟲呼叫 submit 後立即返回，背景執行緒把佇列中累積的多檔ETF
+    合併成一次 write_holdings_snapshots 寫入。佇列有上限，寫入跟不上時
+    submit 會阻塞 (背壓)；程式結束前會自動 flush。
+    submit 時可傳入 on_done，快照實際寫入 (或失敗、被隔離) 後在背景執行緒以寫入結果 (WRITE_*) 呼叫。
+    """
+    
+    def __init__(self, etf_manager: ETFDataManager = None, max_pending: int = None, batch_rows: int = None):
+        self.logger = setup_logger("holdings_writer", "logs/holdings_writer.log")
+        self.etf_manager = etf_manager or ETFDataManager()
+        
+        # 最多可排隊的ETF快照數，以及單次批量寫入的筆數上限
+        if max_pending is None:
+            max_pending = env_int("HOLDINGS_QUEUE_SIZE", 32)
+        if batch_rows is None:
+            batch_rows = env_int("HOLDINGS_BATCH_ROWS", 5000)
+        self.batch_rows = batch_rows
+        self.queue = queue.Queue(maxsize=max_pending)
+        
+        # 寫入結果 {(etf_ticker, date): WRITE_*}
+        self.results: Dict[Tuple[str, str], str] = {}
+        self._results_lock = threading.Lock()
+        self._closed = False
+        
+        self._thread = threading.Thread(target=self._run, name="holdings-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, etf_ticker: str, holdings: List[Dict[str, Any]], date: str = None,
+               force_update: bool = False, timeout: Optional[float] = None,
+               on_done: Callable[[str], None] = None):
+        """排入一檔ETF的持股快照，佇列已滿時阻塞直到有空位"""
+        if self._closed:
+            raise RuntimeError("寫入佇列已關閉")
+        
+        self.queue.put({
+            "etf_ticker": etf_ticker,
+            "holdings": holdings,
+            "date": date,
+            "force_update": force_update,
+            "on_done": on_done
+        }, timeout=timeout)
+    
+    def flush(self):
+        """等待佇列中所有快照寫入完成"""
+        self.queue.join()
+    
+    def close(self):
+        """寫完剩餘資料並停止背景執行緒"""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(_STOP)
+        self._thread.join()
+        self.logger.info("持股寫入佇列已關閉")
+    
+    def get_result(self, etf_ticker: str, date: str) -> Optional[str]:
+        """取得指定快照的寫入結果 (WRITE_*)，尚未寫入時回傳None"""
+        with self._results_lock:
+            return self.results.get((etf_ticker, date))
+    
+    def failed(self) -> List[Tuple[str, str]]:
+        """取得寫入失敗的快照 (不含被隔離的快照)"""
+        with self._results_lock:
+            return [key for key, status in self.results.items() if status == WRITE_FAILED]
+    
+    def quarantined(self) -> List[Tuple[str, str]]:
+        """取得未通過寫入前檢查而被隔離的快照"""
+        with self._results_lock:
+            return [key for key, status in self.results.items() if status == WRITE_QUARANTINED]
+    
+    def _run(self):
+        """背景寫入迴圈：取出目前所有排隊中的快照後一次寫入"""
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                self.queue.task_done()
+                return
+            
+            batch = [item]
+            rows = len(item['holdings'])
+            stop = False
+            
+            # 寫入期間累積的快照一併取出，最多 batch_rows 筆
+            while rows < self.batch_rows:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                rows += len(item['holdings'])
+            
+            self._write(batch)
+            for _ in batch:
+                self.queue.task_done()
+            
+            if stop:
+                self.queue.task_done()
+                return
+    
+    def _write(self, batch: List[Dict[str, Any]]):
+        """寫入一個批次"""
+        snapshots = [{key: value for key, value in item.items() if key != "on_done"} for item in batch]
+        try:
+            results = self.etf_manager.write_holdings_snapshots(snapshots)
+        except Exception as e:
+            self.logger.error(f"批次寫入失敗: {e}")
+            results = {}
+        
+        # 未補日期的快照以當天日期寫入，沒有結果的快照視為失敗
+        today = datetime.now().strftime('%Y-%m-%d')
+        outcomes = [((item['etf_ticker'], item['date'] or today), item['on_done']) for item in batch]
+        results = {key: results.get(key, WRITE_FAILED) for key, _ in outcomes}
+        
+        with self._results_lock:
+            self.results.update(results)
+        
+        for key, on_done in outcomes:
+            if on_done is None:
+                continue
+            try:
+                on_done(results[key])
+            except Exception as e:
+                self.logger.error(f"ETF {key[0]} {key[1]} 寫入完成通知失敗: {e}")
+        
+        failed = [key for key, status in results.items() if status == WRITE_FAILED]
+        quarantined = [key for key, status in results.items() if status == WRITE_QUARANTINED]
+        if quarantined:
+            self.logger.warning(f"批次寫入有 {len(quarantined)} 檔未通過寫入前檢查，已移至隔離區: {quarantined}")
+        if failed:
+            self.logger.error(f"批次寫入有 {len(failed)} 檔失敗: {failed}")
+        else:
+            self.logger.info(f"批次寫入完成: {len(batch)} 檔ETF")
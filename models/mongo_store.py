@@ -0,0 +1,877 @@
+import json
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from collections import defaultdict
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from config.migrations import holdings_secondary_indexes
+from config.mongodb import get_mongodb_manager
+from config.scraper_config import DATABASE_SETTINGS
+from models.base_store import (BaseHoldingsStore, TASK_FAILED, TASK_PENDING, TASK_RUNNING,
+                               WRITE_FAILED, WRITE_SKIPPED, WRITE_WRITTEN, scrape_task_id)
+from models.holdings_schema import normalize_holdings
+from models.run_metrics import build_daily_rollup
+from utils.logger import setup_logger
+
+# 讀取時排除不需要傳輸的欄位
+HOLDINGS_PROJECTION = {"_id": 0, "created_at": 0}
+
+class MongoHoldingsStore(BaseHoldingsStore):
+    """MongoDB 儲存後端"""
+    
+    def __init__(self, mongodb=None):
+        self.mongodb = mongodb or get_mongodb_manager()
+        self.logger = setup_logger("mongo_store", "logs/mongo_store.log")
+    
+    # ==================== ETF基本資料操作 ====================
+    
+    def save_etf(self, etf_data: Dict[str, Any]) -> bool:
+        """儲存ETF基本資料"""
+        try:
+            # 添加時間戳
+            etf_data['created_at'] = datetime.now()
+            etf_data['updated_at'] = datetime.now()
+            
+            # 使用upsert操作，如果ticker已存在則更新
+            result = self.mongodb.etfs.update_one(
+                {"ticker": etf_data['ticker']},
+                {"$set": etf_data},
+                upsert=True
+            )
+            
+            if result.upserted_id or result.modified_count > 0:
+                self.logger.info(f"ETF資料儲存成功: {etf_data['ticker']}")
+                return True
+            else:
+                self.logger.warning(f"ETF資料儲存無變化: {etf_data['ticker']}")
+                return False
+        
+        except Exception as e:
+            self.logger.error(f"儲存ETF資料失敗: {e}")
+            return False
+    
+    def get_etf(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """取得單一ETF資料"""
+        try:
+            etf = self.mongodb.etfs.find_one({"ticker": ticker})
+            if etf:
+                # 移除MongoDB的_id欄位
+                etf.pop('_id', None)
+            return etf
+        except Exception as e:
+            self.logger.error(f"取得ETF資料失敗: {e}")
+            return None
+    
+    def iter_etfs(self, issuer: str = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """逐筆串流ETF資料"""
+        filter_query = {}
+        if issuer:
+            filter_query['issuer'] = issuer
+        
+        cursor = self.mongodb.etfs.find(filter_query, {"_id": 0})
+        yield from cursor.batch_size(batch_size or DATABASE_SETTINGS['cursor_batch_size'])
+    
+    def update_etf(self, ticker: str, update_data: Dict[str, Any]) -> bool:
+        """更新ETF資料"""
+        try:
+            update_data['updated_at'] = datetime.now()
+            
+            result = self.mongodb.etfs.update_one(
+                {"ticker": ticker},
+                {"$set": update_data}
+            )
+            
+            if result.modified_count > 0:
+                self.logger.info(f"ETF資料更新成功: {ticker}")
+                return True
+            else:
+                self.logger.warning(f"ETF資料更新無變化: {ticker}")
+                return False
+        
+        except Exception as e:
+            self.logger.error(f"更新ETF資料失敗: {e}")
+            return False
+    
+    def delete_etf(self, ticker: str) -> bool:
+        """刪除ETF資料"""
+        try:
+            result = self.mongodb.etfs.delete_one({"ticker": ticker})
+            
+            if result.deleted_count > 0:
+                self.logger.info(f"ETF資料刪除成功: {ticker}")
+                return True
+            else:
+                self.logger.warning(f"ETF資料不存在: {ticker}")
+                return False
+        
+        except Exception as e:
+            self.logger.error(f"刪除ETF資料失敗: {e}")
+            return False
+    
+    # ==================== 持股資料操作 ====================
+    
+    def _build_holdings_documents(self, etf_ticker: str, holdings: List[Dict[str, Any]], date: str) -> List[Dict[str, Any]]:
+        """將持股清單轉為標準格式的集合文件"""
+        created_at = datetime.now()
+        holdings_data = []
+        for holding in normalize_holdings(holdings):
+            holding_data = {
+                "etf_ticker": etf_ticker,
+                "date": date,
+                **holding,
+                "created_at": created_at
+            }
+            holdings_data.append(self.mongodb.to_holdings_document(holding_data))
+        return holdings_data
+    
+    def write_holdings_snapshots(self, snapshots: List[Dict[str, Any]]) -> Dict[Tuple[str, str], str]:
+        """批次寫入多檔ETF的持股資料，合併為一次查詢、一次刪除與一次批量插入
+        
+        snapshots 每筆包含 etf_ticker、holdings，以及選用的 date、force_update，
+        已存在且非強制更新時跳過。回傳 {(etf_ticker, date): 寫入結果}
+        """
+        results = {}
+        if not snapshots:
+            return results
+        
+        try:
+            today = datetime.now().strftime('%Y-%m-%d')
+            
+            # 同一批次內相同 (ETF, 日期) 以最後一筆為準
+            pending = {}
+            for snapshot in snapshots:
+                key = (snapshot['etf_ticker'], snapshot.get('date') or today)
+                pending[key] = snapshot
+            
+            # 一次取得所有 (ETF, 日期) 的現有筆數
+            day_filters = [
+                self.mongodb.holdings_filter(etf_ticker=etf_ticker, date=date)
+                for etf_ticker, date in pending
+            ]
+            pipeline = [
+                {"$match": {"$or": day_filters}},
+                {"$group": {
+                    "_id": {
+                        "etf_ticker": f"${self.mongodb.holdings_field('etf_ticker')}",
+                        "date": f"${self.mongodb.holdings_field('date')}"
+                    },
+                    "count": {"$sum": 1}
+                }}
+            ]
+            existing = {}
+            for doc in self.mongodb.holdings.aggregate(pipeline):
+                key = (doc['_id']['etf_ticker'], self.mongodb.holdings_date_string(doc['_id']['date']))
+                existing[key] = doc['count']
+            
+            replace_filters = []
+            holdings_data = []
+            written = []
+            for key, snapshot in pending.items():
+                etf_ticker, date = key
+                existing_count = existing.get(key, 0)
+                
+                if existing_count > 0 and not snapshot.get('force_update', False):
+                    self.logger.info(f"ETF {etf_ticker} 在 {date} 的數據已存在 ({existing_count} 筆)，跳過寫入")
+                    results[key] = WRITE_SKIPPED
+                    continue
+                
+                if not snapshot['holdings']:
+                    self.logger.warning(f"沒有持股資料需要儲存: {etf_ticker} - {date}")
+                    results[key] = WRITE_FAILED
+                    continue
+                
+                if existing_count > 0:
+                    replace_filters.append(self.mongodb.holdings_filter(etf_ticker=etf_ticker, date=date))
+                holdings_data.extend(self._build_holdings_documents(etf_ticker, snapshot['holdings'], date))
+                written.append(key)
+            
+            # 強制更新的資料先一次刪除
+            if replace_filters:
+                delete_result = self.mongodb.holdings.delete_many({"$or": replace_filters})
+                self.logger.info(f"強制更新：已刪除 {delete_result.deleted_count} 筆舊數據")
+            
+            if holdings_data:
+                result = self.mongodb.holdings.insert_many(holdings_data, ordered=False)
+                self.logger.info(f"批次持股資料儲存成功: {len(written)} 檔ETF, 共 {len(result.inserted_ids)} 筆")
+            
+            for key in written:
+                results[key] = WRITE_WRITTEN
+            
+            return results
+        
+        except Exception as e:
+            self.logger.error(f"批次儲存持股資料失敗: {e}")
+            for snapshot in snapshots:
+                results.setdefault((snapshot['etf_ticker'], snapshot.get('date') or today), WRITE_FAILED)
+            return results
+    
+    # ==================== 持股資料串流讀取 ====================
+    
+    def _stream_holdings(self, filter_query: Dict[str, Any], sort: List[Tuple[str, int]] = None,
+                         batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """以伺服器端游標逐批讀取持股，記憶體用量與結果筆數無關"""
+        cursor = self.mongodb.holdings.find(filter_query, HOLDINGS_PROJECTION)
+        if sort:
+            cursor = cursor.sort(sort)
+        cursor = cursor.batch_size(batch_size or DATABASE_SETTINGS['cursor_batch_size'])
+        
+        for holding in cursor:
+            yield self.mongodb.from_holdings_document(holding)
+    
+    def iter_holdings(self, etf_ticker: str, date: str = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股資料，依權重由大到小"""
+        filter_query = self.mongodb.holdings_filter(etf_ticker=etf_ticker, date=date)
+        return self._stream_holdings(filter_query, [("weight", -1)], batch_size)
+    
+    def iter_holdings_by_date(self, date: str, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取指定日期的所有持股資料"""
+        filter_query = self.mongodb.holdings_filter(date=date)
+        return self._stream_holdings(filter_query, batch_size=batch_size)
+    
+    def iter_holdings_history(self, etf_ticker: str, start_date: str = None, end_date: str = None,
+                              batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股歷史資料，依日期由新到舊"""
+        filter_query = self.mongodb.holdings_filter(
+            etf_ticker=etf_ticker,
+            start_date=start_date,
+            end_date=end_date
+        )
+        date_field = self.mongodb.holdings_field("date")
+        return self._stream_holdings(filter_query, [(date_field, -1)], batch_size)
+    
+    def refresh_stock_holders(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """以剛寫入的快照更新 stock_holders：先移除這些ETF當天的舊紀錄，再批次加入新的持股"""
+        try:
+            etfs_by_date = defaultdict(list)
+            holders = defaultdict(list)
+            for snapshot in snapshots:
+                etfs_by_date[snapshot['date']].append(snapshot['etf_ticker'])
+                for holding in snapshot['holdings']:
+                    holders[(holding['stock_code'], snapshot['date'])].append({
+                        "etf_ticker": snapshot['etf_ticker'],
+                        "weight": holding.get('weight', 0.0),
+                        "shares": holding.get('shares', 0)
+                    })
+            
+            for date, etf_tickers in etfs_by_date.items():
+                self.mongodb.stock_holders.update_many(
+                    {"date": date, "holders.etf_ticker": {"$in": etf_tickers}},
+                    {"$pull": {"holders": {"etf_ticker": {"$in": etf_tickers}}}}
+                )
+            
+            operations = [
+                UpdateOne(
+                    {"stock_code": stock_code, "date": date},
+                    {"$push": {"holders": {"$each": entries, "$sort": {"weight": -1}}}},
+                    upsert=True
+                )
+                for (stock_code, date), entries in holders.items()
+            ]
+            if operations:
+                self.mongodb.stock_holders.bulk_write(operations, ordered=False)
+            
+            # 強制更新後已無人持有的股票
+            self.mongodb.stock_holders.delete_many({"date": {"$in": list(etfs_by_date)}, "holders": {"$size": 0}})
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"更新股票持有ETF索引失敗: {e}")
+            return False
+    
+    def refresh_holdings_summary(self, snapshots: List[Dict[str, Any]]) -> bool:
+        """以剛寫入的快照更新每檔ETF的持股摘要
+        
+        每檔ETF一份文件，days 記錄各日期的筆數；以 pipeline 更新設定當日筆數後重算合計，
+        重複寫入同一日期時結果不變
+        """
+        try:
+            days = {"$objectToArray": "$days"}
+            operations = [
+                UpdateOne(
+                    {"etf_ticker": snapshot['etf_ticker']},
+                    [
+                        {"$set": {f"days.{snapshot['date']}": len(snapshot['holdings'])}},
+                        {"$set": {
+                            "rows": {"$sum": {"$map": {"input": days, "in": "$$this.v"}}},
+                            "dates": {"$size": days},
+                            "first_date": {"$min": {"$map": {"input": days, "in": "$$this.k"}}},
+                            "latest_date": {"$max": {"$map": {"input": days, "in": "$$this.k"}}},
+                            "updated_at": "$$NOW"
+                        }}
+                    ],
+                    upsert=True
+                )
+                for snapshot in snapshots
+            ]
+            if operations:
+                self.mongodb.holdings_summary.bulk_write(operations, ordered=True)
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"更新持股摘要失敗: {e}")
+            return False
+    
+    def suspend_holdings_indexes(self) -> bool:
+        """大量匯入前移除持股集合的次要索引，保留寫入時判斷重複用的 etf_ticker+date 索引"""
+        try:
+            existing = [list(info['key']) for info in self.mongodb.holdings.index_information().values()]
+            dropped = 0
+            for keys in holdings_secondary_indexes(self.mongodb):
+                if keys in existing:
+                    self.mongodb.holdings.drop_index(keys)
+                    dropped += 1
+            self.logger.info(f"已暫時移除 {dropped} 個持股次要索引")
+            return True
+        except Exception as e:
+            self.logger.error(f"移除持股次要索引失敗: {e}")
+            return False
+    
+    def restore_holdings_indexes(self) -> bool:
+        """重建持股集合的次要索引，索引已存在時不做任何事"""
+        try:
+            for keys in holdings_secondary_indexes(self.mongodb):
+                self.mongodb.holdings.create_index(keys)
+            self.logger.info("持股次要索引已重建")
+            return True
+        except Exception as e:
+            self.logger.error(f"重建持股次要索引失敗，請重新執行回填或手動建立: {e}")
+            return False
+    
+    def get_holdings_summary(self, etf_ticker: str = None) -> List[Dict[str, Any]]:
+        """取得每檔ETF的持股摘要 {etf_ticker, rows, dates, first_date, latest_date}，依筆數由多到少"""
+        try:
+            filter_query = {"etf_ticker": etf_ticker} if etf_ticker else {}
+            cursor = self.mongodb.holdings_summary.find(filter_query, {"_id": 0, "days": 0}).sort("rows", -1)
+            return list(cursor)
+        except Exception as e:
+            self.logger.error(f"取得持股摘要失敗: {e}")
+            return []
+    
+    def iter_holders(self, stock_code: str, start_date: str = None, end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持有指定股票的ETF，每日一筆 {date, stock_code, holders}，依日期由新到舊"""
+        filter_query = {"stock_code": stock_code}
+        if start_date or end_date:
+            filter_query["date"] = {}
+            if start_date:
+                filter_query["date"]["$gte"] = start_date
+            if end_date:
+                filter_query["date"]["$lte"] = end_date
+        
+        cursor = self.mongodb.stock_holders.find(filter_query, {"_id": 0}).sort("date", -1)
+        yield from cursor.batch_size(DATABASE_SETTINGS['cursor_batch_size'])
+    
+    def get_adjacent_dates(self, etf_ticker: str, date: str) -> Tuple[Optional[str], Optional[str]]:
+        """取得一檔ETF在指定日期前一個與後一個有資料的日期"""
+        etf_filter = self.mongodb.holdings_filter(etf_ticker=etf_ticker)
+        date_field = self.mongodb.holdings_field("date")
+        date_value = self.mongodb.holdings_date_value(date)
+        
+        adjacent = []
+        for operator, direction in (("$lt", -1), ("$gt", 1)):
+            doc = self.mongodb.holdings.find_one(
+                dict(etf_filter, **{date_field: {operator: date_value}}),
+                {date_field: 1},
+                sort=[(date_field, direction)]
+            )
+            adjacent.append(self.mongodb.holdings_date_string(doc[date_field]) if doc else None)
+        return adjacent[0], adjacent[1]
+    
+    # ==================== 調倉紀錄操作 ====================
+    
+    def save_holdings_changes(self, etf_ticker: str, date: str, previous_date: str,
+                              changes: List[Dict[str, Any]]) -> bool:
+        """儲存一檔ETF單日相對前一個快照的持股變動，取代該日既有紀錄"""
+        try:
+            self.mongodb.holdings_changes.delete_many({"etf_ticker": etf_ticker, "date": date})
+            
+            if changes:
+                created_at = datetime.now()
+                self.mongodb.holdings_changes.insert_many([
+                    dict(change, etf_ticker=etf_ticker, date=date, previous_date=previous_date, created_at=created_at)
+                    for change in changes
+                ], ordered=False)
+            
+            self.logger.info(f"持股變動儲存成功: {etf_ticker} {previous_date} -> {date}, 共 {len(changes)} 筆")
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存持股變動失敗: {e}")
+            return False
+    
+    def iter_holdings_changes(self, etf_ticker: str = None, stock_code: str = None, start_date: str = None,
+                              end_date: str = None, change_types: List[str] = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取持股變動，依日期由新到舊"""
+        filter_query = {}
+        if etf_ticker:
+            filter_query["etf_ticker"] = etf_ticker
+        if stock_code:
+            filter_query["stock_code"] = stock_code
+        if start_date or end_date:
+            filter_query["date"] = {}
+            if start_date:
+                filter_query["date"]["$gte"] = start_date
+            if end_date:
+                filter_query["date"]["$lte"] = end_date
+        if change_types:
+            filter_query["change_type"] = {"$in": list(change_types)}
+        
+        cursor = self.mongodb.holdings_changes.find(filter_query, {"_id": 0, "created_at": 0})
+        cursor = cursor.sort([("date", -1), ("etf_ticker", 1), ("weight_delta", -1)])
+        yield from cursor.batch_size(DATABASE_SETTINGS['cursor_batch_size'])
+    
+    # ==================== 每日統計操作 ====================
+    
+    def save_etf_daily_stats(self, stats: List[Dict[str, Any]]) -> bool:
+        """寫入 (或取代) ETF每日統計，每筆以 (etf_ticker, date) 識別"""
+        try:
+            if not stats:
+                return True
+            
+            updated_at = datetime.now()
+            self.mongodb.etf_daily_stats.bulk_write([
+                UpdateOne(
+                    {"etf_ticker": item['etf_ticker'], "date": item['date']},
+                    {"$set": dict(item, updated_at=updated_at)},
+                    upsert=True
+                )
+                for item in stats
+            ], ordered=False)
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存每日統計失敗: {e}")
+            return False
+    
+    def iter_etf_daily_stats(self, etf_ticker: str = None, start_date: str = None,
+                             end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取ETF每日統計，依日期由新到舊"""
+        filter_query = {}
+        if etf_ticker:
+            filter_query["etf_ticker"] = etf_ticker
+        if start_date or end_date:
+            filter_query["date"] = {}
+            if start_date:
+                filter_query["date"]["$gte"] = start_date
+            if end_date:
+                filter_query["date"]["$lte"] = end_date
+        
+        cursor = self.mongodb.etf_daily_stats.find(filter_query, {"_id": 0}).sort([("date", -1), ("etf_ticker", 1)])
+        yield from cursor.batch_size(DATABASE_SETTINGS['cursor_batch_size'])
+    
+    # ==================== 隔離區操作 ====================
+    
+    def save_quarantine(self, etf_ticker: str, date: str, holdings: List[Dict[str, Any]],
+                        issues: List[Dict[str, Any]]) -> bool:
+        """將未通過檢查的快照存入隔離區，同一 (ETF, 日期) 以最新一次為準"""
+        try:
+            now = datetime.now()
+            self.mongodb.holdings_quarantine.update_one(
+                {"etf_ticker": etf_ticker, "date": date},
+                {
+                    "$set": {"holdings": holdings, "issues": issues, "status": "pending", "updated_at": now},
+                    "$setOnInsert": {"created_at": now}
+                },
+                upsert=True
+            )
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存隔離快照失敗: {e}")
+            return False
+    
+    def iter_quarantine(self, etf_ticker: str = None, status: str = "pending") -> Iterator[Dict[str, Any]]:
+        """讀取隔離區的快照，status 為 None 時不限狀態，依日期由新到舊"""
+        filter_query = {}
+        if etf_ticker:
+            filter_query["etf_ticker"] = etf_ticker
+        if status:
+            filter_query["status"] = status
+        
+        cursor = self.mongodb.holdings_quarantine.find(filter_query, {"_id": 0}).sort([("date", -1), ("etf_ticker", 1)])
+        yield from cursor.batch_size(DATABASE_SETTINGS['cursor_batch_size'])
+    
+    def update_quarantine_status(self, etf_ticker: str, date: str, status: str) -> bool:
+        """更新隔離快照的狀態 (pending / released / discarded)"""
+        try:
+            result = self.mongodb.holdings_quarantine.update_one(
+                {"etf_ticker": etf_ticker, "date": date},
+                {"$set": {"status": status, "updated_at": datetime.now()}}
+            )
+            return result.matched_count > 0
+        
+        except Exception as e:
+            self.logger.error(f"更新隔離快照狀態失敗: {e}")
+            return False
+    
+    # ==================== 個股淨買賣操作 ====================
+    
+    def save_stock_net_flows(self, date: str, flows: List[Dict[str, Any]]) -> bool:
+        """儲存單日各股票的ETF合計淨買賣，取代該日既有資料"""
+        try:
+            self.mongodb.stock_net_flows.delete_many({"date": date})
+            if flows:
+                self.mongodb.stock_net_flows.insert_many([dict(flow, date=date) for flow in flows], ordered=False)
+            self.logger.info(f"個股淨買賣儲存成功: {date}, 共 {len(flows)} 筆")
+            return True
+        except Exception as e:
+            self.logger.error(f"儲存個股淨買賣失敗: {e}")
+            return False
+    
+    def iter_stock_net_flows(self, stock_code: str = None, start_date: str = None,
+                             end_date: str = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取個股淨買賣，依日期由新到舊"""
+        filter_query = {}
+        if stock_code:
+            filter_query["stock_code"] = stock_code
+        if start_date or end_date:
+            filter_query["date"] = {}
+            if start_date:
+                filter_query["date"]["$gte"] = start_date
+            if end_date:
+                filter_query["date"]["$lte"] = end_date
+        
+        cursor = self.mongodb.stock_net_flows.find(filter_query, {"_id": 0}).sort([("date", -1), ("stock_code", 1)])
+        yield from cursor.batch_size(DATABASE_SETTINGS['cursor_batch_size'])
+    
+    def get_holdings_page(self, etf_ticker: str = None, date: str = None, start_date: str = None,
+                          end_date: str = None, after: str = None,
+                          limit: int = 1000) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """以 keyset 分頁讀取持股資料
+        
+        after 為上一頁回傳的游標，回傳 (本頁資料, 下一頁游標)，已無資料時游標為None。
+        以排序鍵範圍定位，不使用 skip，翻到後面的頁數也不會變慢：一般集合以 _id 排序；
+        時間序列集合的 _id 沒有索引，改以 (meta.etf_ticker, ts, meta.stock_code) 排序，_id 只用於同鍵時的順序
+        """
+        try:
+            filter_query = self.mongodb.holdings_filter(
+                etf_ticker=etf_ticker,
+                date=date,
+                start_date=start_date,
+                end_date=end_date
+            )
+            if self.mongodb.holdings_timeseries:
+                sort_fields = [self.mongodb.holdings_field(field) for field in ("etf_ticker", "date", "stock_code")]
+                sort_fields.append("_id")
+            else:
+                sort_fields = ["_id"]
+            
+            if after:
+                if self.mongodb.holdings_timeseries:
+                    etf, date_value, stock_code, last_id = json.loads(after)
+                    last_keys = [etf, self.mongodb.holdings_date_value(date_value), stock_code, ObjectId(last_id)]
+                else:
+                    last_keys = [ObjectId(after)]
+                
+                # 排序鍵大於上一頁最後一筆：前面的鍵相同，且下一個鍵較大
+                after_query = {"$or": [
+                    dict({field: value for field, value in zip(sort_fields[:i], last_keys[:i])},
+                         **{sort_fields[i]: {"$gt": last_keys[i]}})
+                    for i in range(len(sort_fields))
+                ]}
+                filter_query = {"$and": [filter_query, after_query]} if filter_query else after_query
+            
+            cursor = self.mongodb.holdings.find(filter_query, {"created_at": 0})
+            cursor = cursor.sort([(field, 1) for field in sort_fields]).limit(limit)
+            
+            holdings = []
+            last_id = None
+            for holding in cursor:
+                last_id = holding['_id']
+                holdings.append(self.mongodb.from_holdings_document(holding))
+            
+            if last_id is None or len(holdings) < limit:
+                return holdings, None
+            if self.mongodb.holdings_timeseries:
+                last = holdings[-1]
+                return holdings, json.dumps([last['etf_ticker'], last['date'], last['stock_code'], str(last_id)])
+            return holdings, str(last_id)
+        
+        except Exception as e:
+            self.logger.error(f"分頁取得持股資料失敗: {e}")
+            return [], None
+    
+    # ==================== 抓取任務操作 ====================
+    
+    def enqueue_scrape_tasks(self, issuer: str, run_date: str, etf_tickers: List[str]) -> int:
+        """建立一批抓取任務，已存在的任務保留原狀態，失敗的任務改回 pending"""
+        try:
+            now = datetime.now()
+            batch = {"issuer": issuer, "run_date": run_date}
+            if etf_tickers:
+                self.mongodb.scrape_tasks.bulk_write([
+                    UpdateOne(
+                        {"_id": scrape_task_id(issuer, run_date, etf_ticker)},
+                        {"$setOnInsert": dict(
+                            batch,
+                            etf_ticker=etf_ticker,
+                            position=position,
+                            status=TASK_PENDING,
+                            attempts=0,
+                            error=None,
+                            worker=None,
+                            lease_until=None,
+                            created_at=now,
+                            updated_at=now
+                        )},
+                        upsert=True
+                    )
+                    for position, etf_ticker in enumerate(etf_tickers)
+                ], ordered=False)
+            
+            # running 的任務由租約處理，過期後 claim 時自動接手
+            self.mongodb.scrape_tasks.update_many(
+                dict(batch, status=TASK_FAILED),
+                {"$set": {"status": TASK_PENDING, "updated_at": now}}
+            )
+            return self.mongodb.scrape_tasks.count_documents(dict(batch, status=TASK_PENDING))
+        
+        except Exception as e:
+            self.logger.error(f"建立抓取任務失敗: {e}")
+            return -1
+    
+    def claim_scrape_task(self, issuer: str, run_date: str, worker: str,
+                          lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """以原子操作取出下一個 pending 或租約已過期的任務並標記為 running
+        
+        租約到期時間 (lease_until，UTC) 以資料庫伺服器的 $$NOW 計算與比較，
+        不受各台 worker 本機時鐘與時區差異影響
+        """
+        try:
+            now = datetime.now()
+            task = self.mongodb.scrape_tasks.find_one_and_update(
+                {
+                    "issuer": issuer,
+                    "run_date": run_date,
+                    "$or": [
+                        {"status": TASK_PENDING},
+                        # lease_until 為 null 時小於任何日期，視為已過期
+                        {"status": TASK_RUNNING, "$expr": {"$lt": ["$lease_until", "$$NOW"]}}
+                    ]
+                },
+                [{
+                    "$set": {
+                        "status": TASK_RUNNING,
+                        "worker": {"$literal": worker},
+                        "lease_until": {"$add": ["$$NOW", lease_seconds * 1000]},
+                        "attempts": {"$add": [{"$ifNull": ["$attempts", 0]}, 1]},
+                        "started_at": now,
+                        "updated_at": now
+                    }
+                }],
+                sort=[("position", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if task is not None:
+                task['task_id'] = task.pop('_id')
+            return task
+        
+        except Exception as e:
+            self.logger.error(f"領取抓取任務失敗: {e}")
+            return None
+    
+    def heartbeat_scrape_task(self, task_id: str, worker: str, lease_seconds: int) -> bool:
+        """延長自己持有的任務租約 (以資料庫伺服器時間計算到期時間)"""
+        try:
+            result = self.mongodb.scrape_tasks.update_one(
+                {"_id": task_id, "worker": worker, "status": TASK_RUNNING},
+                [{"$set": {"lease_until": {"$add": ["$$NOW", lease_seconds * 1000]}, "updated_at": datetime.now()}}]
+            )
+            return result.matched_count > 0
+        
+        except Exception as e:
+            self.logger.error(f"延長抓取任務 {task_id} 租約失敗: {e}")
+            return False
+    
+    def finish_scrape_task(self, task_id: str, status: str, error: str = None, worker: str = None) -> bool:
+        """記錄任務結果 (done / failed)，指定 worker 時只在仍持有租約時更新"""
+        try:
+            now = datetime.now()
+            filter_query = {"_id": task_id}
+            if worker:
+                filter_query.update(worker=worker, status=TASK_RUNNING)
+            result = self.mongodb.scrape_tasks.update_one(
+                filter_query,
+                {"$set": {"status": status, "error": error, "lease_until": None,
+                          "finished_at": now, "updated_at": now}}
+            )
+            return result.matched_count > 0
+        
+        except Exception as e:
+            self.logger.error(f"更新抓取任務 {task_id} 失敗: {e}")
+            return False
+    
+    def iter_scrape_tasks(self, issuer: str = None, run_date: str = None,
+                          status: str = None) -> Iterator[Dict[str, Any]]:
+        """讀取抓取任務，依建立順序"""
+        filter_query = {}
+        if issuer:
+            filter_query["issuer"] = issuer
+        if run_date:
+            filter_query["run_date"] = run_date
+        if status:
+            filter_query["status"] = status
+        
+        cursor = self.mongodb.scrape_tasks.find(filter_query).sort([("run_date", -1), ("position", 1)])
+        for task in cursor.batch_size(DATABASE_SETTINGS['cursor_batch_size']):
+            task['task_id'] = task.pop('_id')
+            yield task
+    
+    # ==================== 爬蟲日誌操作 ====================
+    
+    def save_scraper_log(self, issuer: str, action: str, details: Dict[str, Any], status: str = "success") -> bool:
+        """儲存爬蟲日誌"""
+        try:
+            log_data = {
+                "issuer": issuer,
+                "action": action,
+                "details": details,
+                "timestamp": datetime.now(),
+                "status": status
+            }
+            
+            result = self.mongodb.scraper_logs.insert_one(log_data)
+            
+            if result.inserted_id:
+                self.logger.info(f"爬蟲日誌儲存成功: {issuer} - {action}")
+                return True
+            else:
+                return False
+        
+        except Exception as e:
+            self.logger.error(f"儲存爬蟲日誌失敗: {e}")
+            return False
+    
+    def iter_scraper_logs(self, issuer: str = None, limit: int = None, batch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取爬蟲日誌，依時間由新到舊"""
+        filter_query = {}
+        if issuer:
+            filter_query["issuer"] = issuer
+        
+        # 時間只精確到毫秒，同一毫秒內的日誌依寫入順序 (_id) 排列
+        cursor = self.mongodb.scraper_logs.find(filter_query, {"_id": 0}).sort([("timestamp", -1), ("_id", -1)])
+        if limit:
+            cursor = cursor.limit(limit)
+        yield from cursor.batch_size(batch_size or DATABASE_SETTINGS['cursor_batch_size'])
+    
+    # ==================== 執行指標操作 ====================
+    
+    def save_run_metrics(self, run: Dict[str, Any], etf_runs: List[Dict[str, Any]]) -> bool:
+        """一次寫入整次執行與每檔ETF的指標，並累加每日彙總"""
+        try:
+            documents = [dict(run, kind="run")] + [dict(etf_run, kind="etf") for etf_run in etf_runs]
+            self.mongodb.run_metrics.insert_many(documents, ordered=False)
+            
+            rollup = build_daily_rollup(run, etf_runs)
+            self.mongodb.run_metrics_daily.update_one(
+                {"date": run['timestamp'].strftime('%Y-%m-%d'), "issuer": run['issuer']},
+                {"$inc": rollup, "$set": {"updated_at": datetime.now()}},
+                upsert=True
+            )
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"儲存執行指標失敗: {e}")
+            return False
+    
+    def iter_runs(self, issuer: str = None, limit: int = None) -> Iterator[Dict[str, Any]]:
+        """串流讀取執行紀錄，依時間由新到舊"""
+        filter_query = {"kind": "run"}
+        if issuer:
+            filter_query["issuer"] = issuer
+        
+        cursor = self.mongodb.run_metrics.find(filter_query, {"_id": 0, "kind": 0}).sort([("timestamp", -1), ("_id", -1)])
+        if limit:
+            cursor = cursor.limit(limit)
+        yield from cursor.batch_size(DATABASE_SETTINGS['cursor_batch_size'])
+    
+    def iter_etf_runs(self, run_id: str) -> Iterator[Dict[str, Any]]:
+        """讀取一次執行中每檔ETF的指標"""
+        yield from self.mongodb.run_metrics.find({"run_id": run_id, "kind": "etf"}, {"_id": 0, "kind": 0})
+    
+    def get_daily_rollups(self, issuer: str = None, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """取得每日彙總，依日期由新到舊"""
+        try:
+            filter_query = {}
+            if issuer:
+                filter_query["issuer"] = issuer
+            if start_date or end_date:
+                filter_query["date"] = {}
+                if start_date:
+                    filter_query["date"]["$gte"] = start_date
+                if end_date:
+                    filter_query["date"]["$lte"] = end_date
+            
+            return list(self.mongodb.run_metrics_daily.find(filter_query, {"_id": 0}).sort("date", -1))
+        except Exception as e:
+            self.logger.error(f"取得每日彙總失敗: {e}")
+            return []
+    
+    # ==================== 統計查詢操作 ====================
+    
+    def get_etf_count(self, issuer: str = None) -> int:
+        """取得ETF數量"""
+        try:
+            filter_query = {}
+            if issuer:
+                filter_query["issuer"] = issuer
+            
+            count = self.mongodb.etfs.count_documents(filter_query)
+            return count
+        
+        except Exception as e:
+            self.logger.error(f"取得ETF數量失敗: {e}")
+            return 0
+    
+    def get_holdings_count(self, etf_ticker: str = None, date: str = None) -> int:
+        """取得持股資料數量"""
+        try:
+            filter_query = self.mongodb.holdings_filter(etf_ticker=etf_ticker, date=date)
+            
+            count = self.mongodb.holdings.count_documents(filter_query)
+            return count
+        
+        except Exception as e:
+            self.logger.error(f"取得持股數量失敗: {e}")
+            return 0
+    
+    def get_holdings_dates(self, start_date: str = None, end_date: str = None, etf_ticker: str = None) -> List[str]:
+        """取得有持股資料的日期，由舊到新，指定 etf_ticker 時只取該ETF的日期"""
+        try:
+            date_field = self.mongodb.holdings_field("date")
+            filter_query = self.mongodb.holdings_filter(etf_ticker=etf_ticker, start_date=start_date, end_date=end_date)
+            dates = self.mongodb.holdings.distinct(date_field, filter_query)
+            return sorted(self.mongodb.holdings_date_string(date) for date in dates)
+        except Exception as e:
+            self.logger.error(f"取得持股日期失敗: {e}")
+            return []
+    
+    def get_latest_date(self, etf_ticker: str = None) -> Optional[str]:
+        """取得最新的資料日期，指定 etf_ticker 時取得該ETF的最新日期 (走 etf_ticker+date 索引)"""
+        try:
+            date_field = self.mongodb.holdings_field("date")
+            latest = self.mongodb.holdings.find_one(
+                self.mongodb.holdings_filter(etf_ticker=etf_ticker),
+                projection={date_field: 1},
+                sort=[(date_field, -1)]
+            )
+            
+            return self.mongodb.holdings_date_string(latest[date_field]) if latest else None
+        
+        except Exception as e:
+            self.logger.error(f"取得最新日期失敗: {e}")
+            return None
+    
+    def get_holdings_version(self, etf_ticker: str = None) -> Optional[str]:
+        """取得持股資料的寫入版本，以持股摘要的 updated_at 表示 (每次寫入快照都會更新)"""
+        try:
+            filter_query = {"etf_ticker": etf_ticker} if etf_ticker else {}
+            summary = self.mongodb.holdings_summary.find_one(
+                filter_query, projection={"updated_at": 1}, sort=[("updated_at", -1)]
+            )
+            if not summary or summary.get("updated_at") is None:
+                return None
+            return str(summary["updated_at"])
+        
+        except Exception as e:
+            self.logger.error(f"取得持股寫入版本失敗: {e}")
+            return None
@@ -0,0 +1,274 @@
+"""
+持股資料 Parquet 封存
+每個寫入成功的 ETF 單日快照會匯出成一個 Parquet 檔：
+
+    <root>/daily/date=YYYY-MM-DD/etf_ticker=XXXX/part-*.parquet
+
+小檔累積後由 compact 依月份合併：
+
+    <root>/compacted/month=YYYY-MM/part-*.parquet  (依日期、ETF排序)
+
+讀取時兩區合併，同一 (日期, ETF) 以 daily 為準，
+因此合併途中中斷或合併後再補寫舊日期都不會重複。
+"""
+
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from itertools import groupby
+from typing import List, Dict, Any, Iterable, Optional
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config.database import get_parquet_archive_dir
+from utils.logger import setup_logger
+
+# 單日快照檔案欄位 (日期與ETF由目錄分區表示)
+SNAPSHOT_SCHEMA = pa.schema([
+    ("stock_code", pa.string()),
+    ("stock_name", pa.string()),
+    ("weight", pa.float64()),
+    ("shares", pa.int64()),
+    ("market_value", pa.float64()),
+])
+
+# 讀取時的完整欄位
+ARCHIVE_SCHEMA = pa.schema([
+    ("date", pa.string()),
+    ("etf_ticker", pa.string()),
+] + list(SNAPSHOT_SCHEMA))
+
+DAILY_PARTITIONING = ds.partitioning(
+    pa.schema([("date", pa.string()), ("etf_ticker", pa.string())]),
+    flavor="hive"
+)
+
+# 合併檔每個 row group 的筆數，讀取時依統計值略過不需要的區段
+COMPACTED_ROW_GROUP_SIZE = 128 * 1024
+
+class HoldingsParquetArchive:
+    """持股資料 Parquet 封存 - 增量匯出、月份合併與 Arrow 讀取"""
+    
+    def __init__(self, root_dir: str = None, compression: str = "zstd"):
+        self.logger = setup_logger("parquet_archive", "logs/parquet_archive.log")
+        self.root_dir = root_dir or get_parquet_archive_dir()
+        self.daily_dir = os.path.join(self.root_dir, "daily")
+        self.compacted_dir = os.path.join(self.root_dir, "compacted")
+        self.compression = compression
+        
+        os.makedirs(self.daily_dir, exist_ok=True)
+        os.makedirs(self.compacted_dir, exist_ok=True)
+    
+    # ==================== 寫入 ====================
+    
+    def _snapshot_dir(self, etf_ticker: str, date: str) -> str:
+        """取得單日快照的分區目錄"""
+        return os.path.join(self.daily_dir, f"date={date}", f"etf_ticker={etf_ticker}")
+    
+    def _write_table(self, table: pa.Table, directory: str, **kwargs) -> str:
+        """先寫入隱藏暫存檔再改名，讀取端不會看到寫到一半的檔案"""
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{uuid.uuid4().hex}.parquet"
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        path = os.path.join(directory, name)
+        
+        pq.write_table(table, tmp_path, compression=self.compression, **kwargs)
+        os.replace(tmp_path, path)
+        return path
+    
+    def _remove_parts(self, directory: str, keep: str = None):
+        """移除目錄中除了 keep 以外的 Parquet 檔"""
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".parquet") and path != keep:
+                os.remove(path)
+    
+    def write_snapshot(self, etf_ticker: str, date: str, holdings: List[Dict[str, Any]]) -> Optional[str]:
+        """匯出一檔ETF單日的持股快照，取代該分區既有的檔案"""
+        try:
+            table = pa.Table.from_pylist([
+                {
+                    "stock_code": str(holding.get('stock_code', '')),
+                    "stock_name": str(holding.get('stock_name', '')),
+                    "weight": float(holding.get('weight') or 0.0),
+                    "shares": int(holding.get('shares') or 0),
+                    "market_value": float(holding.get('market_value') or 0.0),
+                }
+                for holding in holdings
+            ], schema=SNAPSHOT_SCHEMA)
+            
+            directory = self._snapshot_dir(etf_ticker, date)
+            path = self._write_table(table, directory)
+            self._remove_parts(directory, keep=path)
+            
+            self.logger.info(f"Parquet 匯出成功: {etf_ticker} - {date}, 共 {table.num_rows} 筆")
+            return path
+        
+        except Exception as e:
+            self.logger.error(f"Parquet 匯出失敗 {etf_ticker} - {date}: {e}")
+            return None
+    
+    def export_history(self, etf_manager, etf_ticker: str, start_date: str = None, end_date: str = None) -> int:
+        """從儲存後端補匯出一檔ETF的歷史持股，回傳匯出的日數"""
+        exported = 0
+        history = etf_manager.iter_holdings_history(etf_ticker, start_date, end_date)
+        
+        # 歷史資料依日期排序，逐日分組匯出，記憶體只保留一天的資料
+        for date, holdings in groupby(history, key=lambda holding: holding['date']):
+            if self.write_snapshot(etf_ticker, date, list(holdings)):
+                exported += 1
+        
+        self.logger.info(f"ETF {etf_ticker} 歷史匯出完成: {exported} 日")
+        return exported
+    
+    # ==================== 合併 ====================
+    
+    def _daily_dates(self) -> List[str]:
+        """列出 daily 區已有的日期"""
+        return sorted(
+            name.split("=", 1)[1]
+            for name in os.listdir(self.daily_dir)
+            if name.startswith("date=")
+        )
+    
+    def _daily_keys(self, dates: Iterable[str]) -> Dict[str, List[str]]:
+        """列出指定日期在 daily 區已有的ETF {日期: [ETF]}"""
+        keys = {}
+        for date in dates:
+            date_dir = os.path.join(self.daily_dir, f"date={date}")
+            if not os.path.isdir(date_dir):
+                continue
+            tickers = [
+                name.split("=", 1)[1]
+                for name in os.listdir(date_dir)
+                if name.startswith("etf_ticker=")
+            ]
+            if tickers:
+                keys[date] = tickers
+        return keys
+    
+    def _month_files(self, month: str) -> List[str]:
+        """列出某月份的合併檔"""
+        directory = os.path.join(self.compacted_dir, f"month={month}")
+        if not os.path.isdir(directory):
+            return []
+        return [
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.endswith(".parquet")
+        ]
+    
+    def compact(self, before_date: str = None) -> int:
+        """把 before_date 之前各月份的單日小檔合併為月檔，預設為本月以前，回傳合併的月份數"""
+        if before_date is None:
+            before_date = datetime.now().strftime('%Y-%m-01')
+        
+        months = defaultdict(list)
+        for date in self._daily_dates():
+            if date < before_date:
+                months[date[:7]].append(date)
+        
+        compacted = 0
+        for month, dates in sorted(months.items()):
+            try:
+                self._compact_month(month, dates)
+                compacted += 1
+            except Exception as e:
+                self.logger.error(f"合併 {month} 失敗: {e}")
+        
+        return compacted
+    
+    def _compact_month(self, month: str, dates: List[str]):
+        """合併一個月份：既有月檔 + daily 小檔，同一 (日期, ETF) 以 daily 為準"""
+        daily = ds.dataset(self.daily_dir, format="parquet", schema=ARCHIVE_SCHEMA,
+                           partitioning=DAILY_PARTITIONING)
+        new_table = daily.to_table(filter=pc.field("date").isin(dates))
+        
+        tables = [new_table]
+        old_files = self._month_files(month)
+        if old_files:
+            old_table = ds.dataset(old_files, format="parquet", schema=ARCHIVE_SCHEMA).to_table()
+            new_keys = pc.unique(pc.binary_join_element_wise(new_table["date"], new_table["etf_ticker"], "|"))
+            old_keys = pc.binary_join_element_wise(old_table["date"], old_table["etf_ticker"], "|")
+            tables.append(old_table.filter(pc.invert(pc.is_in(old_keys, value_set=new_keys))))
+        
+        table = pa.concat_tables(tables).sort_by([
+            ("date", "ascending"),
+            ("etf_ticker", "ascending"),
+            ("weight", "descending"),
+        ])
+        
+        directory = os.path.join(self.compacted_dir, f"month={month}")
+        path = self._write_table(table, directory, row_group_size=COMPACTED_ROW_GROUP_SIZE)
+        
+        # 新月檔寫好後才移除舊檔與小檔
+        for old_file in old_files:
+            os.remove(old_file)
+        for date in dates:
+            shutil.rmtree(os.path.join(self.daily_dir, f"date={date}"), ignore_errors=True)
+        
+        self.logger.info(f"合併 {month} 完成: {len(dates)} 日, 共 {table.num_rows} 筆 -> {path}")
+    
+    # ==================== 讀取 ====================
+    
+    def read(self, etf_tickers: List[str] = None, start_date: str = None, end_date: str = None,
+             stock_codes: List[str] = None, columns: List[str] = None) -> pa.Table:
+        """讀取封存的持股資料為 Arrow Table
+        
+        條件會下推到掃描層：daily 區依目錄分區略過不相關的檔案，
+        月檔依 row group 統計值略過不相關的區段
+        """
+        expression = None
+        conditions = []
+        if etf_tickers:
+            conditions.append(pc.field("etf_ticker").isin(list(etf_tickers)))
+        if start_date:
+            conditions.append(pc.field("date") >= start_date)
+        if end_date:
+            conditions.append(pc.field("date") <= end_date)
+        if stock_codes:
+            conditions.append(pc.field("stock_code").isin(list(stock_codes)))
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        
+        tables = []
+        daily = ds.dataset(self.daily_dir, format="parquet", schema=ARCHIVE_SCHEMA,
+                           partitioning=DAILY_PARTITIONING)
+        tables.append(daily.to_table(columns=columns, filter=expression))
+        
+        compacted_files = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(self.compacted_dir)
+            for name in names
+            if name.endswith(".parquet")
+        ]
+        if compacted_files:
+            compacted_expression = expression
+            
+            # 已在 daily 區的 (日期, ETF) 不從月檔讀取
+            daily_dates = [
+                date for date in self._daily_dates()
+                if (not start_date or date >= start_date) and (not end_date or date <= end_date)
+            ]
+            for date, tickers in self._daily_keys(daily_dates).items():
+                overlap = (pc.field("date") == date) & pc.field("etf_ticker").isin(tickers)
+                compacted_expression = ~overlap if compacted_expression is None else compacted_expression & ~overlap
+            
+            compacted = ds.dataset(compacted_files, format="parquet", schema=ARCHIVE_SCHEMA)
+            tables.append(compacted.to_table(columns=columns, filter=compacted_expression))
+        
+        return pa.concat_tables(tables)
+
+def main():
+    """合併上個月以前的小檔"""
+    archive = HoldingsParquetArchive()
+    print(f"Parquet 封存目錄: {archive.root_dir}")
+    
+    compacted = archive.compact()
+    print(f"合併完成: {compacted} 個月份")
+
+if __name__ == "__main__":
+    main()
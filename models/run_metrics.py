@@ -0,0 +1,137 @@
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from utils.env import env_int
+from utils.logger import setup_logger
+
+# 執行紀錄保存天數 (MongoDB 以 TTL 索引自動刪除)
+RUN_METRICS_RETENTION_DAYS = env_int("RUN_METRICS_RETENTION_DAYS", 90)
+
+# 每檔ETF的處理結果
+OUTCOME_SUCCESS = "success"
+OUTCOME_SKIPPED = "skipped"
+OUTCOME_DOWNLOAD_FAILED = "download_failed"
+OUTCOME_PARSE_FAILED = "parse_failed"
+OUTCOME_WRITE_FAILED = "write_failed"
+OUTCOME_QUARANTINED = "quarantined"
+
+# 累加型的數值欄位
+COUNTER_FIELDS = ("bytes_downloaded", "rows_parsed", "retries")
+
+def build_daily_rollup(run: Dict[str, Any], etf_runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """計算一次執行對每日彙總的增量"""
+    rollup = {
+        "runs": 1,
+        "etfs": len(etf_runs),
+        "succeeded": sum(1 for etf_run in etf_runs if etf_run['outcome'] in (OUTCOME_SUCCESS, OUTCOME_SKIPPED)),
+        "failed": sum(1 for etf_run in etf_runs if etf_run['outcome'] not in (OUTCOME_SUCCESS, OUTCOME_SKIPPED)),
+        "duration_seconds": run['duration_seconds']
+    }
+    for field in COUNTER_FIELDS:
+        rollup[field] = run[field]
+    return rollup
+
+class RunMetricsRecorder:
+    """爬蟲執行指標紀錄器
+    
+    執行期間在記憶體中累積整次執行與每檔ETF的各階段耗時、下載位元組、
+    解析筆數、重試次數與結果，結束時由 finish 一次批次寫入
+    """
+    
+    def __init__(self, etf_manager, issuer: str):
+        self.logger = setup_logger("run_metrics", "logs/run_metrics.log")
+        self.etf_manager = etf_manager
+        self.issuer = issuer
+        self.run_id = uuid.uuid4().hex
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self.etf_runs: Dict[str, Dict[str, Any]] = {}
+    
+    def _etf(self, etf_ticker: str) -> Dict[str, Any]:
+        """取得 (必要時建立) 一檔ETF的紀錄"""
+        if etf_ticker not in self.etf_runs:
+            self.etf_runs[etf_ticker] = {
+                "etf_ticker": etf_ticker,
+                "phases": {},
+                "bytes_downloaded": 0,
+                "rows_parsed": 0,
+                "retries": 0,
+                "outcome": None,
+                "error": None
+            }
+        return self.etf_runs[etf_ticker]
+    
+    @contextmanager
+    def phase(self, etf_ticker: str, name: str):
+        """計時一個處理階段 (download / parse / write)，同名階段的耗時會累加"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(etf_ticker, name, time.perf_counter() - started)
+    
+    def add_phase(self, etf_ticker: str, name: str, seconds: float):
+        """累加一個處理階段的耗時"""
+        phases = self._etf(etf_ticker)["phases"]
+        phases[name] = phases.get(name, 0.0) + seconds
+    
+    def add(self, etf_ticker: str, **counters):
+        """累加數值欄位，例如 add("0050", bytes_downloaded=1024, retries=1)"""
+        etf_run = self._etf(etf_ticker)
+        for field, value in counters.items():
+            if field not in COUNTER_FIELDS:
+                raise ValueError(f"未知的指標欄位: {field}")
+            etf_run[field] += value
+    
+    def set_outcome(self, etf_ticker: str, outcome: str, error: str = None):
+        """設定一檔ETF的處理結果"""
+        etf_run = self._etf(etf_ticker)
+        etf_run["outcome"] = outcome
+        etf_run["error"] = error
+    
+    def build(self) -> Dict[str, Any]:
+        """組成執行紀錄 {"run": 整次執行, "etf_runs": [每檔ETF]}"""
+        finished_at = datetime.now()
+        etf_runs = []
+        for etf_run in self.etf_runs.values():
+            etf_runs.append(dict(
+                etf_run,
+                run_id=self.run_id,
+                issuer=self.issuer,
+                timestamp=finished_at,
+                outcome=etf_run["outcome"] or OUTCOME_SUCCESS,
+                duration_seconds=sum(etf_run["phases"].values())
+            ))
+        
+        run = {
+            "run_id": self.run_id,
+            "issuer": self.issuer,
+            "started_at": self.started_at,
+            "timestamp": finished_at,
+            "duration_seconds": time.perf_counter() - self._started,
+            "etf_count": len(etf_runs),
+            "outcome": OUTCOME_SUCCESS,
+        }
+        for field in COUNTER_FIELDS:
+            run[field] = sum(etf_run[field] for etf_run in etf_runs)
+        failed = [etf_run for etf_run in etf_runs if etf_run["outcome"] not in (OUTCOME_SUCCESS, OUTCOME_SKIPPED)]
+        if failed:
+            run["outcome"] = "partial" if len(failed) < len(etf_runs) else "failed"
+        
+        return {"run": run, "etf_runs": etf_runs}
+    
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """結束紀錄並一次寫入，回傳整次執行的摘要"""
+        metrics = self.build()
+        if not self.etf_manager.save_run_metrics(metrics["run"], metrics["etf_runs"]):
+            self.logger.error(f"執行紀錄寫入失敗: {self.run_id}")
+            return None
+        
+        run = metrics["run"]
+        self.logger.info(
+            f"執行紀錄已寫入: {self.issuer} {self.run_id} - {run['outcome']}, "
+            f"{run['etf_count']} 檔, {run['duration_seconds']:.2f}秒"
+        )
+        return run
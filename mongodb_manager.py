@@ -4,6 +4,7 @@ MongoDB管理工具 - 簡化版本
 """
 
 from config.mongodb import get_mongodb_manager
+from config.migrations import SCHEMA_VERSION
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 
 def check_mongodb_status():
@@ -19,26 +20,19 @@ def check_mongodb_status():
         print(f"數據庫: {mongodb.database_name}")
         print(f"集合數量: {len(collections)}")
         print(f"文檔總數: {db_stats.get('objects', 0):,}")
+        print(f"結構版本: v{mongodb.get_schema_version()} (最新 v{SCHEMA_VERSION})")
         
-        # 檢查holdings集合
-        if 'holdings' in collections:
-            holdings = mongodb.db['holdings']
-            total_count = holdings.count_documents({})
+        # 檢查holdings集合 (統計讀取寫入時維護的摘要，不掃描 holdings)
+        if mongodb.holdings.name in collections:
+            summaries = get_holdings_summary(mongodb)
+            total_count = sum(summary['rows'] for summary in summaries)
             print(f"持股數據: {total_count:,} 筆")
             
             # ETF統計
-            pipeline = [
-                {"$group": {
-                    "_id": "$etf_ticker",
-                    "count": {"$sum": 1}
-                }},
-                {"$sort": {"count": -1}}
-            ]
-            
-            etf_stats = list(holdings.aggregate(pipeline))
             print(f"ETF統計:")
-            for stat in etf_stats:
-                print(f"  {stat['_id']}: {stat['count']:,} 筆")
+            for summary in summaries:
+                print(f"  {summary['etf_ticker']}: {summary['rows']:,} 筆, {summary['dates']} 日 "
+                      f"({summary['first_date']} ~ {summary['latest_date']})")
         
         return True
         
@@ -50,16 +44,31 @@ def check_mongodb_status():
         return False
 
 def query_etf_data(etf_code, limit=10):
-    """查詢ETF數據"""
+    """查詢ETF最新一日的持股數據 (完整查詢工具請用 query.py)"""
     try:
         mongodb = get_mongodb_manager()
-        collection = mongodb.db['holdings']
+        collection = mongodb.holdings
+        date_field = mongodb.holdings_field("date")
+        
+        # 先由索引取得最新日期，再只讀該日資料
+        latest = collection.find_one(
+            mongodb.holdings_filter(etf_ticker=etf_code),
+            projection={date_field: 1},
+            sort=[(date_field, -1)]
+        )
+        if not latest:
+            print(f"ETF {etf_code} 沒有持股數據")
+            return []
+        latest_date = mongodb.holdings_date_string(latest[date_field])
         
-        holdings = list(collection.find(
-            {"etf_ticker": etf_code}
-        ).sort("weight", -1).limit(limit))
+        holdings = [
+            mongodb.from_holdings_document(holding)
+            for holding in collection.find(
+                mongodb.holdings_filter(etf_ticker=etf_code, date=latest_date)
+            ).sort("weight", -1).limit(limit)
+        ]
         
-        print(f"ETF {etf_code} 持股數據 (前{limit}名):")
+        print(f"ETF {etf_code} 持股數據 ({latest_date} 前{limit}名):")
         print("-" * 60)
         
         for i, holding in enumerate(holdings, 1):
@@ -75,29 +84,23 @@ def query_etf_data(etf_code, limit=10):
         print(f"查詢失敗: {e}")
         return []
 
+def get_holdings_summary(mongodb):
+    """讀取每檔ETF的持股摘要，依筆數由多到少"""
+    return list(mongodb.holdings_summary.find({}, {"_id": 0, "days": 0}).sort("rows", -1))
+
 def get_available_etfs():
     """獲取可用的ETF列表"""
     try:
         mongodb = get_mongodb_manager()
-        collection = mongodb.db['holdings']
-        
-        pipeline = [
-            {"$group": {
-                "_id": "$etf_ticker",
-                "count": {"$sum": 1},
-                "latest_date": {"$max": "$date"}
-            }},
-            {"$sort": {"count": -1}}
-        ]
+        summaries = get_holdings_summary(mongodb)
         
-        etfs = list(collection.aggregate(pipeline))
         print("可用的ETF:")
         print("-" * 40)
         
-        for i, etf_doc in enumerate(etfs, 1):
-            print(f"{i:2d}. {etf_doc['_id']} ({etf_doc['count']} 筆數據, 最新: {etf_doc['latest_date']})")
+        for i, summary in enumerate(summaries, 1):
+            print(f"{i:2d}. {summary['etf_ticker']} ({summary['rows']} 筆數據, 最新: {summary['latest_date']})")
         
-        return [etf_doc['_id'] for etf_doc in etfs]
+        return [summary['etf_ticker'] for summary in summaries]
         
     except Exception as e:
         print(f"獲取ETF列表失敗: {e}")
@@ -117,7 +120,7 @@ def main():
     
     if etfs:
         print(f"\n查詢示例:")
-        print(f"python -c \"from mongodb_manager import query_etf_data; query_etf_data('0050', 5)\"")
+        print(f"python query.py top 0050 -n 5")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+ETF持股查詢工具
+先以索引取得最新日期，再只讀取該日的資料，查詢時間不隨歷史資料量增加
+
+用法:
+    python query.py latest 0050                  最新一日完整持股
+    python query.py top 0050 -n 10               最新一日權重前N名
+    python query.py history 0050                 每日統計 (成分股數、集中度、換手率)
+    python query.py history 0050 --stock 2330    單一股票的逐日權重與股數
+    python query.py holders 2330                 持有某檔股票的ETF
+    python query.py diff 0050                    最新一日相對前一個快照的調倉
+    python query.py diff 0050 --from 2025-08-01 --to 2025-09-01
+
+輸出格式以 --format table (預設) / csv / json 指定
+"""
+
+import argparse
+import csv
+import json
+import sys
+import unicodedata
+from typing import List, Dict, Any
+from models.etf_data import ETFDataManager
+
+HOLDING_COLUMNS = ["date", "stock_code", "stock_name", "weight", "shares", "market_value"]
+HISTORY_COLUMNS = ["date", "constituent_count", "weight_sum", "top10_weight", "hhi", "adds", "drops", "turnover"]
+TRAJECTORY_COLUMNS = ["date", "etf_ticker", "stock_code", "weight", "shares"]
+HOLDER_COLUMNS = ["date", "etf_ticker", "weight", "shares"]
+DIFF_COLUMNS = ["date", "previous_date", "stock_code", "stock_name", "change_type",
+                "shares_before", "shares_after", "shares_delta", "weight_delta"]
+
+def _display_width(text: str) -> int:
+    """計算字串在終端機的顯示寬度 (全形字佔兩格)"""
+    return sum(2 if unicodedata.east_asian_width(char) in ("W", "F") else 1 for char in text)
+
+def _format_value(value: Any) -> str:
+    """表格顯示用的數值格式"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return f"{value:,}"
+    if isinstance(value, float):
+        return f"{value:,.4f}"
+    return str(value)
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str], out=None):
+    """以對齊的表格輸出"""
+    out = out or sys.stdout
+    cells = [[_format_value(row.get(column)) for column in columns] for row in rows]
+    widths = [
+        max([_display_width(column)] + [_display_width(line[i]) for line in cells])
+        for i, column in enumerate(columns)
+    ]
+    
+    def render(values):
+        return "  ".join(value + " " * (width - _display_width(value)) for value, width in zip(values, widths))
+    
+    print(render(columns), file=out)
+    print("  ".join("-" * width for width in widths), file=out)
+    for line in cells:
+        print(render(line), file=out)
+
+def write_rows(rows: List[Dict[str, Any]], columns: List[str], output_format: str, out=None):
+    """依格式輸出查詢結果，未指定 out 時寫到呼叫當下的 sys.stdout"""
+    out = out or sys.stdout
+    if output_format == "json":
+        json.dump([{column: row.get(column) for column in columns} for row in rows],
+                  out, ensure_ascii=False, indent=2, default=str)
+        print(file=out)
+    elif output_format == "csv":
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        print_table(rows, columns, out)
+
+# ==================== 子命令 ====================
+
+def query_latest(manager: ETFDataManager, args) -> List[Dict[str, Any]]:
+    """最新一日 (或指定日期) 的完整持股"""
+    if args.date:
+        return manager.get_holdings(args.etf, args.date)
+    return manager.get_latest_holdings(args.etf)
+
+def query_top(manager: ETFDataManager, args) -> List[Dict[str, Any]]:
+    """最新一日 (或指定日期) 權重前N名"""
+    if args.date:
+        return manager.get_holdings(args.etf, args.date)[:args.limit]
+    return manager.get_latest_holdings(args.etf, args.limit)
+
+def query_history(manager: ETFDataManager, args) -> List[Dict[str, Any]]:
+    """每日統計，指定 --stock 時改為單一股票的逐日權重"""
+    if not args.stock:
+        return manager.get_etf_daily_stats(args.etf, args.start, args.end)
+    
+    # 股票的持有紀錄由反向索引讀取，只取出這檔ETF
+    rows = []
+    for day in manager.get_holders(args.stock, args.start, args.end):
+        for holder in day['holders']:
+            if holder['etf_ticker'] == args.etf:
+                rows.append(dict(holder, date=day['date'], stock_code=args.stock))
+    return rows
+
+def query_holders(manager: ETFDataManager, args) -> List[Dict[str, Any]]:
+    """持有某檔股票的ETF (預設最新日期)"""
+    date = args.date or manager.get_latest_date()
+    if not date:
+        return []
+    return [
+        dict(holder, date=day['date'])
+        for day in manager.get_holders(args.stock, date, date)
+        for holder in day['holders']
+    ]
+
+def query_diff(manager: ETFDataManager, args) -> List[Dict[str, Any]]:
+    """兩個快照之間的調倉，未指定 --from 時讀取已計算的調倉紀錄"""
+    to_date = args.to_date or manager.get_latest_date(args.etf)
+    if not to_date:
+        return []
+    
+    if not args.from_date:
+        return manager.get_holdings_changes(args.etf, start_date=to_date, end_date=to_date)
+    
+    from analytics.rebalance import diff_holdings
+    changes = diff_holdings(manager.get_holdings(args.etf, args.from_date), manager.get_holdings(args.etf, to_date))
+    return [dict(change, date=to_date, previous_date=args.from_date) for change in changes]
+
+COMMANDS = {
+    "latest": (query_latest, HOLDING_COLUMNS),
+    "top": (query_top, HOLDING_COLUMNS),
+    "history": (query_history, HISTORY_COLUMNS),
+    "holders": (query_holders, HOLDER_COLUMNS),
+    "diff": (query_diff, DIFF_COLUMNS),
+}
+
+def build_parser() -> argparse.ArgumentParser:
+    """建立命令列參數"""
+    parser = argparse.ArgumentParser(description="ETF持股查詢工具")
+    parser.add_argument("--format", choices=["table", "csv", "json"], default="table", help="輸出格式")
+    parser.add_argument("--backend", help="儲存後端 (預設讀取 ETF_STORAGE_BACKEND)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    latest = subparsers.add_parser("latest", help="最新一日完整持股")
+    latest.add_argument("etf", help="ETF代號")
+    latest.add_argument("--date", help="指定日期 (YYYY-MM-DD)")
+    
+    top = subparsers.add_parser("top", help="權重前N名")
+    top.add_argument("etf", help="ETF代號")
+    top.add_argument("-n", "--limit", type=int, default=10, help="筆數 (預設10)")
+    top.add_argument("--date", help="指定日期 (YYYY-MM-DD)")
+    
+    history = subparsers.add_parser("history", help="每日統計或單一股票的逐日權重")
+    history.add_argument("etf", help="ETF代號")
+    history.add_argument("--stock", help="股票代號")
+    history.add_argument("--start", help="開始日期")
+    history.add_argument("--end", help="結束日期")
+    
+    holders = subparsers.add_parser("holders", help="持有某檔股票的ETF")
+    holders.add_argument("stock", help="股票代號")
+    holders.add_argument("--date", help="指定日期 (預設最新日期)")
+    
+    diff = subparsers.add_parser("diff", help="兩個快照之間的調倉")
+    diff.add_argument("etf", help="ETF代號")
+    diff.add_argument("--from", dest="from_date", help="比較基準日期 (預設前一個快照)")
+    diff.add_argument("--to", dest="to_date", help="比較日期 (預設最新日期)")
+    
+    return parser
+
+def main(argv: List[str] = None) -> int:
+    """主函數"""
+    args = build_parser().parse_args(argv)
+    handler, columns = COMMANDS[args.command]
+    if args.command == "history" and args.stock:
+        columns = TRAJECTORY_COLUMNS
+    
+    manager = ETFDataManager(backend=args.backend)
+    try:
+        rows = handler(manager, args)
+    finally:
+        manager.close()
+    
+    if not rows:
+        print("查無資料", file=sys.stderr)
+        return 1
+    
+    write_rows(rows, columns, args.format)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
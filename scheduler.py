@@ -6,41 +6,30 @@
 
 import schedule
 import time
-import subprocess
 import sys
-import os
-from datetime import datetime
+from scraper_runner import YUANTA_WORK_KEY, create_runner
 from utils.logger import setup_logger
+from utils.run_lock import create_run_lock
 
 class ETFScraperScheduler:
     """ETF爬蟲定時執行器"""
     
-    def __init__(self):
+    def __init__(self, run_mode: str = None):
         self.logger = setup_logger("scheduler", "logs/scheduler.log")
-        self.scraper_script = os.path.join(os.getcwd(), "yuanta_etf_scraper.py")
+        # inprocess: 常駐共用連線與瀏覽器；subprocess: 每次啟動新行程 (見 scraper_runner.py)
+        self.runner = create_runner(run_mode, self.logger)
         
     def run_scraper(self):
-        """執行爬蟲腳本 (帶重試機制)"""
+        """執行爬蟲 (帶重試機制)"""
         try:
             self.logger.info("🚀 開始執行元大ETF爬蟲 (帶重試機制)...")
-            start_time = datetime.now()
-            
-            # 執行爬蟲腳本
-            result = subprocess.run([
-                sys.executable, self.scraper_script
-            ], capture_output=True, text=True, cwd=os.getcwd())
-            
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
-            if result.returncode == 0:
-                self.logger.info(f"✅ 爬蟲執行成功！耗時: {duration:.2f}秒")
-                if result.stdout:
-                    self.logger.info(f"輸出: {result.stdout}")
-            else:
-                self.logger.error(f"❌ 爬蟲執行失敗！返回碼: {result.returncode}")
-                if result.stderr:
-                    self.logger.error(f"錯誤: {result.stderr}")
+            # 與進階排程器及其他行程共用同一把執行鎖，避免同時抓取；
+            # 鎖交給 runner，爬蟲真正結束 (包含逾時後的收尾) 時才釋放
+            lock = create_run_lock(YUANTA_WORK_KEY)
+            if not lock.acquire():
+                self.logger.warning("其他行程正在抓取元大ETF，略過本次執行")
+                return
+            self.runner.run(lock)
                 
         except Exception as e:
             self.logger.error(f"❌ 執行爬蟲時發生錯誤: {e}")
@@ -73,10 +62,15 @@ class ETFScraperScheduler:
         except KeyboardInterrupt:
             self.logger.info("排程器已停止")
             print("\n排程器已停止")
+        finally:
+            self.runner.close()
 
 def main():
-    """主函數"""
-    scheduler = ETFScraperScheduler()
+    """主函數
+    
+    用法: python scheduler.py [--subprocess]
+    """
+    scheduler = ETFScraperScheduler("subprocess" if "--subprocess" in sys.argv else None)
     scheduler.run_scheduler()
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+分散式抓取 worker
+多台機器 (或同一台機器的多個行程) 連到同一個 MongoDB，從 scrape_tasks 以租約領取每檔ETF的抓取任務。
+處理期間定期延長租約；worker 失聯時租約在 SCRAPE_TASK_LEASE_SECONDS 秒後過期，
+任務由其他仍在執行的 worker 接手。
+
+用法:
+    python scrape_worker.py enqueue [--date YYYY-MM-DD]     建立當日任務 (失敗的任務改回 pending)
+    python scrape_worker.py work [--workers 2] [--date]     領取並執行任務，全部完成後結束
+    python scrape_worker.py status [--date] [--format json] 查看任務狀態
+"""
+
+import argparse
+import sys
+import threading
+from datetime import datetime
+from typing import List
+
+TASK_COLUMNS = ["etf_ticker", "status", "attempts", "worker", "lease_until", "error", "updated_at"]
+
+def enqueue(args) -> int:
+    """建立當日的抓取任務"""
+    from models.etf_data import ETFDataManager
+    from yuanta_etf_scraper import YUANTA_ETF_LIST
+    
+    manager = ETFDataManager()
+    try:
+        pending = manager.enqueue_scrape_tasks("元大投信", args.date, YUANTA_ETF_LIST)
+    finally:
+        manager.close()
+    
+    if pending < 0:
+        print("建立任務失敗", file=sys.stderr)
+        return 1
+    print(f"{args.date}: {pending} 個任務待執行")
+    return 0
+
+def work(args) -> int:
+    """領取並執行任務，Ctrl+C 時在目前的ETF完成後結束"""
+    from utils.driver_pool import DriverPool
+    from yuanta_etf_scraper import YuantaETFScraper
+    
+    stop_event = threading.Event()
+    driver_pool = DriverPool(size=args.workers)
+    scraper = YuantaETFScraper(driver_pool=driver_pool, stop_event=stop_event)
+    
+    runner = threading.Thread(
+        target=scraper.scrape_all_etfs,
+        kwargs={"workers": args.workers, "enqueue": False, "run_date": args.date},
+        name="scrape-worker"
+    )
+    runner.start()
+    try:
+        while runner.is_alive():
+            runner.join(1)
+    except KeyboardInterrupt:
+        print("已要求停止，目前的ETF完成後結束")
+        stop_event.set()
+        runner.join()
+    finally:
+        if scraper.writer:
+            scraper.writer.close()
+        driver_pool.close()
+        scraper.etf_manager.close()
+    return 0
+
+def status(args) -> int:
+    """查看任務狀態"""
+    from models.etf_data import ETFDataManager
+    from query import write_rows
+    
+    manager = ETFDataManager()
+    try:
+        tasks = manager.get_scrape_tasks("元大投信", args.date)
+    finally:
+        manager.close()
+    
+    if not tasks:
+        print("查無任務", file=sys.stderr)
+        return 1
+    write_rows(tasks, TASK_COLUMNS, args.format)
+    return 0
+
+COMMANDS = {"enqueue": enqueue, "work": work, "status": status}
+
+def build_parser() -> argparse.ArgumentParser:
+    """建立命令列參數"""
+    parser = argparse.ArgumentParser(description="分散式抓取 worker")
+    parser.add_argument("command", choices=list(COMMANDS), help="enqueue / work / status")
+    parser.add_argument("--date", default=datetime.now().strftime('%Y-%m-%d'), help="任務日期 (預設今天)")
+    parser.add_argument("--workers", type=int, default=1, help="本行程同時處理的ETF數 (預設1)")
+    parser.add_argument("--format", choices=["table", "csv", "json"], default="table", help="status 的輸出格式")
+    return parser
+
+def main(argv: List[str] = None) -> int:
+    """主函數"""
+    args = build_parser().parse_args(argv)
+    return COMMANDS[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+排程器執行爬蟲的方式
+- inprocess (預設): 在排程器行程內執行，多次執行共用資料庫連線、背景寫入佇列與瀏覽器驅動池，
+  省下每次啟動直譯器、載入 pandas/selenium、連線 MongoDB 與檢查索引的時間。
+  每次執行建立新的 YuantaETFScraper (統計與指標互不影響)，在獨立執行緒中執行並限制時間
+- subprocess: 每次啟動新的 python yuanta_etf_scraper.py，與排程器完全隔離
+
+以 SCRAPER_RUN_MODE 選擇，SCRAPER_RUN_TIMEOUT 為單次執行的時間上限 (秒)
+
+run(lock) 接手呼叫端已取得的執行鎖 (utils/run_lock.py)，在爬蟲真正結束時才釋放：
+inprocess 逾時後執行緒仍會把目前的ETF做完，期間其他排程器或行程不能開始抓取
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from utils.env import env_int
+from utils.logger import setup_logger
+
+RUN_MODES = ("inprocess", "subprocess")
+
+# 元大ETF持股抓取的工作識別，排程合併與執行鎖共用
+YUANTA_WORK_KEY = "yuanta_holdings"
+
+def get_run_mode(mode: str = None) -> str:
+    """取得執行方式，未指定時讀取 SCRAPER_RUN_MODE"""
+    mode = (mode or os.getenv("SCRAPER_RUN_MODE", "inprocess")).strip().lower()
+    if mode not in RUN_MODES:
+        raise ValueError(f"未知的執行方式: {mode}，可用: {', '.join(RUN_MODES)}")
+    return mode
+
+class SubprocessScraperRunner:
+    """每次執行啟動新的爬蟲行程"""
+    
+    def __init__(self, logger=None, timeout: int = None):
+        self.logger = logger or setup_logger("scraper_runner", "logs/scraper_runner.log")
+        self.timeout = timeout or env_int("SCRAPER_RUN_TIMEOUT", 1800)
+        self.scraper_script = os.path.join(os.getcwd(), "yuanta_etf_scraper.py")
+    
+    def run(self, lock=None) -> bool:
+        """執行爬蟲腳本，回傳是否成功結束；逾時的子行程會被終止，結束後釋放 lock"""
+        start_time = datetime.now()
+        try:
+            result = subprocess.run([
+                sys.executable, self.scraper_script
+            ], capture_output=True, text=True, cwd=os.getcwd(), timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.logger.error(f"❌ 爬蟲執行超過 {self.timeout} 秒，已終止")
+            return False
+        finally:
+            if lock is not None:
+                lock.release()
+        
+        duration = (datetime.now() - start_time).total_seconds()
+        if result.returncode == 0:
+            self.logger.info(f"✅ 爬蟲執行成功！耗時: {duration:.2f}秒")
+            if result.stdout:
+                self.logger.info(f"輸出: {result.stdout}")
+            return True
+        
+        self.logger.error(f"❌ 爬蟲執行失敗！返回碼: {result.returncode}")
+        if result.stderr:
+            self.logger.error(f"錯誤: {result.stderr}")
+        return False
+    
+    def close(self):
+        """沒有常駐資源"""
+        pass
+
+class InProcessScraperRunner:
+    """在排程器行程內執行爬蟲，共用的資源在第一次執行時建立並保留到 close"""
+    
+    def __init__(self, logger=None, timeout: int = None):
+        self.logger = logger or setup_logger("scraper_runner", "logs/scraper_runner.log")
+        self.timeout = timeout or env_int("SCRAPER_RUN_TIMEOUT", 1800)
+        self.etf_manager = None
+        self.writer = None
+        self.driver_pool = None
+        
+        # 逾時後仍在收尾的執行，結束前不開始新的執行
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event: Optional[threading.Event] = None
+    
+    def _ensure_resources(self):
+        """建立多次執行共用的資料庫連線、寫入佇列與驅動池"""
+        if self.etf_manager is not None:
+            return
+        
+        from models.etf_data import ETFDataManager
+        from models.holdings_writer import HoldingsWriteQueue
+        from utils.driver_pool import DriverPool
+        from utils.env import env_flag
+        
+        self.etf_manager = ETFDataManager()
+        if env_flag("HOLDINGS_WRITE_BEHIND", True):
+            self.writer = HoldingsWriteQueue(self.etf_manager)
+        self.driver_pool = DriverPool()
+        self.logger.info("已建立常駐的資料庫連線與瀏覽器驅動池")
+    
+    def run(self, lock=None) -> bool:
+        """執行一次爬蟲，超過時間上限時要求停止並回傳 False
+        
+        lock 在執行緒結束時才釋放，逾時後仍在收尾的執行會繼續持有執行鎖
+        """
+        if self._thread is not None and self._thread.is_alive():
+            # 執行鎖仍由收尾中的執行持有 (同一行程的 MongoDB 租約可重入)，不在這裡釋放
+            self.logger.error("❌ 上一次逾時的執行仍在收尾，略過本次執行")
+            return False
+        
+        try:
+            from yuanta_etf_scraper import YuantaETFScraper
+            self._ensure_resources()
+            
+            self._stop_event = threading.Event()
+            scraper = YuantaETFScraper(
+                write_behind=self.writer is not None,
+                etf_manager=self.etf_manager,
+                writer=self.writer,
+                driver_pool=self.driver_pool,
+                stop_event=self._stop_event
+            )
+        except Exception:
+            if lock is not None:
+                lock.release()
+            raise
+        
+        outcome: Dict[str, object] = {}
+        
+        def target():
+            try:
+                outcome['results'] = scraper.scrape_all_etfs()
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                if lock is not None:
+                    lock.release()
+        
+        start_time = datetime.now()
+        self._thread = threading.Thread(target=target, name="scraper-run", daemon=True)
+        self._thread.start()
+        self._thread.join(self.timeout)
+        duration = (datetime.now() - start_time).total_seconds()
+        
+        if self._thread.is_alive():
+            # 執行緒無法強制終止，要求在目前這檔ETF結束後停止
+            self._stop_event.set()
+            self.logger.error(f"❌ 爬蟲執行超過 {self.timeout} 秒，已要求在目前的ETF完成後停止 (結束前仍持有執行鎖)")
+            return False
+        
+        if 'error' in outcome:
+            self.logger.error(f"❌ 爬蟲執行失敗: {outcome['error']}")
+            return False
+        
+        results = outcome.get('results') or {}
+        succeeded = sum(1 for status in results.values() if "✅" in status)
+        self.logger.info(f"✅ 爬蟲執行完成！耗時: {duration:.2f}秒，成功 {succeeded}/{len(scraper.etf_list)} 檔")
+        return True
+    
+    def close(self):
+        """停止進行中的執行並釋放共用資源"""
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(60)
+        if self.writer is not None:
+            self.writer.close()
+        if self.driver_pool is not None:
+            self.driver_pool.close()
+        if self.etf_manager is not None:
+            self.etf_manager.close()
+
+def create_runner(mode: str = None, logger=None, timeout: int = None):
+    """依執行方式建立 runner"""
+    if get_run_mode(mode) == "subprocess":
+        return SubprocessScraperRunner(logger, timeout)
+    return InProcessScraperRunner(logger, timeout)
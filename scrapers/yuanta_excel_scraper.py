@@ -13,7 +13,7 @@ from urllib.parse import urljoin, urlparse
 import time
 import re
 import urllib3
-from config.mongodb import get_mongodb_manager
+from models.etf_data import ETFDataManager
 from utils.logger import setup_logger
 
 # 禁用SSL警告
@@ -39,8 +39,8 @@ class YuantaExcelScraper:
         self.download_dir = "downloads/yuanta"
         os.makedirs(self.download_dir, exist_ok=True)
         
-        # MongoDB 連接
-        self.mongodb = get_mongodb_manager()
+        # 資料儲存 (統一經由 ETFDataManager 寫入標準格式)
+        self.etf_manager = ETFDataManager()
     
     def get_etf_list(self) -> List[Dict[str, str]]:
         """取得元大ETF清單"""
@@ -562,42 +562,14 @@ class YuantaExcelScraper:
                 return False
             
             etf_ticker = parsed_data['etf_ticker']
-            holdings = parsed_data['holdings']
             current_date = datetime.now().strftime("%Y-%m-%d")
-            current_timestamp = datetime.now()
             
-            # 儲存到MongoDB
-            collection = self.mongodb.holdings
-            
-            # 先刪除該ETF當天的舊資料
-            collection.delete_many({
-                "etf_ticker": etf_ticker,
-                "date": current_date
-            })
-            
-            # 插入新資料，加上時間戳記
-            holdings_data = []
-            for holding in holdings:
-                holding_doc = {
-                    "etf_ticker": etf_ticker,
-                    "stock_code": holding['stock_code'],
-                    "stock_name": holding['stock_name'],
-                    "quantity": holding['quantity'],
-                    "weight": holding['weight'],
-                    "date": current_date,  # 新增日期欄位
-                    "download_date": parsed_data['parse_date'],
-                    "file_path": parsed_data['file_path'],
-                    "created_at": current_timestamp,
-                    "updated_at": current_timestamp  # 新增更新時間
-                }
-                holdings_data.append(holding_doc)
-            
-            if holdings_data:
-                result = collection.insert_many(holdings_data)
-                self.logger.info(f"成功儲存 {etf_ticker} 持股資料到MongoDB，共 {len(result.inserted_ids)} 筆，日期: {current_date}")
+            # 同一天重新下載時覆蓋當天的舊資料
+            if self.etf_manager.save_holdings(etf_ticker, parsed_data['holdings'], current_date, force_update=True):
+                self.logger.info(f"成功儲存 {etf_ticker} 持股資料，共 {len(parsed_data['holdings'])} 筆，日期: {current_date}")
                 return True
             else:
-                self.logger.warning(f"沒有 {etf_ticker} 的持股資料需要儲存")
+                self.logger.warning(f"{etf_ticker} 的持股資料儲存失敗")
                 return False
                 
         except Exception as e:
@@ -1,9 +1,13 @@
 import json
 import re
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, Optional
 from bs4 import BeautifulSoup
 from .base_scraper import BaseScraper
 
+# 持股 API 回應中可能標示資料日期的欄位 (指定的歷史日期沒有資料時，API 可能改回傳最新一日)
+RESPONSE_DATE_KEYS = ("Date", "DataDate", "TradeDate", "TranDate")
+
 class YuantaScraper(BaseScraper):
     """元大投信ETF爬蟲"""
     
@@ -31,19 +35,24 @@ class YuantaScraper(BaseScraper):
             
             self.logger.info(f"取得 {len(etf_list)} 檔元大ETF")
             return etf_list
-            
+        
         except Exception as e:
             self.logger.error(f"取得ETF清單失敗: {e}")
             return []
     
-    def scrape_etf_holdings(self, etf: Dict[str, str]) -> List[Dict[str, Any]]:
-        """爬取單一ETF的持股資料"""
+    def scrape_etf_holdings(self, etf: Dict[str, str], date: str = None) -> List[Dict[str, Any]]:
+        """爬取單一ETF的持股資料，指定 date (YYYY-MM-DD) 時取得該日的歷史持股"""
+        return self.scrape_etf_snapshot(etf, date)['holdings']
+    
+    def scrape_etf_snapshot(self, etf: Dict[str, str], date: str = None) -> Dict[str, Any]:
+        """爬取單一ETF的持股資料與回應標示的資料日期 {"date": YYYY-MM-DD 或 None, "holdings": [...]}"""
         try:
             # 取得持股資料API
             holdings_api = f"https://www.yuantaetfs.com/api/Etf/GetEtfHolding"
             payload = {
                 "etfCode": etf['ticker'],
-                "date": ""  # 空字串會取得最新資料
+                # 空字串會取得最新資料，歷史日期與網站相同使用 YYYY/MM/DD
+                "date": datetime.strptime(date, '%Y-%m-%d').strftime('%Y/%m/%d') if date else ""
             }
             
             response = self.session.post(holdings_api, json=payload)
@@ -60,8 +69,23 @@ class YuantaScraper(BaseScraper):
                     'market_value': holding.get('MarketValue', 0.0)
                 })
             
-            return self.clean_data(holdings)
-            
+            return {"date": self._response_date(data), "holdings": self.clean_data(holdings)}
+        
         except Exception as e:
-            self.logger.error(f"爬取 {etf['ticker']} 持股資料失敗: {e}")
-            return []
+            self.logger.error(f"爬取 {etf['ticker']} {date or '最新'} 持股資料失敗: {e}")
+            return {"date": None, "holdings": []}
+    
+    def _response_date(self, data: Dict[str, Any]) -> Optional[str]:
+        """取出回應標示的資料日期 (最外層或第一筆持股)，沒有標示時回傳 None"""
+        rows = data.get('Data') or []
+        for source in (data, rows[0] if rows and isinstance(rows[0], dict) else {}):
+            for key in RESPONSE_DATE_KEYS:
+                value = source.get(key)
+                if not value:
+                    continue
+                for date_format in ('%Y/%m/%d', '%Y-%m-%d', '%Y%m%d'):
+                    try:
+                        return datetime.strptime(str(value)[:10], date_format).strftime('%Y-%m-%d')
+                    except ValueError:
+                        continue
+        return None
@@ -65,7 +65,7 @@ def test_duplicate_check():
     
     # 清理測試數據
     print("\n清理測試數據...")
-    etf_manager.mongodb.holdings.delete_many({"etf_ticker": etf_code})
+    etf_manager.mongodb.holdings.delete_many(etf_manager.mongodb.holdings_filter(etf_ticker=etf_code))
     print("測試完成")
 
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+"""
+測試共用設定
+儲存後端使用記憶體中的 DuckDB，MongoDB 相關測試使用 mongomock，不需要資料庫伺服器
+"""
+
+import os
+import sys
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# 會改變寫入流程的選用功能，測試時一律關閉
+OPTIONAL_FEATURES = ("PARQUET_ARCHIVE_ENABLED", "WEIGHT_CUBE_ENABLED", "VALIDATION_MODE", "ETF_STORAGE_BACKEND")
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """每個測試在暫存目錄執行，日誌、鎖檔與下載檔不寫入專案目錄"""
+    monkeypatch.chdir(tmp_path)
+    for name in OPTIONAL_FEATURES:
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path
+
+@pytest.fixture
+def store():
+    """記憶體中的 DuckDB 儲存後端"""
+    from models.duckdb_store import DuckDBHoldingsStore
+    store = DuckDBHoldingsStore(":memory:")
+    yield store
+    store.close()
+
+@pytest.fixture
+def manager(store):
+    """使用 DuckDB 後端、停用快取的 ETFDataManager"""
+    from models.etf_data import ETFDataManager
+    return ETFDataManager(store=store, cache_size=0)
+
+@pytest.fixture
+def mongodb():
+    """以 mongomock 建立的 MongoDBManager (mongomock 不支援 $merge，v4/v8 回填會記錄失敗)"""
+    mongomock = pytest.importorskip("mongomock")
+    from config.mongodb import MongoDBManager
+    return MongoDBManager(client=mongomock.MongoClient())
+
+@pytest.fixture(params=["duckdb", "mongodb"])
+def any_store(request):
+    """依參數建立兩種儲存後端"""
+    if request.param == "duckdb":
+        return request.getfixturevalue("store")
+    from models.mongo_store import MongoHoldingsStore
+    return MongoHoldingsStore(request.getfixturevalue("mongodb"))
+
+@pytest.fixture(params=["duckdb", "mongodb"])
+def any_manager(request):
+    """依參數建立使用兩種儲存後端、停用快取的 ETFDataManager"""
+    if request.param == "duckdb":
+        return request.getfixturevalue("manager")
+    from models.etf_data import ETFDataManager
+    from models.mongo_store import MongoHoldingsStore
+    return ETFDataManager(store=MongoHoldingsStore(request.getfixturevalue("mongodb")), cache_size=0)
+
+@pytest.fixture
+def make_holdings():
+    """以 (股票代號, 權重, 股數) 建立持股清單"""
+    def build(*rows):
+        return [
+            {"stock_code": code, "stock_name": f"股票{code}", "weight": weight, "shares": shares, "market_value": 0.0}
+            for code, weight, shares in rows
+        ]
+    return build
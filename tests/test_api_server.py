@@ -0,0 +1,90 @@
+"""HTTP 查詢服務 (以嵌入式 DuckDB 後端執行)"""
+
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from api_server import HoldingsAPI
+
+@pytest.fixture
+def api(manager, make_holdings):
+    manager.save_holdings("0050", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)), "2025-09-01")
+    manager.save_holdings("0050", make_holdings(("2330", 70.0, 1100), ("2317", 30.0, 450)), "2025-09-02")
+    manager.save_holdings("0056", make_holdings(("2330", 100.0, 300)), "2025-09-02")
+    return HoldingsAPI(manager, workers=2, cache_size=32, cache_ttl=60)
+
+def call(api, scenario):
+    """啟動測試伺服器並執行 scenario(client)"""
+    async def run():
+        async with TestClient(TestServer(api.build_app())) as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+def test_latest_holdings_and_etag(api):
+    async def scenario(client):
+        response = await client.get("/etfs/0050/holdings/latest?limit=1")
+        assert response.status == 200
+        body = await response.json()
+        assert body["date"] == "2025-09-02"
+        assert [h["stock_code"] for h in body["holdings"]] == ["2330"]
+        
+        again = await client.get("/etfs/0050/holdings/latest?limit=1",
+                                 headers={"If-None-Match": response.headers["ETag"]})
+        assert again.status == 304
+    call(api, scenario)
+
+def test_unknown_ticker_is_404(api):
+    async def scenario(client):
+        response = await client.get("/etfs/9999/holdings/latest")
+        assert response.status == 404
+    call(api, scenario)
+
+def test_date_without_snapshot_is_404_and_not_cached(api, make_holdings):
+    async def scenario(client):
+        response = await client.get("/etfs/0050/holdings?date=2025-09-03")
+        assert response.status == 404
+        assert "ETag" not in response.headers
+        
+        assert api.etf_manager.save_holdings("0050", make_holdings(("2330", 70.0, 1200), ("2317", 30.0, 450)),
+                                             "2025-09-03")
+        
+        response = await client.get("/etfs/0050/holdings?date=2025-09-03")
+        assert response.status == 200
+        assert [h["shares"] for h in (await response.json())["holdings"]] == [1200, 450]
+    call(api, scenario)
+
+def test_forced_rewrite_changes_the_etag(api, make_holdings):
+    async def scenario(client):
+        response = await client.get("/etfs/0050/holdings?date=2025-09-02")
+        etag = response.headers["ETag"]
+        
+        assert api.etf_manager.save_holdings("0050", make_holdings(("2330", 80.0, 1300), ("2317", 20.0, 400)),
+                                             "2025-09-02", force_update=True)
+        
+        response = await client.get("/etfs/0050/holdings?date=2025-09-02", headers={"If-None-Match": etag})
+        assert response.status == 200
+        assert response.headers["ETag"] != etag
+        assert [h["shares"] for h in (await response.json())["holdings"]] == [1300, 400]
+    call(api, scenario)
+
+def test_holders_and_history(api):
+    async def scenario(client):
+        holders = await (await client.get("/stocks/2330/holders?date=2025-09-02")).json()
+        assert sorted(holder["etf_ticker"] for holder in holders["holders"]) == ["0050", "0056"]
+        
+        missing = await client.get("/stocks/2330/holders?date=2025-08-29")
+        assert missing.status == 404
+        
+        history = await (await client.get("/etfs/0050/history")).json()
+        assert [row["date"] for row in history["stats"]] == ["2025-09-02", "2025-09-01"]
+    call(api, scenario)
+
+def test_large_responses_are_gzip_encoded(api, make_holdings):
+    rows = [(str(1000 + i), 1.0, 100) for i in range(100)]
+    api.etf_manager.save_holdings("006208", make_holdings(*rows), "2025-09-02")
+    
+    async def scenario(client):
+        response = await client.get("/etfs/006208/holdings/latest", headers={"Accept-Encoding": "gzip"})
+        assert response.status == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert len((await response.json())["holdings"]) == 100
+    call(api, scenario)
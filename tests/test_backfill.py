@@ -0,0 +1,66 @@
+"""歷史持股回填：交易日、略過已存在快照、寫入前檢查與回應日期"""
+
+import argparse
+import pytest
+import backfill
+
+def test_trading_days_skip_weekends():
+    assert backfill.trading_days("2025-01-03", "2025-01-07") == ["2025-01-03", "2025-01-06", "2025-01-07"]
+    assert backfill.trading_days("2025-01-04", "2025-01-05") == []
+
+def test_plan_skips_existing_snapshots(manager, make_holdings):
+    manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-02", "holdings": make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))}
+    ])
+    dates = ["2025-01-02", "2025-01-03"]
+    
+    assert backfill.plan_pairs(manager, ["0050", "0056"], dates, force=False) == [
+        ("0050", "2025-01-03"), ("0056", "2025-01-02"), ("0056", "2025-01-03")
+    ]
+    assert len(backfill.plan_pairs(manager, ["0050"], dates, force=True)) == 2
+
+def test_deferred_flush_still_quarantines(manager, make_holdings):
+    rows = [("2330", 30.0, 1000), ("2317", 30.0, 500), ("2454", 20.0, 300), ("2412", 20.0, 200)]
+    manager.write_holdings_snapshots([{"etf_ticker": "0050", "date": "2025-01-02", "holdings": make_holdings(*rows)}])
+    
+    # 成分股驟減的快照在回填時同樣被隔離，不寫入也不列入重建範圍
+    pending = [
+        {"etf_ticker": "0050", "date": "2025-01-03", "holdings": make_holdings(*rows)},
+        {"etf_ticker": "0050", "date": "2025-01-06", "holdings": make_holdings(("2330", 100.0, 1000))},
+    ]
+    stats = backfill.BackfillStats(len(pending))
+    loaded = {}
+    backfill.flush(manager, pending, stats, loaded)
+    
+    assert (stats.written, stats.failed) == (1, 1)
+    assert loaded == {"0050": ["2025-01-03"]}
+    assert manager.get_holdings_count("0050", "2025-01-06") == 0
+    assert [(item['etf_ticker'], item['date']) for item in manager.get_quarantined("0050")] == [("0050", "2025-01-06")]
+
+def test_response_for_another_date_is_not_stored(manager, make_holdings, monkeypatch):
+    holdings = make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))
+    
+    def fetch(etf_ticker, date):
+        # 2025-01-03 當作假日，API 改回傳最新一日的持股
+        return ("2025-01-06" if date == "2025-01-03" else date), list(holdings)
+    
+    monkeypatch.setattr(backfill, "fetch_holdings", fetch)
+    monkeypatch.setattr("models.etf_data.ETFDataManager", lambda backend=None: manager)
+    monkeypatch.setattr(manager, "close", lambda: None)
+    
+    args = argparse.Namespace(start="2025-01-02", end="2025-01-06", etfs=["0050"], concurrency=2,
+                              batch_size=10, force=False, defer_indexes=False, backend=None)
+    assert backfill.backfill(args) == 0
+    assert manager.get_holdings_dates("2025-01-01", "2025-01-31", "0050") == ["2025-01-02", "2025-01-06"]
+
+@pytest.mark.parametrize("data, expected", [
+    ({"Date": "2025/01/06", "Data": []}, "2025-01-06"),
+    ({"Data": [{"DataDate": "20250106", "StockCode": "2330"}]}, "2025-01-06"),
+    ({"TradeDate": "2025-01-06T00:00:00"}, "2025-01-06"),
+    ({"Data": [{"StockCode": "2330"}]}, None),
+])
+def test_response_date(data, expected):
+    pytest.importorskip("bs4")
+    pytest.importorskip("fake_useragent")
+    from scrapers.yuanta_scraper import YuantaScraper
+    assert YuantaScraper()._response_date(data) == expected
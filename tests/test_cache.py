@@ -0,0 +1,55 @@
+"""讀取快取與 ETFDataManager 的快取失效"""
+
+from models.etf_data import ETFDataManager
+from utils.cache import TTLCache
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(max_size=4, ttl=10)
+    cache.set("a", 1)
+    now[0] += 11
+    
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = TTLCache(max_size=4, ttl=60)
+    
+    def loader():
+        # 載入期間其他執行緒寫入並使快取失效
+        cache.invalidate("a")
+        return "stale"
+    
+    assert cache.get_or_load("a", loader) == "stale"
+    assert cache.get("a") is None
+
+def test_zero_size_disables_cache():
+    cache = TTLCache(max_size=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+def test_manager_invalidates_latest_date_on_write(store, make_holdings):
+    manager = ETFDataManager(store=store, cache_size=16, cache_ttl=60)
+    holdings = make_holdings(("2330", 100.0, 1000))
+    
+    manager.save_holdings("0050", holdings, "2025-09-01")
+    assert len(manager.get_holdings("0050")) == 1
+    assert manager.get_latest_date("0050") == "2025-09-01"
+    assert manager.get_latest_date("0050") == "2025-09-01"
+    assert manager.cache_stats()["hits"] >= 1
+    
+    manager.save_holdings("0050", holdings, "2025-09-02")
+    assert manager.get_latest_date("0050") == "2025-09-02"
+    assert sorted(h["date"] for h in manager.get_holdings("0050")) == ["2025-09-01", "2025-09-02"]
@@ -0,0 +1,63 @@
+"""心跳在暫時失敗時重試，租約確實過期才視為失去租約"""
+
+import threading
+import time
+from utils.heartbeat import Heartbeat
+
+class FlakyRenew:
+    """依序回傳預先設定的結果，用完後一律成功"""
+    
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.done = threading.Event()
+    
+    def __call__(self):
+        self.calls += 1
+        if not self.outcomes:
+            self.done.set()
+            return True
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def test_transient_failures_within_the_lease_are_retried():
+    renew = FlakyRenew(False, ConnectionError("連線中斷"), False)
+    with Heartbeat(renew, 0.01, lease_seconds=5) as heartbeat:
+        assert renew.done.wait(5)
+    
+    assert renew.calls >= 4
+    assert not heartbeat.lost.is_set()
+
+def test_lease_is_lost_once_the_deadline_passes():
+    renew = FlakyRenew(*[False] * 1000)
+    started = time.monotonic()
+    with Heartbeat(renew, 0.01, lease_seconds=0.2) as heartbeat:
+        assert heartbeat.lost.wait(5)
+    
+    assert time.monotonic() - started >= 0.2
+    assert renew.calls > 1
+
+def test_successful_renew_moves_the_deadline():
+    # 每次失敗之間穿插成功，累計失敗時間超過租約也不會失去租約
+    renew = FlakyRenew(*[False, False, True] * 10)
+    with Heartbeat(renew, 0.02, lease_seconds=0.5) as heartbeat:
+        assert renew.done.wait(5)
+    
+    assert not heartbeat.lost.is_set()
+
+def test_stop_can_be_called_from_the_renew_thread():
+    heartbeat = Heartbeat(lambda: True, 0.01)
+    stopped = threading.Event()
+    
+    def renew():
+        heartbeat.stop()
+        stopped.set()
+        return True
+    
+    heartbeat.renew = renew
+    heartbeat.start()
+    assert stopped.wait(5)
+    heartbeat.stop()
+    assert not heartbeat.lost.is_set()
@@ -0,0 +1,67 @@
+"""持股標準格式與寫入時的格式錯誤處理"""
+
+import pytest
+from models.base_store import WRITE_FAILED, WRITE_WRITTEN
+from models.holdings_schema import normalize_holding
+
+def test_normalize_parses_formatted_numbers_and_legacy_quantity():
+    holding = normalize_holding({"stock_code": " 2330 ", "stock_name": "台積電", "weight": "58.75%",
+                                 "quantity": "1,234", "market_value": ""})
+    assert holding == {"stock_code": "2330", "stock_name": "台積電", "weight": 58.75,
+                       "shares": 1234, "market_value": 0.0}
+
+def test_normalize_treats_dash_as_zero():
+    assert normalize_holding({"stock_code": "2330", "weight": "-", "shares": "-"})["weight"] == 0.0
+
+def test_normalize_rejects_unparsable_number():
+    with pytest.raises(ValueError):
+        normalize_holding({"stock_code": "2330", "weight": "N/A"})
+
+def test_unparsable_snapshot_fails_without_raising(manager, make_holdings):
+    bad = make_holdings(("2330", 50.0, 1000))
+    bad[0]["weight"] = "N/A"
+    
+    assert manager.save_holdings("0051", bad, "2025-09-01") is False
+    assert manager.get_holdings_count("0051") == 0
+
+def test_unparsable_snapshot_does_not_fail_the_batch(manager, make_holdings):
+    bad = make_holdings(("2330", 50.0, 1000))
+    bad[0]["shares"] = "--"
+    good = make_holdings(("2330", 100.0, 1000))
+    
+    results = manager.write_holdings_snapshots([
+        {"etf_ticker": "0051", "date": "2025-09-01", "holdings": bad},
+        {"etf_ticker": "0050", "date": "2025-09-01", "holdings": good},
+    ])
+    
+    assert results == {("0051", "2025-09-01"): WRITE_FAILED, ("0050", "2025-09-01"): WRITE_WRITTEN}
+
+def test_write_behind_records_each_snapshot_result(manager, make_holdings):
+    from models.holdings_writer import HoldingsWriteQueue
+    
+    bad = make_holdings(("2330", 50.0, 1000))
+    bad[0]["weight"] = "N/A"
+    writer = HoldingsWriteQueue(manager)
+    try:
+        writer.submit("0051", bad, "2025-09-01")
+        writer.submit("0050", make_holdings(("2330", 100.0, 1000)), "2025-09-01")
+        writer.flush()
+        
+        assert writer.get_result("0051", "2025-09-01") == WRITE_FAILED
+        assert writer.get_result("0050", "2025-09-01") == WRITE_WRITTEN
+    finally:
+        writer.close()
+
+def test_canonical_migration_skips_unparsable_documents(mongodb):
+    from config.migrations import _v2_canonical_holdings
+    mongodb.holdings.insert_many([
+        {"etf_ticker": "0050", "date": "2025-09-01", "stock_code": "2330", "weight": "N/A", "quantity": "1,000"},
+        {"etf_ticker": "0050", "date": "2025-09-01", "stock_code": "2317", "weight": "-", "quantity": "500"},
+    ])
+    
+    _v2_canonical_holdings(mongodb)
+    
+    docs = {doc["stock_code"]: doc for doc in mongodb.holdings.find()}
+    assert docs["2330"]["weight"] == "N/A" and "quantity" in docs["2330"]
+    assert (docs["2317"]["weight"], docs["2317"]["shares"]) == (0.0, 500)
+    assert "quantity" not in docs["2317"]
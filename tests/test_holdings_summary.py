@@ -0,0 +1,46 @@
+"""每檔ETF持股摘要：寫入時維護並可重複寫入 (DuckDB 與 MongoDB)
+
+mongomock 不會對運算式產生的陣列計算 $sum/$min/$max，MongoDB 端只驗證摘要內各日期的筆數
+"""
+
+from models.etf_data import ETFDataManager
+from models.mongo_store import MongoHoldingsStore
+
+def write(manager, make_holdings):
+    holdings = make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))
+    manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-02", "holdings": holdings},
+        {"etf_ticker": "0050", "date": "2025-01-03", "holdings": holdings},
+        {"etf_ticker": "0056", "date": "2025-01-03", "holdings": make_holdings(("2882", 100.0, 800))},
+    ])
+    # 強制重寫同一日期不會重複計算
+    manager.save_holdings("0050", make_holdings(("2330", 55.0, 1000), ("2317", 45.0, 600)),
+                          "2025-01-03", force_update=True)
+
+def test_summary_counts_rows_and_dates(manager, make_holdings):
+    write(manager, make_holdings)
+    
+    summary = [{key: row[key] for key in ("etf_ticker", "rows", "dates", "first_date", "latest_date")}
+               for row in manager.get_holdings_summary()]
+    assert summary == [
+        {"etf_ticker": "0050", "rows": 4, "dates": 2, "first_date": "2025-01-02", "latest_date": "2025-01-03"},
+        {"etf_ticker": "0056", "rows": 1, "dates": 1, "first_date": "2025-01-03", "latest_date": "2025-01-03"},
+    ]
+    assert [row["etf_ticker"] for row in manager.get_holdings_summary("0056")] == ["0056"]
+
+def test_mongodb_summary_keeps_one_count_per_date(mongodb, make_holdings):
+    write(ETFDataManager(store=MongoHoldingsStore(mongodb), cache_size=0), make_holdings)
+    
+    days = {doc["etf_ticker"]: doc["days"] for doc in mongodb.holdings_summary.find()}
+    assert days == {"0050": {"2025-01-02": 2, "2025-01-03": 2}, "0056": {"2025-01-03": 1}}
+
+def test_status_cli_reads_the_summary(mongodb, monkeypatch, capsys):
+    import mongodb_manager
+    mongodb.holdings_summary.insert_many([
+        {"etf_ticker": "0056", "rows": 50, "dates": 1, "first_date": "2025-01-02", "latest_date": "2025-01-02"},
+        {"etf_ticker": "0050", "rows": 100, "dates": 2, "first_date": "2025-01-02", "latest_date": "2025-01-03"},
+    ])
+    monkeypatch.setattr(mongodb_manager, "get_mongodb_manager", lambda: mongodb)
+    
+    assert mongodb_manager.get_available_etfs() == ["0050", "0056"]
+    assert "0050 (100 筆數據, 最新: 2025-01-03)" in capsys.readouterr().out
@@ -0,0 +1,42 @@
+"""寫入前檢查與隔離區"""
+
+from models.base_store import WRITE_QUARANTINED, WRITE_WRITTEN
+from models.holdings_validator import validate_snapshot
+
+def _checks(issues):
+    return {issue["check"] for issue in issues}
+
+def test_clean_snapshot_passes(make_holdings):
+    holdings = make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))
+    assert validate_snapshot(holdings, holdings) == []
+
+def test_truncated_snapshot_is_flagged(make_holdings):
+    previous = make_holdings(*[(str(1101 + i), 10.0, 100) for i in range(10)])
+    truncated = make_holdings(*[(str(1101 + i), 10.0, 100) for i in range(5)])
+    assert _checks(validate_snapshot(truncated, previous)) == {"weight_sum", "constituent_count"}
+
+def test_duplicate_codes_and_share_outliers(make_holdings):
+    previous = make_holdings(("2330", 50.0, 1000), ("2317", 50.0, 500))
+    # 單位錯置：股數變成千倍
+    current = make_holdings(("2330", 25.0, 1000000), ("2330", 25.0, 1000000), ("2317", 50.0, 500000))
+    assert _checks(validate_snapshot(current, previous)) == {"duplicate_codes", "share_outliers"}
+
+def test_suspicious_snapshot_is_quarantined_then_released(manager, make_holdings):
+    manager.save_holdings("0050", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)), "2025-09-01")
+    bad = make_holdings(("2330", 60.0, 1000))
+    
+    results = manager.write_holdings_snapshots([{"etf_ticker": "0050", "date": "2025-09-02", "holdings": bad}])
+    assert results == {("0050", "2025-09-02"): WRITE_QUARANTINED}
+    assert manager.get_holdings_count("0050", "2025-09-02") == 0
+    assert [(item["etf_ticker"], item["date"]) for item in manager.get_quarantined()] == [("0050", "2025-09-02")]
+    
+    assert manager.release_quarantined("0050", "2025-09-02")
+    assert manager.get_holdings_count("0050", "2025-09-02") == 1
+    assert manager.get_quarantined() == []
+
+def test_warn_mode_writes_anyway(manager, make_holdings, monkeypatch):
+    monkeypatch.setenv("VALIDATION_MODE", "warn")
+    results = manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-09-01", "holdings": make_holdings(("2330", 30.0, 1000))}
+    ])
+    assert results == {("0050", "2025-09-01"): WRITE_WRITTEN}
@@ -0,0 +1,87 @@
+"""持股背景寫入佇列"""
+
+import threading
+import pytest
+from models.base_store import WRITE_FAILED, WRITE_QUARANTINED, WRITE_WRITTEN
+from models.holdings_writer import HoldingsWriteQueue
+
+@pytest.fixture
+def writer(manager):
+    writer = HoldingsWriteQueue(manager, max_pending=4, batch_rows=100)
+    yield writer
+    writer.close()
+
+def test_queued_snapshots_are_written_on_flush(writer, manager, make_holdings):
+    holdings = make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))
+    writer.submit("0050", holdings, "2025-01-02")
+    writer.submit("0056", holdings, "2025-01-02")
+    writer.flush()
+    
+    assert writer.get_result("0050", "2025-01-02") == WRITE_WRITTEN
+    assert writer.get_result("0056", "2025-01-02") == WRITE_WRITTEN
+    assert writer.get_result("0050", "2025-01-03") is None
+    assert manager.get_holdings_count(date="2025-01-02") == 4
+
+def test_snapshots_queued_during_a_write_share_one_batch(writer, manager, make_holdings, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    batches = []
+    save = manager.write_holdings_snapshots
+    
+    def save_batch(snapshots):
+        batches.append([snapshot['etf_ticker'] for snapshot in snapshots])
+        started.set()
+        release.wait(5)
+        return save(snapshots)
+    
+    monkeypatch.setattr(manager, "write_holdings_snapshots", save_batch)
+    holdings = make_holdings(("2330", 100.0, 1000))
+    writer.submit("0050", holdings, "2025-01-02")
+    assert started.wait(5)
+    writer.submit("0051", holdings, "2025-01-02")
+    writer.submit("0056", holdings, "2025-01-02")
+    release.set()
+    writer.flush()
+    
+    assert batches == [["0050"], ["0051", "0056"]]
+
+def test_failures_are_reported_per_snapshot(writer, manager, make_holdings, monkeypatch):
+    def fail(snapshots):
+        raise ConnectionError("連線中斷")
+    
+    monkeypatch.setattr(manager, "write_holdings_snapshots", fail)
+    done = []
+    writer.submit("0050", make_holdings(("2330", 100.0, 1000)), "2025-01-02", on_done=done.append)
+    writer.flush()
+    
+    assert writer.failed() == [("0050", "2025-01-02")]
+    assert done == [WRITE_FAILED]
+
+def test_on_done_reports_each_result(writer, make_holdings):
+    done = {}
+    holdings = make_holdings(("2330", 100.0, 1000))
+    writer.submit("0050", holdings, "2025-01-02", on_done=lambda ok: done.update(first=ok))
+    writer.submit("0050", [{"stock_code": "2330", "weight": "N/A"}], "2025-01-03",
+                  on_done=lambda ok: done.update(second=ok))
+    writer.flush()
+    
+    assert done == {"first": WRITE_WRITTEN, "second": WRITE_FAILED}
+
+def test_quarantined_snapshots_are_not_failures(writer, manager, make_holdings, monkeypatch):
+    monkeypatch.setattr(manager, "write_holdings_snapshots",
+                        lambda snapshots: {(s['etf_ticker'], s['date']): WRITE_QUARANTINED for s in snapshots})
+    done = []
+    writer.submit("0050", make_holdings(("2330", 100.0, 1000)), "2025-01-02", on_done=done.append)
+    writer.flush()
+    
+    assert done == [WRITE_QUARANTINED]
+    assert writer.failed() == []
+    assert writer.quarantined() == [("0050", "2025-01-02")]
+
+def test_close_drains_the_queue_and_rejects_new_snapshots(manager, make_holdings):
+    writer = HoldingsWriteQueue(manager)
+    writer.submit("0050", make_holdings(("2330", 100.0, 1000)), "2025-01-02")
+    writer.close()
+    
+    assert manager.get_holdings_count("0050", "2025-01-02") == 1
+    with pytest.raises(RuntimeError):
+        writer.submit("0050", [], "2025-01-03")
@@ -0,0 +1,85 @@
+"""MongoDB 連線池、壓縮與設定檔，以及全域管理器的共用"""
+
+import threading
+import pytest
+import config.mongodb as mongodb_config
+from config.mongodb import build_client_options, resolve_profile
+
+def test_client_options_from_env(monkeypatch):
+    monkeypatch.setenv("MONGODB_MAX_POOL_SIZE", "8")
+    monkeypatch.setenv("MONGODB_COMPRESSORS", "zstd,zlib")
+    monkeypatch.setenv("MONGODB_ZLIB_LEVEL", "3")
+    
+    options = build_client_options()
+    assert options["maxPoolSize"] == 8
+    assert options["compressors"] == "zstd,zlib"
+    assert options["zlibCompressionLevel"] == 3
+
+def test_compression_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("MONGODB_COMPRESSORS", raising=False)
+    assert "compressors" not in build_client_options()
+
+def test_profiles_and_overrides(monkeypatch):
+    monkeypatch.delenv("MONGODB_PROFILE", raising=False)
+    assert resolve_profile()["name"] == "ingest"
+    assert resolve_profile("analytics")["read_preference"] == "secondaryPreferred"
+    
+    monkeypatch.setenv("MONGODB_ANALYTICS_WRITE_CONCERN", "majority")
+    monkeypatch.setenv("MONGODB_ANALYTICS_JOURNAL", "true")
+    analytics = resolve_profile("analytics")
+    assert (analytics["write_concern"], analytics["journal"]) == ("majority", True)
+    
+    with pytest.raises(ValueError):
+        resolve_profile("reporting")
+    monkeypatch.setenv("MONGODB_INGEST_READ_PREFERENCE", "closest")
+    with pytest.raises(ValueError):
+        resolve_profile("ingest")
+
+def test_profile_write_concern_is_applied():
+    mongomock = pytest.importorskip("mongomock")
+    from config.mongodb import MongoDBManager
+    manager = MongoDBManager(client=mongomock.MongoClient(), profile="ingest")
+    write_concern = manager._build_write_concern()
+    assert (write_concern.document.get("w"), write_concern.document.get("j")) == (1, True)
+
+@pytest.fixture
+def shared_state(monkeypatch):
+    """以 mongomock 取代全域管理器使用的 MongoClient，並清空既有實例"""
+    mongomock = pytest.importorskip("mongomock")
+    clients = []
+    
+    def client(*args, **kwargs):
+        clients.append(mongomock.MongoClient())
+        return clients[-1]
+    
+    monkeypatch.setattr(mongodb_config, "MongoClient", client)
+    monkeypatch.setattr(mongodb_config, "_mongodb_managers", {})
+    monkeypatch.setattr(mongodb_config, "_mongodb_client", None)
+    return clients
+
+def test_managers_share_one_client_across_threads(shared_state):
+    managers = []
+    barrier = threading.Barrier(4)
+    
+    def get():
+        barrier.wait()
+        managers.append(mongodb_config.get_mongodb_manager())
+    
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    # 同時取得也只建立一個實例與一個連線池；不同設定檔共用同一個連線池
+    assert len({id(manager) for manager in managers}) == 1
+    analytics = mongodb_config.get_mongodb_manager("analytics")
+    assert analytics is not managers[0]
+    assert analytics.client is managers[0].client
+    assert len(shared_state) == 1
+
+def test_fork_reset_discards_inherited_managers(shared_state):
+    first = mongodb_config.get_mongodb_manager()
+    mongodb_config._reset_after_fork()
+    assert mongodb_config.get_mongodb_manager() is not first
+    assert len(shared_state) == 2
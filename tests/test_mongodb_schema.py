@@ -0,0 +1,39 @@
+"""資料庫結構遷移的執行方式"""
+
+import threading
+import pytest
+from config.mongodb import MongoDBManager
+
+def test_migrations_run_in_calling_thread_by_default(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.delenv("MONGODB_SCHEMA_BACKGROUND", raising=False)
+    
+    threads = []
+    monkeypatch.setattr(MongoDBManager, "migrate_schema",
+                        lambda self: threads.append(threading.current_thread()) or True)
+    MongoDBManager(client=mongomock.MongoClient())
+    
+    assert threads == [threading.current_thread()]
+
+def test_background_migrations_are_opt_in(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.setenv("MONGODB_SCHEMA_BACKGROUND", "true")
+    
+    done = threading.Event()
+    threads = []
+    
+    def record(self):
+        threads.append(threading.current_thread())
+        done.set()
+        return True
+    
+    monkeypatch.setattr(MongoDBManager, "migrate_schema", record)
+    MongoDBManager(client=mongomock.MongoClient())
+    
+    assert done.wait(5)
+    assert threads[0].name == "mongodb-schema-migration"
+
+def test_sync_migration_records_version_and_releases_lock(mongodb):
+    state = mongodb.schema_versions.find_one({"_id": mongodb.holdings.name})
+    assert state["version"] >= 1
+    assert "locked_until" not in state
@@ -0,0 +1,68 @@
+"""時間序列持股集合的欄位對應 (mongomock 不支援建立時間序列集合，以一般集合存放相同格式)"""
+
+from datetime import datetime
+import pytest
+from config.mongodb import MongoDBManager
+
+@pytest.fixture
+def ts_mongodb(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.setattr(MongoDBManager, "_init_timeseries_holdings", lambda self: None)
+    return MongoDBManager(client=mongomock.MongoClient(), holdings_timeseries=True)
+
+def test_fields_map_to_meta_and_time_fields(ts_mongodb, mongodb):
+    assert ts_mongodb.holdings.name == "holdings_ts"
+    assert ts_mongodb.holdings_field("etf_ticker") == "meta.etf_ticker"
+    assert ts_mongodb.holdings_field("date") == "ts"
+    assert ts_mongodb.holdings_field("weight") == "weight"
+    assert ts_mongodb.holdings_filter(etf_ticker="0050", start_date="2025-01-02", end_date="2025-01-03") == {
+        "meta.etf_ticker": "0050",
+        "ts": {"$gte": datetime(2025, 1, 2), "$lte": datetime(2025, 1, 3)},
+    }
+    
+    # 一般集合維持原本的扁平欄位
+    assert mongodb.holdings_filter(etf_ticker="0050", date="2025-01-02") == {"etf_ticker": "0050", "date": "2025-01-02"}
+
+def test_documents_round_trip(ts_mongodb):
+    holding = {"etf_ticker": "0050", "stock_code": "2330", "date": "2025-01-02", "weight": 60.0}
+    document = ts_mongodb.to_holdings_document(dict(holding))
+    assert document == {"meta": {"etf_ticker": "0050", "stock_code": "2330"}, "ts": datetime(2025, 1, 2), "weight": 60.0}
+    assert ts_mongodb.from_holdings_document(dict(document, _id=1)) == holding
+
+def test_store_reads_flat_holdings_from_timeseries_layout(ts_mongodb, make_holdings):
+    from models.mongo_store import MongoHoldingsStore
+    store = MongoHoldingsStore(ts_mongodb)
+    holdings = make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))
+    store.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-02", "holdings": holdings},
+        {"etf_ticker": "0050", "date": "2025-01-03", "holdings": holdings},
+    ])
+    
+    stored = ts_mongodb.holdings.find_one({"meta.stock_code": "2330", "ts": datetime(2025, 1, 2)})
+    assert stored["meta"]["etf_ticker"] == "0050"
+    
+    assert [(h["stock_code"], h["date"]) for h in store.iter_holdings("0050", "2025-01-02")] == [
+        ("2330", "2025-01-02"), ("2317", "2025-01-02")
+    ]
+    assert store.get_holdings_dates(etf_ticker="0050") == ["2025-01-02", "2025-01-03"]
+    assert store.get_latest_date() == "2025-01-03"
+    assert tuple(store.get_adjacent_dates("0050", "2025-01-03")) == ("2025-01-02", None)
+
+def test_keyset_paging_follows_the_timeseries_keys(ts_mongodb, make_holdings):
+    from models.mongo_store import MongoHoldingsStore
+    store = MongoHoldingsStore(ts_mongodb)
+    rows = [(f"{code}", 20.0, 100) for code in range(1105, 1100, -1)]
+    store.write_holdings_snapshots([
+        {"etf_ticker": etf, "date": date, "holdings": make_holdings(*rows)}
+        for etf in ("0056", "0050") for date in ("2025-01-03", "2025-01-02")
+    ])
+    
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.get_holdings_page(after=cursor, limit=3)
+        seen.extend((h["etf_ticker"], h["date"], h["stock_code"]) for h in page)
+        if cursor is None:
+            break
+    
+    assert seen == sorted(seen)
+    assert len(set(seen)) == 20
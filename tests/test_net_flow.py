@@ -0,0 +1,43 @@
+"""個股ETF合計淨買賣"""
+
+from analytics.net_flow import NetFlowEngine
+
+def test_net_flows_from_ingested_snapshots(manager, make_holdings, tmp_path):
+    manager.save_holdings("0050", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)), "2025-09-01")
+    manager.save_holdings("0056", make_holdings(("2330", 50.0, 300), ("2454", 50.0, 200)), "2025-09-01")
+    manager.save_holdings("0050", make_holdings(("2330", 60.0, 1200), ("2317", 40.0, 450)), "2025-09-02")
+    manager.save_holdings("0056", make_holdings(("2330", 50.0, 250), ("2454", 50.0, 200)), "2025-09-02")
+    
+    prices = tmp_path / "close.csv"
+    prices.write_text("date,stock_code,close\n2025-09-02,2330,1000\n")
+    
+    flows = NetFlowEngine(manager).compute("2025-09-02", price_file=str(prices))
+    by_stock = flows.set_index("stock_code")
+    
+    assert by_stock.loc["2330", "net_shares"] == 150
+    assert by_stock.loc["2330", "bought_shares"] == 200
+    assert by_stock.loc["2330", "sold_shares"] == 50
+    assert (by_stock.loc["2330", "buyers"], by_stock.loc["2330", "sellers"]) == (1, 1)
+    assert by_stock.loc["2330", "net_value"] == 150000
+    assert by_stock.loc["2317", "net_shares"] == -50
+    assert "2454" not in by_stock.index
+    
+    saved = {flow["stock_code"]: flow for flow in manager.get_stock_net_flows(start_date="2025-09-02")}
+    assert saved["2330"]["net_shares"] == 150
+    assert saved["2317"]["close"] is None
+    
+    top = NetFlowEngine(manager).top("2025-09-02")
+    assert [flow["stock_code"] for flow in top["buy"]] == ["2330"]
+    assert [flow["stock_code"] for flow in top["sell"]] == ["2317"]
+
+def test_dates_left_without_flows_are_cleared(manager, make_holdings):
+    holdings = make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))
+    manager.save_holdings("0050", holdings, "2025-09-01")
+    manager.save_holdings("0050", make_holdings(("2330", 60.0, 1200), ("2317", 40.0, 500)), "2025-09-02")
+    engine = NetFlowEngine(manager)
+    assert len(engine.compute("2025-09-01", "2025-09-02")) == 1
+    
+    # 重寫為與前一日相同的持股後重算，先前的結果不會留下
+    manager.save_holdings("0050", holdings, "2025-09-02", force_update=True)
+    assert engine.compute("2025-09-01", "2025-09-02").empty
+    assert manager.get_stock_net_flows(start_date="2025-09-01") == []
@@ -0,0 +1,82 @@
+"""ETF 持股重疊：稀疏矩陣計算與逐對計算一致"""
+
+import numpy as np
+import pytest
+from analytics.overlap import OverlapEngine, build_weight_matrix, common_count, cosine_similarity, min_overlap
+
+def random_holdings(seed=7, etfs=6, stocks=40):
+    rng = np.random.default_rng(seed)
+    holdings = []
+    for e in range(etfs):
+        for s in rng.choice(stocks, size=rng.integers(5, 20), replace=False):
+            holdings.append({"etf_ticker": f"00{50 + e}", "stock_code": str(2000 + s),
+                             "weight": float(rng.uniform(0.1, 10))})
+    return holdings
+
+def brute_force(holdings):
+    weights = {}
+    for holding in holdings:
+        etf = weights.setdefault(holding["etf_ticker"], {})
+        etf[holding["stock_code"]] = etf.get(holding["stock_code"], 0.0) + holding["weight"]
+    return weights
+
+def test_matrix_metrics_match_pairwise_definitions():
+    holdings = random_holdings()
+    built = build_weight_matrix(holdings)
+    weights = brute_force(holdings)
+    overlap, cosine, common = (metric(built["matrix"]) for metric in (min_overlap, cosine_similarity, common_count))
+    
+    for i, a in enumerate(built["etf_tickers"]):
+        for j, b in enumerate(built["etf_tickers"]):
+            shared = weights[a].keys() & weights[b].keys()
+            expected = sum(weights[a].values()) if i == j else sum(min(weights[a][s], weights[b][s]) for s in shared)
+            dot = sum(weights[a][s] * weights[b][s] for s in shared)
+            norm = np.sqrt(sum(w * w for w in weights[a].values()) * sum(w * w for w in weights[b].values()))
+            assert overlap[i, j] == pytest.approx(expected)
+            assert cosine[i, j] == pytest.approx(dot / norm)
+            assert common[i, j] == len(shared)
+
+def test_duplicate_rows_are_summed():
+    built = build_weight_matrix([
+        {"etf_ticker": "0050", "stock_code": "2330", "weight": 30.0},
+        {"etf_ticker": "0050", "stock_code": "2330", "weight": 20.0},
+    ])
+    assert built["matrix"].toarray().tolist() == [[50.0]]
+
+@pytest.fixture
+def engine(manager, make_holdings):
+    manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-02",
+         "holdings": make_holdings(("2330", 60.0, 1), ("2317", 30.0, 1), ("2454", 10.0, 1))},
+        {"etf_ticker": "0056", "date": "2025-01-02", "holdings": make_holdings(("2330", 20.0, 1), ("2882", 80.0, 1))},
+        {"etf_ticker": "006208", "date": "2025-01-02", "holdings": make_holdings(("2330", 55.0, 1), ("2317", 45.0, 1))},
+    ])
+    return OverlapEngine(manager, cache_size=4, cache_ttl=60)
+
+def test_top_pairs_and_subsets(engine):
+    top = engine.top_pairs("2025-01-02", limit=2)
+    assert [(pair["etf_a"], pair["etf_b"]) for pair in top] == [("0050", "006208"), ("0050", "0056")]
+    assert top[0]["overlap"] == pytest.approx(85.0)
+    assert top[0]["common_count"] == 2
+    
+    subset = engine.compute("2025-01-02", ["0056", "0050"])
+    assert subset["etf_tickers"] == ["0056", "0050"]
+    assert subset["overlap"][0, 1] == pytest.approx(20.0)
+    
+    frame = engine.to_frame("2025-01-02", "common_count")
+    assert frame.loc["0056", "006208"] == 1
+    with pytest.raises(ValueError):
+        engine.top_pairs("2025-01-02", metric="jaccard")
+
+def test_missing_dates_are_not_cached(engine, manager, make_holdings):
+    assert engine.compute("2025-01-03") is None
+    manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-03", "holdings": make_holdings(("2330", 60.0, 1), ("2317", 35.0, 1), ("2454", 5.0, 1))},
+    ])
+    assert engine.compute("2025-01-03")["etf_tickers"] == ["0050"]
+
+def test_rewrites_are_not_served_from_the_cache(engine, manager, make_holdings):
+    assert engine.compute("2025-01-02", ["0050", "0056"])["overlap"][0, 1] == pytest.approx(20.0)
+    manager.save_holdings("0056", make_holdings(("2330", 50.0, 1), ("2882", 50.0, 1)), "2025-01-02", force_update=True)
+    
+    assert engine.compute("2025-01-02", ["0050", "0056"])["overlap"][0, 1] == pytest.approx(50.0)
@@ -0,0 +1,60 @@
+"""持股 Parquet 封存：單日匯出、月份合併與讀取"""
+
+import pytest
+
+pytest.importorskip("pyarrow")
+from models.parquet_archive import HoldingsParquetArchive
+
+@pytest.fixture
+def archive(tmp_path):
+    return HoldingsParquetArchive(str(tmp_path / "archive"))
+
+def rows(table):
+    """依日期、ETF、股票排序的 (日期, ETF, 股票, 股數)"""
+    return sorted(zip(*(table[name].to_pylist() for name in ("date", "etf_ticker", "stock_code", "shares"))))
+
+def test_snapshot_rewrite_replaces_the_partition(archive, make_holdings):
+    archive.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)))
+    archive.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 100.0, 2000)))
+    
+    assert rows(archive.read()) == [("2025-01-02", "0050", "2330", 2000)]
+
+def test_compaction_keeps_rows_and_daily_wins(archive, make_holdings):
+    archive.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 100.0, 1000)))
+    archive.write_snapshot("0056", "2025-01-03", make_holdings(("2317", 100.0, 500)))
+    archive.write_snapshot("0050", "2025-02-03", make_holdings(("2330", 100.0, 1100)))
+    
+    assert archive.compact(before_date="2025-02-01") == 1
+    assert archive._daily_dates() == ["2025-02-03"]
+    assert rows(archive.read()) == [
+        ("2025-01-02", "0050", "2330", 1000),
+        ("2025-01-03", "0056", "2317", 500),
+        ("2025-02-03", "0050", "2330", 1100),
+    ]
+    
+    # 合併後補寫舊日期：讀取時以 daily 為準，再次合併時取代月檔中的舊資料
+    archive.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 100.0, 1200)))
+    assert rows(archive.read(etf_tickers=["0050"], end_date="2025-01-31")) == [("2025-01-02", "0050", "2330", 1200)]
+    archive.compact(before_date="2025-02-01")
+    assert rows(archive.read(end_date="2025-01-31")) == [
+        ("2025-01-02", "0050", "2330", 1200),
+        ("2025-01-03", "0056", "2317", 500),
+    ]
+
+def test_read_filters_by_stock_and_columns(archive, make_holdings):
+    archive.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)))
+    table = archive.read(stock_codes=["2317"], columns=["date", "etf_ticker", "stock_code", "shares"])
+    
+    assert table.column_names == ["date", "etf_ticker", "stock_code", "shares"]
+    assert rows(table) == [("2025-01-02", "0050", "2317", 500)]
+
+def test_manager_exports_written_snapshots(monkeypatch, tmp_path, store, make_holdings):
+    from models.etf_data import ETFDataManager
+    monkeypatch.setenv("PARQUET_ARCHIVE_ENABLED", "true")
+    monkeypatch.setenv("PARQUET_ARCHIVE_DIR", str(tmp_path / "archive"))
+    manager = ETFDataManager(store=store, cache_size=0)
+    manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-02", "holdings": make_holdings(("2330", 100.0, 1000))}
+    ])
+    
+    assert rows(manager.archive.read()) == [("2025-01-02", "0050", "2330", 1000)]
@@ -0,0 +1,60 @@
+"""寫入時維護的ETF每日統計"""
+
+import pytest
+from analytics.portfolio_stats import PortfolioStatsEngine, snapshot_stats
+
+def test_snapshot_stats(make_holdings):
+    stats = snapshot_stats(make_holdings(("2330", 60.0, 1), ("2317", 30.0, 1), ("2454", 10.0, 1)))
+    assert stats["constituent_count"] == 3
+    assert stats["weight_sum_ok"] is True
+    assert stats["max_weight"] == 60.0
+    assert stats["hhi"] == pytest.approx(0.36 + 0.09 + 0.01)
+
+def _ingest_two_days(manager, make_holdings):
+    manager.save_holdings("0050", make_holdings(("2330", 50.0, 1000), ("2317", 30.0, 500), ("2454", 20.0, 300)),
+                          "2025-09-01")
+    manager.save_holdings("0050", make_holdings(("2330", 60.0, 1200), ("2317", 20.0, 400), ("2303", 20.0, 800)),
+                          "2025-09-02")
+
+def test_ingest_stores_stats_for_every_day(manager, make_holdings):
+    _ingest_two_days(manager, make_holdings)
+    
+    stats = {row["date"]: row for row in manager.get_etf_daily_stats("0050")}
+    assert sorted(stats) == ["2025-09-01", "2025-09-02"]
+    
+    day = stats["2025-09-02"]
+    assert day["previous_date"] == "2025-09-01"
+    assert (day["adds"], day["drops"], day["count_change"]) == (1, 1, 0)
+    # |+10| + |-10| + |+20| + |-20| 的一半
+    assert day["turnover"] == pytest.approx(30.0)
+    assert day["hhi_change"] == pytest.approx(stats["2025-09-02"]["hhi"] - stats["2025-09-01"]["hhi"])
+
+def test_stats_are_saved_when_the_diff_fails(manager, make_holdings, monkeypatch):
+    def broken(previous, current):
+        raise RuntimeError("diff failed")
+    monkeypatch.setattr("analytics.rebalance.diff_holdings", broken)
+    
+    _ingest_two_days(manager, make_holdings)
+    
+    stats = {row["date"]: row for row in manager.get_etf_daily_stats("0050")}
+    assert stats["2025-09-02"]["constituent_count"] == 3
+    assert stats["2025-09-02"]["turnover"] is None
+    assert stats["2025-09-02"]["hhi_change"] is not None
+
+def test_rebuild_matches_ingest(manager, make_holdings):
+    _ingest_two_days(manager, make_holdings)
+    ingested = {row["date"]: row["turnover"] for row in manager.get_etf_daily_stats("0050")}
+    
+    assert PortfolioStatsEngine(manager).rebuild("0050") == 2
+    rebuilt = {row["date"]: row["turnover"] for row in manager.get_etf_daily_stats("0050")}
+    assert rebuilt == ingested
+
+def test_main_rebuilds_every_etf_with_holdings(manager, make_holdings, monkeypatch, capsys):
+    import analytics.portfolio_stats as portfolio_stats
+    _ingest_two_days(manager, make_holdings)
+    monkeypatch.setattr(portfolio_stats, "ETFDataManager", lambda: manager)
+    monkeypatch.setattr(portfolio_stats.sys, "argv", ["portfolio_stats"])
+    
+    portfolio_stats.main()
+    
+    assert "0050: 2 日" in capsys.readouterr().out
@@ -0,0 +1,70 @@
+"""持股查詢命令列：各子命令與輸出格式"""
+
+import csv
+import io
+import json
+import pytest
+import query
+
+@pytest.fixture
+def loaded(manager, make_holdings):
+    manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-02",
+         "holdings": make_holdings(("2330", 60.0, 1000), ("2317", 30.0, 500), ("2454", 10.0, 100))},
+        {"etf_ticker": "0056", "date": "2025-01-02", "holdings": make_holdings(("2330", 100.0, 300))},
+    ])
+    manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-03",
+         "holdings": make_holdings(("2330", 65.0, 1100), ("2317", 30.0, 500), ("2882", 5.0, 50))},
+    ])
+    return manager
+
+def run(manager, *argv):
+    args = query.build_parser().parse_args(list(argv))
+    handler, _ = query.COMMANDS[args.command]
+    return handler(manager, args)
+
+def test_latest_and_top_read_the_newest_snapshot(loaded):
+    assert {row["date"] for row in run(loaded, "latest", "0050")} == {"2025-01-03"}
+    assert [row["stock_code"] for row in run(loaded, "top", "0050", "-n", "2", "--date", "2025-01-02")] == ["2330", "2317"]
+
+def test_history_and_holders(loaded):
+    assert [row["date"] for row in run(loaded, "history", "0050")] == ["2025-01-03", "2025-01-02"]
+    trajectory = run(loaded, "history", "0050", "--stock", "2330")
+    assert sorted((row["date"], row["shares"]) for row in trajectory) == [("2025-01-02", 1000), ("2025-01-03", 1100)]
+    
+    assert [row["etf_ticker"] for row in run(loaded, "holders", "2330")] == ["0050"]
+    assert {row["etf_ticker"] for row in run(loaded, "holders", "2330", "--date", "2025-01-02")} == {"0050", "0056"}
+
+def test_diff_uses_stored_changes_or_compares_dates(loaded):
+    stored = {row["stock_code"]: row["change_type"] for row in run(loaded, "diff", "0050")}
+    compared = {row["stock_code"]: row["change_type"] for row in run(loaded, "diff", "0050", "--from", "2025-01-02")}
+    
+    assert stored == compared
+    assert {code: stored[code] for code in ("2330", "2454", "2882")} == {"2330": "increase", "2454": "drop", "2882": "add"}
+
+def test_output_formats():
+    rows = [{"stock_code": "2330", "stock_name": "台積電", "shares": 1000}]
+    columns = ["stock_code", "stock_name", "shares"]
+    
+    table = io.StringIO()
+    query.write_rows(rows, columns, "table", table)
+    header, _, line = table.getvalue().splitlines()
+    # 全形字佔兩格，下一欄仍與標題對齊
+    assert query._display_width(line[:line.index("1,000")]) == header.index("shares")
+    
+    out = io.StringIO()
+    query.write_rows(rows, columns, "csv", out)
+    assert list(csv.DictReader(io.StringIO(out.getvalue()))) == [{"stock_code": "2330", "stock_name": "台積電", "shares": "1000"}]
+    
+    out = io.StringIO()
+    query.write_rows(rows, columns, "json", out)
+    assert json.loads(out.getvalue()) == rows
+
+def test_main_reports_empty_results(loaded, monkeypatch, capsys):
+    monkeypatch.setattr(query, "ETFDataManager", lambda backend=None: loaded)
+    
+    assert query.main(["--format", "json", "top", "0050", "-n", "1"]) == 0
+    assert [row["stock_code"] for row in json.loads(capsys.readouterr().out)] == ["2330"]
+    assert query.main(["latest", "9999"]) == 1
+    assert "查無資料" in capsys.readouterr().err
@@ -0,0 +1,51 @@
+"""調倉比對與寫入時產生的持股變動"""
+
+from analytics.rebalance import RebalanceEngine, diff_holdings
+
+def _changes(manager, **filters):
+    """以 stock_code 為鍵整理持股變動"""
+    return {change["stock_code"]: change for change in manager.get_holdings_changes(**filters)}
+
+def test_diff_holdings_classifies_changes(make_holdings):
+    previous = [dict(h, etf_ticker="0050") for h in make_holdings(("2330", 50.0, 1000), ("2317", 30.0, 500),
+                                                                   ("2454", 20.0, 300), ("2412", 0.0, 10))]
+    current = [dict(h, etf_ticker="0050") for h in make_holdings(("2330", 55.0, 1200), ("2317", 25.0, 400),
+                                                                  ("2303", 20.0, 800), ("2412", 0.0, 10))]
+    
+    changes = {change["stock_code"]: change["change_type"] for change in diff_holdings(previous, current)}
+    assert changes == {"2330": "increase", "2317": "decrease", "2303": "add", "2454": "drop"}
+
+def test_ingesting_consecutive_days_persists_changes(manager, make_holdings):
+    manager.save_holdings("0050", make_holdings(("2330", 50.0, 1000), ("2317", 30.0, 500), ("2454", 20.0, 300)),
+                          "2025-09-01")
+    manager.save_holdings("0050", make_holdings(("2330", 55.0, 1200), ("2317", 25.0, 400), ("2303", 20.0, 800)),
+                          "2025-09-02")
+    
+    changes = _changes(manager, etf_ticker="0050")
+    assert {code: change["change_type"] for code, change in changes.items()} == {
+        "2330": "increase", "2317": "decrease", "2303": "add", "2454": "drop"
+    }
+    assert changes["2330"]["shares_delta"] == 200
+    assert changes["2317"]["shares_delta"] == -100
+    assert changes["2303"]["shares_before"] == 0
+    assert changes["2454"]["shares_after"] == 0
+    assert {change["date"] for change in changes.values()} == {"2025-09-02"}
+    assert {change["previous_date"] for change in changes.values()} == {"2025-09-01"}
+
+def test_backfilling_an_older_day_rewrites_the_following_diff(manager, make_holdings):
+    manager.save_holdings("0050", make_holdings(("2330", 100.0, 1000)), "2025-09-01")
+    manager.save_holdings("0050", make_holdings(("2330", 100.0, 1500)), "2025-09-03")
+    manager.save_holdings("0050", make_holdings(("2330", 100.0, 1200)), "2025-09-02")
+    
+    following = _changes(manager, etf_ticker="0050", start_date="2025-09-03", end_date="2025-09-03")
+    assert following["2330"]["previous_date"] == "2025-09-02"
+    assert following["2330"]["shares_delta"] == 300
+
+def test_rebuild_matches_ingest(manager, make_holdings):
+    manager.save_holdings("0050", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)), "2025-09-01")
+    manager.save_holdings("0050", make_holdings(("2330", 60.0, 900), ("2303", 40.0, 700)), "2025-09-02")
+    ingested = _changes(manager, etf_ticker="0050")
+    
+    assert RebalanceEngine(manager).rebuild("0050") == 1
+    rebuilt = _changes(manager, etf_ticker="0050")
+    assert {code: c["change_type"] for code, c in rebuilt.items()} == {code: c["change_type"] for code, c in ingested.items()}
@@ -0,0 +1,130 @@
+"""跨行程執行鎖與排程觸發合併"""
+
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from utils.run_lock import FileRunLock, MongoRunLock, create_run_lock, run_lock
+
+def test_file_lock_excludes_other_holders(tmp_path):
+    first = FileRunLock("yuanta_holdings", str(tmp_path))
+    second = FileRunLock("yuanta_holdings", str(tmp_path))
+    
+    assert first.acquire()
+    assert first.acquire()
+    assert not second.acquire()
+    
+    first.release()
+    assert second.acquire()
+    second.release()
+
+def test_run_lock_context_releases_on_exit(tmp_path, monkeypatch):
+    monkeypatch.setenv("RUN_LOCK_DIR", str(tmp_path))
+    with run_lock("yuanta_holdings") as acquired:
+        assert acquired
+        with run_lock("yuanta_holdings") as nested:
+            assert not nested
+    
+    with run_lock("yuanta_holdings") as acquired:
+        assert acquired
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_run_lock("yuanta_holdings", "redis")
+
+class RecordingLocks:
+    """記錄送往 run_locks 集合的操作 (mongomock 無法在查詢中計算 $$NOW)，held 為其他持有者的租約"""
+    
+    def __init__(self, held=False):
+        self.held = held
+        self.calls = []
+        self.renewed = threading.Event()
+    
+    def find_one_and_update(self, filter, update, upsert=False):
+        from pymongo.errors import DuplicateKeyError
+        self.calls.append(("acquire", filter, update))
+        if self.held:
+            raise DuplicateKeyError("租約由其他行程持有")
+    
+    def update_one(self, filter, update):
+        self.calls.append(("renew", filter, update))
+        self.renewed.set()
+        return SimpleNamespace(matched_count=1)
+    
+    def delete_one(self, filter):
+        self.calls.append(("release", filter, None))
+
+def test_mongo_lease_uses_server_time_and_is_renewed_while_held():
+    locks = RecordingLocks()
+    lock = MongoRunLock("yuanta_holdings", ttl=4, mongodb=SimpleNamespace(run_locks=locks))
+    
+    assert lock.acquire()
+    assert lock.acquire()
+    assert locks.renewed.wait(5)
+    lock.release()
+    
+    kinds = [kind for kind, _, _ in locks.calls]
+    assert kinds[:2] == ["acquire", "acquire"] and kinds[-1] == "release"
+    assert set(kinds[2:-1]) == {"renew"}
+    # 到期時間一律由資料庫伺服器時間計算，不送出本機時間
+    _, filter, update = locks.calls[0]
+    assert "$$NOW" in repr(filter) and "$$NOW" in repr(update)
+    assert not any(isinstance(value, datetime) for value in update[0]["$set"].values())
+    assert lock.heartbeat is None
+
+def test_mongo_lease_held_by_another_owner_is_not_acquired():
+    lock = MongoRunLock("yuanta_holdings", ttl=4, mongodb=SimpleNamespace(run_locks=RecordingLocks(held=True)))
+    
+    assert not lock.acquire()
+    assert lock.heartbeat is None
+
+class FakeRunner:
+    """記錄執行次數的 runner，結束時釋放交給它的鎖"""
+    
+    def __init__(self, result=True):
+        self.result = result
+        self.calls = 0
+    
+    def run(self, lock=None):
+        self.calls += 1
+        if lock is not None:
+            lock.release()
+        return self.result
+
+@pytest.fixture
+def scheduler(monkeypatch, tmp_path):
+    pytest.importorskip("apscheduler")
+    from advanced_scheduler import AdvancedETFScraperScheduler
+    monkeypatch.setenv("RUN_LOCK_DIR", str(tmp_path))
+    scheduler = AdvancedETFScraperScheduler()
+    scheduler.runner = FakeRunner()
+    return scheduler
+
+def test_triggers_after_a_successful_run_are_coalesced(scheduler):
+    scheduler.run_scraper()
+    scheduler.run_scraper()
+    assert scheduler.runner.calls == 1
+    
+    # 超過合併時間窗後再次執行
+    work = next(iter(scheduler._completed))
+    scheduler._completed[work] -= timedelta(seconds=scheduler.coalesce_window + 1)
+    scheduler.run_scraper()
+    assert scheduler.runner.calls == 2
+
+def test_failed_runs_are_retried(scheduler):
+    scheduler.runner.result = False
+    scheduler.run_scraper()
+    scheduler.run_scraper()
+    assert scheduler.runner.calls == 2
+    assert not scheduler._completed
+
+def test_trigger_is_skipped_while_another_process_holds_the_lock(scheduler, tmp_path):
+    holder = FileRunLock("yuanta_holdings", str(tmp_path))
+    assert holder.acquire()
+    try:
+        scheduler.run_scraper()
+    finally:
+        holder.release()
+    
+    assert scheduler.runner.calls == 0
+    assert not scheduler._active
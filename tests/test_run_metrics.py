@@ -0,0 +1,44 @@
+"""爬蟲執行指標：記錄、批次寫入與每日彙總 (DuckDB 與 MongoDB)"""
+
+import pytest
+from models.run_metrics import OUTCOME_DOWNLOAD_FAILED, OUTCOME_SKIPPED, RunMetricsRecorder
+
+def record(manager, failed=True):
+    recorder = RunMetricsRecorder(manager, "元大投信")
+    with recorder.phase("0050", "download"):
+        recorder.add("0050", bytes_downloaded=1024)
+    recorder.add("0050", rows_parsed=50)
+    recorder.add_phase("0050", "write", 0.5)
+    recorder.add_phase("0050", "write", 0.25)
+    recorder.add("0056", retries=2)
+    recorder.set_outcome("0056", OUTCOME_DOWNLOAD_FAILED if failed else OUTCOME_SKIPPED, "下載失敗" if failed else None)
+    return recorder
+
+def test_build_sums_counters_and_phases(manager):
+    metrics = record(manager).build()
+    run, etf_runs = metrics["run"], {etf_run["etf_ticker"]: etf_run for etf_run in metrics["etf_runs"]}
+    
+    assert (run["bytes_downloaded"], run["rows_parsed"], run["retries"]) == (1024, 50, 2)
+    assert run["outcome"] == "partial"
+    assert etf_runs["0050"]["outcome"] == "success"
+    assert etf_runs["0050"]["phases"]["write"] == pytest.approx(0.75)
+    assert etf_runs["0050"]["duration_seconds"] >= 0.75
+    assert record(manager, failed=False).build()["run"]["outcome"] == "success"
+
+def test_unknown_counter_is_rejected(manager):
+    with pytest.raises(ValueError):
+        RunMetricsRecorder(manager, "元大投信").add("0050", pages=1)
+
+def test_finish_writes_runs_and_accumulates_daily_rollup(any_manager):
+    first = record(any_manager).finish()
+    second = record(any_manager, failed=False).finish()
+    
+    runs = any_manager.get_runs("元大投信")
+    assert [run["run_id"] for run in runs] == [second["run_id"], first["run_id"]]
+    etf_runs = {etf_run["etf_ticker"]: etf_run for etf_run in any_manager.get_etf_runs(first["run_id"])}
+    assert etf_runs["0056"]["outcome"] == OUTCOME_DOWNLOAD_FAILED
+    assert etf_runs["0056"]["error"] == "下載失敗"
+    
+    rollup, = any_manager.get_daily_rollups("元大投信")
+    assert (rollup["runs"], rollup["etfs"], rollup["succeeded"], rollup["failed"]) == (2, 4, 3, 1)
+    assert (rollup["bytes_downloaded"], rollup["retries"]) == (2048, 4)
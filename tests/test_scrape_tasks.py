@@ -0,0 +1,152 @@
+"""抓取任務佇列與背景寫入完成後才結束任務"""
+
+import random
+import threading
+import pytest
+from models.base_store import (TASK_DONE, TASK_FAILED, TASK_PENDING, TASK_RUNNING, WRITE_FAILED,
+                               WRITE_QUARANTINED, scrape_task_id)
+
+ISSUER = "元大投信"
+RUN_DATE = "2025-01-02"
+
+def test_tasks_are_claimed_in_order_and_finished(store):
+    assert store.enqueue_scrape_tasks(ISSUER, RUN_DATE, ["0050", "0056"]) == 2
+    
+    first = store.claim_scrape_task(ISSUER, RUN_DATE, "w1", 60)
+    second = store.claim_scrape_task(ISSUER, RUN_DATE, "w2", 60)
+    assert (first['etf_ticker'], second['etf_ticker']) == ("0050", "0056")
+    assert store.claim_scrape_task(ISSUER, RUN_DATE, "w3", 60) is None
+    
+    # 只有持有租約的 worker 可以延長與結束任務
+    assert not store.heartbeat_scrape_task(first['task_id'], "w2", 60)
+    assert store.heartbeat_scrape_task(first['task_id'], "w1", 60)
+    assert not store.finish_scrape_task(first['task_id'], TASK_DONE, worker="w2")
+    assert store.finish_scrape_task(first['task_id'], TASK_DONE, worker="w1")
+    assert store.finish_scrape_task(second['task_id'], TASK_FAILED, "下載失敗", worker="w2")
+    
+    # 重新建立時只有失敗的任務改回 pending
+    assert store.enqueue_scrape_tasks(ISSUER, RUN_DATE, ["0050", "0056"]) == 1
+    statuses = {task['etf_ticker']: task['status'] for task in store.iter_scrape_tasks(ISSUER, RUN_DATE)}
+    assert statuses == {"0050": TASK_DONE, "0056": TASK_PENDING}
+
+def test_expired_lease_is_taken_over(store):
+    store.enqueue_scrape_tasks(ISSUER, RUN_DATE, ["0050"])
+    lost = store.claim_scrape_task(ISSUER, RUN_DATE, "w1", 0)
+    
+    task = store.claim_scrape_task(ISSUER, RUN_DATE, "w2", 60)
+    assert task['task_id'] == lost['task_id']
+    assert task['attempts'] == 2
+    assert not store.finish_scrape_task(lost['task_id'], TASK_DONE, worker="w1")
+
+CSV = """\
+日期: 2025/01/02
+商品代碼,商品名稱,商品數量,商品權重
+2330,台積電,1000,50.0
+2317,鴻海,500,50.0
+"""
+
+@pytest.fixture
+def scraper(manager, monkeypatch, tmp_path):
+    yuanta_etf_scraper = pytest.importorskip("yuanta_etf_scraper")
+    from models.holdings_writer import HoldingsWriteQueue
+    
+    csv_path = tmp_path / "0050.csv"
+    csv_path.write_text(CSV, encoding="utf-8")
+    monkeypatch.setattr(random, "uniform", lambda a, b: 0)
+    
+    writer = HoldingsWriteQueue(manager)
+    scraper = yuanta_etf_scraper.YuantaETFScraper(etf_manager=manager, writer=writer)
+    scraper.etf_list = ["0050"]
+    scraper.task_lease_seconds = 4
+    scraper.task_poll_seconds = 0.05
+    monkeypatch.setattr(scraper, "download_etf_data", lambda etf_code: str(csv_path))
+    yield scraper
+    writer.close()
+
+def test_task_stays_running_until_the_queued_write_lands(scraper, manager, monkeypatch):
+    release = threading.Event()
+    save = manager.write_holdings_snapshots
+    
+    def slow_save(snapshots):
+        release.wait(10)
+        return save(snapshots)
+    
+    monkeypatch.setattr(manager, "write_holdings_snapshots", slow_save)
+    
+    results = {}
+    run = threading.Thread(target=lambda: results.update(scraper.scrape_all_etfs(run_date=RUN_DATE)))
+    run.start()
+    try:
+        # 資料已排入佇列但尚未寫入：任務仍是執行中
+        for _ in range(100):
+            if scraper.writer.queue.unfinished_tasks:
+                break
+            run.join(0.05)
+        task, = manager.get_scrape_tasks(ISSUER, RUN_DATE)
+        assert task['status'] == TASK_RUNNING
+    finally:
+        release.set()
+        run.join(10)
+    
+    assert results == {"0050": "✅ 成功"}
+    task, = manager.get_scrape_tasks(ISSUER, RUN_DATE)
+    assert task['status'] == TASK_DONE
+    assert manager.get_holdings_count("0050", "2025-01-02") == 2
+
+def test_failed_write_fails_the_task(scraper, manager, monkeypatch):
+    monkeypatch.setattr(manager, "write_holdings_snapshots",
+                        lambda snapshots: {(s['etf_ticker'], s['date']): WRITE_FAILED for s in snapshots})
+    
+    results = scraper.scrape_all_etfs(run_date=RUN_DATE)
+    
+    assert results == {"0050": "❌ 寫入失敗"}
+    task = manager.get_scrape_tasks(ISSUER, RUN_DATE)[0]
+    assert task['status'] == TASK_FAILED
+    assert task['task_id'] == scrape_task_id(ISSUER, RUN_DATE, "0050")
+
+def test_quarantined_write_is_reported_like_a_synchronous_one(scraper, manager, monkeypatch):
+    from models.run_metrics import OUTCOME_QUARANTINED
+    monkeypatch.setattr(manager, "write_holdings_snapshots",
+                        lambda snapshots: {(s['etf_ticker'], s['date']): WRITE_QUARANTINED for s in snapshots})
+    
+    results = scraper.scrape_all_etfs(run_date=RUN_DATE)
+    
+    assert results == {"0050": "❌ 分析失敗"}
+    assert manager.get_scrape_tasks(ISSUER, RUN_DATE)[0]['status'] == TASK_FAILED
+    assert scraper.metrics.etf_runs["0050"]["outcome"] == OUTCOME_QUARANTINED
+
+def test_download_fails_when_the_download_dir_cannot_be_set(manager, monkeypatch):
+    yuanta_etf_scraper = pytest.importorskip("yuanta_etf_scraper")
+    
+    class Driver:
+        def execute_cdp_cmd(self, command, params):
+            raise RuntimeError("CDP 不支援")
+        
+        def get(self, url):
+            raise AssertionError("不應在共用目錄下載")
+        
+        def quit(self):
+            pass
+    
+    scraper = yuanta_etf_scraper.YuantaETFScraper(write_behind=False, etf_manager=manager)
+    scraper.max_retries = 2
+    scraper.retry_delay = 0
+    monkeypatch.setattr(scraper, "setup_chrome_driver", lambda attempt=1: Driver())
+    monkeypatch.setattr(yuanta_etf_scraper.time, "sleep", lambda seconds: None)
+    
+    assert scraper.download_etf_data("0050") is None
+    assert scraper.stats['failed_downloads'] == 1
+
+def test_claim_errors_are_logged_instead_of_raised(store, mongodb, monkeypatch):
+    from models.mongo_store import MongoHoldingsStore
+    
+    class BrokenCollection:
+        def __getattr__(self, name):
+            raise ConnectionError("連線中斷")
+    
+    mongo_store = MongoHoldingsStore(mongodb)
+    monkeypatch.setattr(mongodb, "scrape_tasks", BrokenCollection())
+    assert mongo_store.claim_scrape_task(ISSUER, RUN_DATE, "w1", 60) is None
+    
+    monkeypatch.setattr(store, "_cursor", lambda: BrokenCollection().cursor)
+    assert store.claim_scrape_task(ISSUER, RUN_DATE, "w1", 60) is None
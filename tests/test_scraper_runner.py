@@ -0,0 +1,52 @@
+"""排程器在行程內執行爬蟲時的逾時與執行鎖"""
+
+import threading
+import yuanta_etf_scraper
+from scraper_runner import InProcessScraperRunner
+from utils.run_lock import FileRunLock
+
+class SlowScraper:
+    """scrape_all_etfs 會等到 finish 被設定才結束"""
+    
+    finish = threading.Event()
+    
+    def __init__(self, **kwargs):
+        self.etf_list = ["0050"]
+    
+    def scrape_all_etfs(self):
+        self.finish.wait(10)
+        return {"0050": "✅ 成功"}
+
+def test_lock_is_held_until_a_timed_out_run_exits(monkeypatch, tmp_path):
+    SlowScraper.finish.clear()
+    monkeypatch.setattr(yuanta_etf_scraper, "YuantaETFScraper", SlowScraper)
+    runner = InProcessScraperRunner(timeout=0.2)
+    monkeypatch.setattr(runner, "_ensure_resources", lambda: None)
+    
+    lock = FileRunLock("yuanta_holdings", str(tmp_path))
+    assert lock.acquire()
+    assert runner.run(lock) is False
+    
+    # 逾時後執行緒仍在收尾，其他排程器取不到鎖
+    assert not FileRunLock("yuanta_holdings", str(tmp_path)).acquire()
+    assert runner._stop_event.is_set()
+    
+    SlowScraper.finish.set()
+    runner._thread.join(5)
+    other = FileRunLock("yuanta_holdings", str(tmp_path))
+    assert other.acquire()
+    other.release()
+
+def test_lock_is_released_after_a_normal_run(monkeypatch, tmp_path):
+    SlowScraper.finish.set()
+    monkeypatch.setattr(yuanta_etf_scraper, "YuantaETFScraper", SlowScraper)
+    runner = InProcessScraperRunner(timeout=5)
+    monkeypatch.setattr(runner, "_ensure_resources", lambda: None)
+    
+    lock = FileRunLock("yuanta_holdings", str(tmp_path))
+    assert lock.acquire()
+    assert runner.run(lock) is True
+    
+    other = FileRunLock("yuanta_holdings", str(tmp_path))
+    assert other.acquire()
+    other.release()
@@ -0,0 +1,24 @@
+"""股票→持有ETF 反向索引：寫入與強制重寫後的結果 (DuckDB 與 MongoDB)"""
+
+def holders(manager, stock_code, date=None):
+    """(ETF代號, 股數)，依權重由高到低"""
+    return [[(holder["etf_ticker"], holder["shares"]) for holder in day["holders"]]
+            for day in manager.get_holders(stock_code, date, date)]
+
+def test_rewrites_replace_an_etfs_entries(any_manager, make_holdings):
+    any_manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-02",
+         "holdings": make_holdings(("2330", 60.0, 1000), ("2454", 40.0, 500))},
+        {"etf_ticker": "0056", "date": "2025-01-02", "holdings": make_holdings(("2330", 100.0, 300))},
+        {"etf_ticker": "0050", "date": "2025-01-03",
+         "holdings": make_holdings(("2330", 60.0, 1000), ("2454", 40.0, 500))},
+    ])
+    assert holders(any_manager, "2330", "2025-01-02") == [[("0056", 300), ("0050", 1000)]]
+    
+    any_manager.save_holdings("0050", make_holdings(("2330", 90.0, 1500), ("2882", 10.0, 200)),
+                              "2025-01-02", force_update=True)
+    
+    assert holders(any_manager, "2330", "2025-01-02") == [[("0056", 300), ("0050", 1500)]]
+    assert holders(any_manager, "2454", "2025-01-02") == []
+    assert holders(any_manager, "2882") == [[("0050", 200)]]
+    assert [day["date"] for day in any_manager.get_holders("2454")] == ["2025-01-03"]
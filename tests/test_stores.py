@@ -0,0 +1,78 @@
+"""DuckDB 與 MongoDB 儲存後端的共同行為"""
+
+from models.base_store import WRITE_FAILED, WRITE_SKIPPED, WRITE_WRITTEN
+
+def snapshot(etf_ticker, date, holdings, force_update=False):
+    return {"etf_ticker": etf_ticker, "date": date, "holdings": holdings, "force_update": force_update}
+
+def test_write_skips_existing_snapshot_unless_forced(any_store, make_holdings):
+    first = make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))
+    assert any_store.write_holdings_snapshots([snapshot("0050", "2025-09-01", first)]) == {
+        ("0050", "2025-09-01"): WRITE_WRITTEN
+    }
+    
+    replacement = make_holdings(("2330", 100.0, 2000))
+    assert any_store.write_holdings_snapshots([snapshot("0050", "2025-09-01", replacement)]) == {
+        ("0050", "2025-09-01"): WRITE_SKIPPED
+    }
+    assert any_store.get_holdings_count("0050", "2025-09-01") == 2
+    
+    any_store.write_holdings_snapshots([snapshot("0050", "2025-09-01", replacement, force_update=True)])
+    holdings = list(any_store.iter_holdings("0050", "2025-09-01"))
+    assert [(h["stock_code"], h["shares"]) for h in holdings] == [("2330", 2000)]
+
+def test_empty_snapshot_fails(any_store):
+    assert any_store.write_holdings_snapshots([snapshot("0050", "2025-09-01", [])]) == {
+        ("0050", "2025-09-01"): WRITE_FAILED
+    }
+
+def test_dates_and_adjacent_dates(any_store, make_holdings):
+    holdings = make_holdings(("2330", 100.0, 1000))
+    any_store.write_holdings_snapshots([
+        snapshot("0050", "2025-09-01", holdings),
+        snapshot("0050", "2025-09-03", holdings),
+        snapshot("0056", "2025-09-02", holdings),
+    ])
+    
+    assert any_store.get_holdings_dates() == ["2025-09-01", "2025-09-02", "2025-09-03"]
+    assert any_store.get_holdings_dates(etf_ticker="0050") == ["2025-09-01", "2025-09-03"]
+    assert any_store.get_holdings_dates("2025-09-02", "2025-09-03", "0050") == ["2025-09-03"]
+    assert tuple(any_store.get_adjacent_dates("0050", "2025-09-02")) == ("2025-09-01", "2025-09-03")
+    assert any_store.get_latest_date("0056") == "2025-09-02"
+
+def test_history_streams_newest_first(any_store, make_holdings):
+    any_store.write_holdings_snapshots([
+        snapshot("0050", "2025-09-01", make_holdings(("2330", 100.0, 1000))),
+        snapshot("0050", "2025-09-02", make_holdings(("2330", 100.0, 1100))),
+    ])
+    history = list(any_store.iter_holdings_history("0050"))
+    assert [h["date"] for h in history] == ["2025-09-02", "2025-09-01"]
+
+def test_holders_reverse_index(any_store, make_holdings):
+    snapshots = [
+        snapshot("0050", "2025-09-01", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))),
+        snapshot("0056", "2025-09-01", make_holdings(("2330", 10.0, 300))),
+    ]
+    any_store.write_holdings_snapshots(snapshots)
+    assert any_store.refresh_stock_holders(snapshots)
+    
+    days = list(any_store.iter_holders("2330"))
+    assert len(days) == 1
+    assert [holder["etf_ticker"] for holder in days[0]["holders"]] == ["0050", "0056"]
+
+def test_keyset_paging_visits_every_row_once(any_store, make_holdings):
+    rows = [(f"{code}", 10.0, 100) for code in range(1101, 1111)]
+    any_store.write_holdings_snapshots([
+        snapshot("0050", "2025-09-01", make_holdings(*rows)),
+        snapshot("0050", "2025-09-02", make_holdings(*rows)),
+    ])
+    
+    seen, cursor = [], None
+    while True:
+        page, cursor = any_store.get_holdings_page("0050", after=cursor, limit=3)
+        seen.extend((h["date"], h["stock_code"]) for h in page)
+        if cursor is None:
+            break
+    
+    assert len(seen) == 20
+    assert len(set(seen)) == 20
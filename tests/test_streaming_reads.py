@@ -0,0 +1,59 @@
+"""ETFDataManager 串流讀取：排序、投影欄位與分頁 (DuckDB 與 MongoDB)"""
+
+import pytest
+
+HOLDING_FIELDS = {"etf_ticker", "date", "stock_code", "stock_name", "weight", "shares", "market_value"}
+
+@pytest.fixture
+def loaded(any_manager, make_holdings):
+    rows = [("2317", 40.0, 500), ("2330", 60.0, 1000)]
+    any_manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": date, "holdings": make_holdings(*rows)}
+        for date in ("2025-01-02", "2025-01-03", "2025-01-06")
+    ] + [{"etf_ticker": "0056", "date": "2025-01-03", "holdings": make_holdings(*rows)}])
+    return any_manager
+
+def test_holdings_stream_by_weight_without_storage_fields(loaded):
+    holdings = list(loaded.iter_holdings("0050", "2025-01-02"))
+    assert [h["stock_code"] for h in holdings] == ["2330", "2317"]
+    assert all(set(h) == HOLDING_FIELDS for h in holdings)
+
+def test_streams_filter_by_date(loaded):
+    assert {h["etf_ticker"] for h in loaded.iter_holdings_by_date("2025-01-03")} == {"0050", "0056"}
+    
+    history = list(loaded.iter_holdings_history("0050", "2025-01-03", "2025-01-06"))
+    assert [h["date"] for h in history] == ["2025-01-06", "2025-01-06", "2025-01-03", "2025-01-03"]
+
+def test_pages_respect_filters(loaded):
+    seen, cursor = [], None
+    while True:
+        page, cursor = loaded.get_holdings_page(start_date="2025-01-03", end_date="2025-01-03", after=cursor, limit=3)
+        seen.extend((h["etf_ticker"], h["stock_code"]) for h in page)
+        if cursor is None:
+            break
+    
+    assert sorted(seen) == [("0050", "2317"), ("0050", "2330"), ("0056", "2317"), ("0056", "2330")]
+
+def test_scraper_logs_stream_newest_first(any_manager):
+    for run in range(3):
+        any_manager.save_scraper_log("元大投信", "scrape", {"run": run})
+    
+    assert [log["details"]["run"] for log in any_manager.iter_scraper_logs("元大投信", limit=2)] == [2, 1]
+
+def test_scraper_logs_with_the_same_timestamp_keep_insert_order(any_manager, monkeypatch):
+    from datetime import datetime
+    import models.duckdb_store, models.mongo_store
+    # 凍結在現在時間，避免舊日期被 MongoDB 的日誌保存期限 (TTL) 清除
+    frozen = datetime.now().replace(microsecond=0)
+    
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return frozen
+    
+    for module in (models.duckdb_store, models.mongo_store):
+        monkeypatch.setattr(module, "datetime", FrozenDatetime)
+    for run in range(5):
+        any_manager.save_scraper_log("元大投信", "scrape", {"run": run})
+    
+    assert [log["details"]["run"] for log in any_manager.iter_scraper_logs("元大投信")] == [4, 3, 2, 1, 0]
@@ -0,0 +1,100 @@
+"""持股權重方塊：寫入、擴充容量、切片讀取與從儲存後端同步"""
+
+import threading
+import numpy as np
+import pytest
+import analytics.weight_cube as weight_cube
+from analytics.weight_cube import WeightCube
+from utils.run_lock import FileRunLock
+
+@pytest.fixture
+def cube(tmp_path, monkeypatch):
+    # 縮小擴充區塊，少量資料就會觸發擴充
+    monkeypatch.setattr(weight_cube, "DATE_BLOCK", 2)
+    monkeypatch.setattr(weight_cube, "ETF_BLOCK", 2)
+    monkeypatch.setattr(weight_cube, "STOCK_BLOCK", 2)
+    return WeightCube(str(tmp_path / "cube"))
+
+def test_growth_keeps_written_values(cube, make_holdings):
+    cube.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)))
+    cube.write_snapshot("0056", "2025-01-02", make_holdings(("2882", 100.0, 800)))
+    cube.write_snapshot("006208", "2025-01-03", make_holdings(("2330", 50.0, 900), ("2454", 50.0, 300)))
+    cube.write_snapshot("0050", "2025-01-06", make_holdings(("2330", 100.0, 1100)))
+    
+    assert cube.capacity == (4, 4, 4)
+    assert cube.trajectory("0050", "2330").tolist() == pytest.approx([60.0, 0.0, 100.0])
+    assert cube.trajectory("0050", "2330", "shares", start_date="2025-01-03").tolist() == [0, 1100]
+    assert cube.stock_slice("2882", "shares")[0].tolist() == [0, 800, 0]
+    
+    reopened = WeightCube(cube.root_dir)
+    assert reopened.view()["values"].shape == (3, 3, 4)
+    assert reopened.etf_frame("0050").columns.tolist() == ["2330", "2317"]
+
+def test_views_are_readonly_and_rewrites_replace(cube, make_holdings):
+    cube.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)))
+    cube.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 100.0, 2000)))
+    
+    values = cube.etf_slice("0050")
+    assert values.tolist() == [[100.0, 0.0]]
+    with pytest.raises(ValueError):
+        values[0, 0] = 1.0
+    with pytest.raises(ValueError):
+        cube.view("market_value")
+    assert cube.trajectory("0050", "9999") is None
+
+def test_earlier_dates_require_rebuild(cube, make_holdings):
+    cube.write_snapshot("0050", "2025-01-03", make_holdings(("2330", 100.0, 1000)))
+    assert cube.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 100.0, 1000))) is False
+    assert cube.dates == ["2025-01-03"]
+
+def test_writers_sharing_a_directory_keep_each_others_data(cube, make_holdings):
+    other = WeightCube(cube.root_dir)
+    cube.write_snapshot("0050", "2025-01-02", make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500)))
+    # other 開啟後未重新載入，寫入前會先讀取 cube 更新的 meta.json
+    other.write_snapshot("0056", "2025-01-02", make_holdings(("2882", 100.0, 800), ("2454", 0.0, 0)))
+    cube.write_snapshot("0050", "2025-01-03", make_holdings(("2330", 100.0, 1100)))
+    
+    reopened = WeightCube(cube.root_dir)
+    assert reopened.stock_codes == ["2330", "2317", "2882", "2454"]
+    assert reopened.stock_slice("2882", "shares")[:, reopened.etf_index["0056"]].tolist() == [800, 0]
+    assert reopened.trajectory("0050", "2330", "shares").tolist() == [1000, 1100]
+
+def test_write_waits_for_another_writer(cube, make_holdings):
+    holder = FileRunLock("writer", cube.root_dir)
+    assert holder.acquire()
+    writing = threading.Thread(
+        target=cube.write_snapshot, args=("0050", "2025-01-02", make_holdings(("2330", 100.0, 1000)))
+    )
+    writing.start()
+    writing.join(0.2)
+    assert writing.is_alive()
+    
+    holder.release()
+    writing.join(5)
+    assert cube.dates == ["2025-01-02"]
+
+def test_sync_and_rebuild_from_the_store(tmp_path, manager, make_holdings):
+    holdings = make_holdings(("2330", 60.0, 1000), ("2317", 40.0, 500))
+    manager.write_holdings_snapshots([
+        {"etf_ticker": etf, "date": date, "holdings": holdings}
+        for etf in ("0050", "0056") for date in ("2025-01-02", "2025-01-03")
+    ])
+    cube = WeightCube(str(tmp_path / "cube"), etf_manager=manager)
+    
+    assert cube.sync(end_date="2025-01-02") == 1
+    assert cube.sync() == 1
+    assert cube.sync() == 0
+    assert cube.view("shares")["values"].sum() == 4 * 1500
+    assert cube.rebuild(start_date="2025-01-03") == 1
+    assert cube.dates == ["2025-01-03"]
+
+def test_manager_updates_the_cube_on_write(monkeypatch, tmp_path, store, make_holdings):
+    from models.etf_data import ETFDataManager
+    monkeypatch.setenv("WEIGHT_CUBE_ENABLED", "true")
+    monkeypatch.setenv("WEIGHT_CUBE_DIR", str(tmp_path / "cube"))
+    manager = ETFDataManager(store=store, cache_size=0)
+    manager.write_holdings_snapshots([
+        {"etf_ticker": "0050", "date": "2025-01-02", "holdings": make_holdings(("2330", 100.0, 1000))}
+    ])
+    
+    assert np.asarray(manager.weight_cube.trajectory("0050", "2330")).tolist() == [100.0]
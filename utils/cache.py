@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+class TTLCache:
+    """容量與存活時間雙重限制的 LRU 快取 (執行緒安全)
+    
+    超過容量時淘汰最久未使用的項目，超過 ttl 秒的項目視為未命中
+    """
+    
+    def __init__(self, max_size: int = 256, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # 每次失效遞增，載入期間發生失效時不寫入舊結果
+        self._generation = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @property
+    def enabled(self) -> bool:
+        """容量為0時停用快取"""
+        return self.max_size > 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """取得快取值，未命中或已過期時回傳 default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any, generation: int = None):
+        """寫入快取值，指定 generation 時只在期間未發生失效才寫入"""
+        if not self.enabled:
+            return
+        
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], cache_none: bool = True) -> Any:
+        """讀取快取，未命中時呼叫 loader 載入並寫入"""
+        missing = object()
+        with self._lock:
+            generation = self._generation
+        
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            if value is not None or cache_none:
+                self.set(key, value, generation)
+        return value
+    
+    def invalidate(self, key: Hashable):
+        """移除單一項目"""
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+    
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """取得命中統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
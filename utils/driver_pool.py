@@ -0,0 +1,118 @@
+"""
+瀏覽器驅動池
+常駐的排程器在多次執行之間重複使用已啟動的 Chrome，不必每檔ETF重新啟動瀏覽器。
+借出前清除 cookie 並回到空白頁；發生錯誤的驅動以 release(driver, broken=True) 關閉不放回，
+使用超過 max_uses 次的驅動也會關閉，下次借出時重新建立。
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from utils.env import env_int
+from utils.logger import setup_logger
+
+class DriverPool:
+    """WebDriver 池，驅動由呼叫端提供的 factory 建立"""
+
+    def __init__(self, size: int = None, max_uses: int = None):
+        self.logger = setup_logger("driver_pool", "logs/driver_pool.log")
+        # 預設與抓取的工作執行緒數相同
+        self.size = size or env_int("DRIVER_POOL_SIZE", env_int("SCRAPER_WORKERS", 1))
+        self.max_uses = max_uses or env_int("DRIVER_MAX_USES", 50)
+        
+        self._idle: List[Any] = []
+        self._uses: Dict[int, int] = {}
+        self._in_use = 0
+        self._lock = threading.Condition()
+        self._closed = False
+    
+    def checkout(self, factory: Callable[[], Any], timeout: float = None) -> Optional[Any]:
+        """借出一個驅動，沒有閒置驅動時以 factory 建立，建立失敗回傳 None"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("驅動池已關閉")
+            if not self._lock.wait_for(lambda: self._idle or self._in_use < self.size or self._closed, timeout):
+                raise TimeoutError("等待瀏覽器驅動逾時")
+            if self._closed:
+                raise RuntimeError("驅動池已關閉")
+            self._in_use += 1
+            driver = self._idle.pop() if self._idle else None
+        
+        if driver is not None:
+            if self._reset(driver):
+                return driver
+            self._discard(driver)
+        
+        driver = factory()
+        if driver is None:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            return None
+        
+        with self._lock:
+            self._uses[id(driver)] = 0
+        return driver
+    
+    def release(self, driver: Any, broken: bool = False):
+        """歸還驅動，損壞或使用次數已滿的驅動直接關閉"""
+        if driver is None:
+            return
+        
+        with self._lock:
+            self._in_use -= 1
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+            keep = not broken and not self._closed and uses < self.max_uses
+            if keep:
+                self._idle.append(driver)
+            self._lock.notify()
+        
+        if not keep:
+            self._discard(driver)
+    
+    @contextmanager
+    def acquire(self, factory: Callable[[], Any], timeout: float = None):
+        """以 with 區塊借出驅動，區塊內發生例外時關閉該驅動"""
+        driver = self.checkout(factory, timeout)
+        if driver is None:
+            raise RuntimeError("無法建立瀏覽器驅動")
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken)
+    
+    def _reset(self, driver: Any) -> bool:
+        """清除上一次使用留下的狀態，驅動已失效時回傳 False"""
+        try:
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            self.logger.warning(f"瀏覽器驅動已失效，重新建立: {e}")
+            return False
+    
+    def _discard(self, driver: Any):
+        """關閉驅動"""
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    
+    def close(self):
+        """關閉所有閒置驅動，借出中的驅動在歸還時關閉"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        
+        for driver in idle:
+            self._discard(driver)
+        if idle:
+            self.logger.info(f"已關閉 {len(idle)} 個瀏覽器驅動")
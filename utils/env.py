@@ -0,0 +1,22 @@
+import os
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """讀取布林型環境變數"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def env_int(name: str, default: int) -> int:
+    """讀取整數型環境變數"""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+def env_float(name: str, default: float) -> float:
+    """讀取浮點數型環境變數"""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
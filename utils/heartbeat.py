@@ -0,0 +1,56 @@
+"""
+背景心跳
+持有租約期間在背景執行緒定期呼叫 renew 延長租約。renew 失敗 (回傳 False 或發生例外) 時持續重試，
+距上次成功延長已超過租約時間 (租約確實已過期，可能已被其他 worker 接手) 才設定 lost
+"""
+
+import threading
+import time
+from typing import Callable
+
+class Heartbeat:
+    """在 with 區塊內 (或 start 到 stop 之間) 每 interval 秒呼叫一次 renew"""
+    
+    def __init__(self, renew: Callable[[], bool], interval: float, lease_seconds: float = None,
+                 name: str = "heartbeat"):
+        """lease_seconds 為每次延長的租約長度，未指定時以 interval 計"""
+        self.renew = renew
+        self.interval = interval
+        self.lease_seconds = lease_seconds if lease_seconds is not None else interval
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+    
+    def _run(self):
+        """定期延長租約，租約過期後停止"""
+        deadline = time.monotonic() + self.lease_seconds
+        while not self._stop.wait(self.interval):
+            try:
+                renewed = self.renew()
+            except Exception:
+                renewed = False
+            
+            now = time.monotonic()
+            if renewed:
+                deadline = now + self.lease_seconds
+            elif now >= deadline:
+                self.lost.set()
+                return
+    
+    def start(self):
+        """開始定期延長租約"""
+        self._thread.start()
+    
+    def stop(self):
+        """停止延長租約，可重複呼叫"""
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
@@ -0,0 +1,169 @@
+"""
+跨行程執行鎖
+同一項工作 (例如元大ETF持股抓取) 同時只能有一個行程執行，避免多個排程器或手動執行
+同時寫入 downloads/yuanta 與資料庫。
+
+- file (預設): 以作業系統檔案鎖 (fcntl / msvcrt) 鎖住 RUN_LOCK_DIR 下的鎖檔，
+  行程結束或當機時由作業系統釋放，適合單機
+- mongodb: 在 run_locks 集合以租約 (find_one_and_update) 取得，租約 RUN_LOCK_TTL 秒後過期，
+  適合多台機器共用同一個資料庫。到期時間以資料庫伺服器的 $$NOW 計算，持有期間由背景心跳延長
+"""
+
+import json
+import os
+import socket
+from contextlib import contextmanager
+from datetime import datetime
+from utils.env import env_int
+from utils.heartbeat import Heartbeat
+from utils.logger import setup_logger
+
+RUN_LOCK_BACKENDS = ("file", "mongodb")
+
+def _owner_id() -> str:
+    """鎖的持有者識別 (主機名稱:PID)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class FileRunLock:
+    """以檔案鎖實作的執行鎖"""
+    
+    def __init__(self, key: str, lock_dir: str = None):
+        self.key = key
+        self.lock_dir = lock_dir or os.getenv("RUN_LOCK_DIR", "locks")
+        self.path = os.path.join(self.lock_dir, f"{key}.lock")
+        self._file = None
+    
+    def acquire(self, blocking: bool = False) -> bool:
+        """嘗試取得鎖，已被其他行程持有時立即回傳 False (blocking 時等待對方釋放)"""
+        if self._file is not None:
+            return True
+        
+        os.makedirs(self.lock_dir, exist_ok=True)
+        lock_file = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        
+        # 記錄持有者，方便排查
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(json.dumps({"owner": _owner_id(), "acquired_at": datetime.now().isoformat()}))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+    
+    def release(self):
+        """釋放鎖"""
+        if self._file is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+class MongoRunLock:
+    """以 MongoDB 租約實作的執行鎖，持有者當機時租約到期後可被接手"""
+    
+    def __init__(self, key: str, ttl: int = None, mongodb=None):
+        self.key = key
+        self.ttl = ttl or env_int("RUN_LOCK_TTL", 3600)
+        self.owner = _owner_id()
+        if mongodb is None:
+            from config.mongodb import get_mongodb_manager
+            mongodb = get_mongodb_manager()
+        self.collection = mongodb.run_locks
+        self.logger = setup_logger("run_lock", "logs/run_lock.log")
+        self.heartbeat = None
+    
+    def acquire(self) -> bool:
+        """租約不存在、已過期或由自己持有時取得 (並延長) 租約，取得後在背景定期延長"""
+        from pymongo.errors import DuplicateKeyError
+        
+        try:
+            self.collection.find_one_and_update(
+                {
+                    "_id": self.key,
+                    "$or": [
+                        # 以資料庫伺服器時間判斷是否過期，不受各機器時鐘與時區影響
+                        {"$expr": {"$lt": ["$expires_at", "$$NOW"]}},
+                        {"owner": self.owner}
+                    ]
+                },
+                [{
+                    "$set": {
+                        "owner": {"$literal": self.owner},
+                        "acquired_at": "$$NOW",
+                        "expires_at": {"$add": ["$$NOW", self.ttl * 1000]}
+                    }
+                }],
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # 租約由其他行程持有且未過期
+            return False
+        except Exception as e:
+            self.logger.error(f"取得執行鎖 {self.key} 失敗: {e}")
+            return False
+        
+        if self.heartbeat is None:
+            self.heartbeat = Heartbeat(self.renew, max(1, self.ttl // 4), lease_seconds=self.ttl,
+                                       name=f"run-lock-{self.key}")
+            self.heartbeat.start()
+        return True
+    
+    def renew(self) -> bool:
+        """延長自己持有的租約 (以資料庫伺服器時間計算到期時間)"""
+        try:
+            result = self.collection.update_one(
+                {"_id": self.key, "owner": self.owner},
+                [{"$set": {"expires_at": {"$add": ["$$NOW", self.ttl * 1000]}}}]
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            self.logger.error(f"延長執行鎖 {self.key} 失敗: {e}")
+            return False
+    
+    def release(self):
+        """停止延長並釋放自己持有的租約"""
+        if self.heartbeat is not None:
+            self.heartbeat.stop()
+            self.heartbeat = None
+        try:
+            self.collection.delete_one({"_id": self.key, "owner": self.owner})
+        except Exception as e:
+            self.logger.error(f"釋放執行鎖 {self.key} 失敗，租約將於到期後失效: {e}")
+
+def create_run_lock(key: str, backend: str = None):
+    """依 RUN_LOCK_BACKEND 建立執行鎖"""
+    backend = (backend or os.getenv("RUN_LOCK_BACKEND", "file")).strip().lower()
+    if backend not in RUN_LOCK_BACKENDS:
+        raise ValueError(f"未知的執行鎖後端: {backend}，可用: {', '.join(RUN_LOCK_BACKENDS)}")
+    if backend == "mongodb":
+        return MongoRunLock(key)
+    return FileRunLock(key)
+
+@contextmanager
+def run_lock(key: str, backend: str = None):
+    """with 區塊內持有執行鎖，回傳是否取得；未取得時區塊仍會執行，由呼叫端決定是否略過"""
+    lock = create_run_lock(key, backend)
+    acquired = lock.acquire()
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
@@ -7,6 +7,8 @@
 import os
 import time
 import re
+import socket
+import threading
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -16,24 +18,59 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 import pandas as pd
 from models.etf_data import ETFDataManager
+from models.holdings_writer import HoldingsWriteQueue
+from models.base_store import (TASK_DONE, TASK_FAILED, TASK_PENDING, TASK_RUNNING, WRITE_FAILED,
+                               WRITE_QUARANTINED)
+from models.run_metrics import (RunMetricsRecorder, OUTCOME_DOWNLOAD_FAILED, OUTCOME_PARSE_FAILED,
+                                OUTCOME_QUARANTINED, OUTCOME_SKIPPED, OUTCOME_SUCCESS, OUTCOME_WRITE_FAILED)
+from utils.env import env_flag, env_int
+from utils.heartbeat import Heartbeat
 from utils.logger import setup_logger
 
+# 元大ETF列表
+YUANTA_ETF_LIST = [
+    "0050", "0051", "0053", "0055", "0056", 
+    "006201", "006203", "00713", "00850", "00940"
+]
+
 class YuantaETFScraper:
     """元大ETF抓取器"""
     
-    def __init__(self):
+    def __init__(self, write_behind: bool = None, etf_manager: ETFDataManager = None,
+                 writer: HoldingsWriteQueue = None, driver_pool=None, stop_event=None):
+        """常駐排程器可傳入共用的 etf_manager、writer 與 driver_pool，在多次執行間重複使用"""
         self.logger = setup_logger("yuanta_scraper", "logs/yuanta_scraper.log")
-        self.etf_manager = ETFDataManager()
+        self.etf_manager = etf_manager or ETFDataManager()
+        
+        # 背景寫入佇列：下載下一檔ETF時同時寫入上一檔的資料
+        if write_behind is None:
+            write_behind = env_flag("HOLDINGS_WRITE_BEHIND", True)
+        if writer is None and write_behind:
+            writer = HoldingsWriteQueue(self.etf_manager)
+        self.writer = writer
+        
+        # 瀏覽器驅動池 (utils.driver_pool.DriverPool)，未提供時每次下載啟動新的瀏覽器
+        self.driver_pool = driver_pool
+        
+        # 設定後在下一檔ETF開始前停止 (執行逾時時由排程器設定)
+        self.stop_event = stop_event
+        
+        # 抓取任務租約：處理期間定期延長，行程失聯時租約過期，任務由其他 worker 接手
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.task_lease_seconds = env_int("SCRAPE_TASK_LEASE_SECONDS", 120)
+        self.task_poll_seconds = env_int("SCRAPE_TASK_POLL_SECONDS", 10)
+        
+        # 執行指標，每次 scrape_all_etfs 重新建立
+        self.issuer = "元大投信"
+        self.metrics = RunMetricsRecorder(self.etf_manager, self.issuer)
+        
         self.download_dir = os.path.join(os.getcwd(), "downloads", "yuanta")
         
         # 確保下載目錄存在
         os.makedirs(self.download_dir, exist_ok=True)
         
         # 元大ETF列表
-        self.etf_list = [
-            "0050", "0051", "0053", "0055", "0056", 
-            "006201", "006203", "00713", "00850", "00940"
-        ]
+        self.etf_list = list(YUANTA_ETF_LIST)
         
         # 基礎URL模板
         self.base_url = "https://www.yuantaetfs.com/product/detail/{}/ratio"
@@ -113,6 +150,22 @@ class YuantaETFScraper:
             self.logger.error(f"無法啟動Chrome驅動 (第{attempt}次嘗試): {e}")
             return None
     
+    def _get_driver(self, attempt=1):
+        """取得瀏覽器驅動，有驅動池時從池中借出"""
+        if self.driver_pool:
+            return self.driver_pool.checkout(lambda: self.setup_chrome_driver(attempt))
+        return self.setup_chrome_driver(attempt)
+    
+    def _release_driver(self, driver, broken=False):
+        """歸還或關閉瀏覽器驅動"""
+        if self.driver_pool:
+            self.driver_pool.release(driver, broken)
+            return
+        try:
+            driver.quit()
+        except:
+            pass
+    
     def extract_date_from_csv(self, lines):
         """從CSV第一行提取日期"""
         try:
@@ -129,17 +182,34 @@ class YuantaETFScraper:
             self.logger.error(f"提取日期時發生錯誤: {e}")
             return None
     
+    def _set_download_dir(self, driver, download_dir) -> bool:
+        """將瀏覽器的下載目錄切換到指定目錄 (同時處理多檔ETF時各自下載到獨立目錄)
+        
+        切換失敗時回傳 False，不退回共用的預設目錄，以免取到其他 worker 下載的檔案
+        """
+        try:
+            driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": download_dir})
+            return True
+        except Exception as e:
+            self.logger.warning(f"無法切換下載目錄: {e}")
+            return False
+    
     def download_etf_data(self, etf_code):
-        """下載單一ETF的數據 (帶重試機制)"""
+        """下載單一ETF的數據 (帶重試機制)，成功時回傳下載的檔案路徑，失敗回傳None"""
         url = self.base_url.format(etf_code)
+        etf_download_dir = os.path.join(self.download_dir, etf_code)
+        os.makedirs(etf_download_dir, exist_ok=True)
         
         for attempt in range(1, self.max_retries + 1):
             self.stats['total_attempts'] += 1
+            if attempt > 1:
+                self.metrics.add(etf_code, retries=1)
             self.logger.info(f"🔄 開始下載ETF {etf_code} 數據 (第{attempt}次嘗試)")
             
             driver = None
+            broken = False
             try:
-                driver = self.setup_chrome_driver(attempt)
+                driver = self._get_driver(attempt)
                 if not driver:
                     self.logger.error(f"❌ 無法啟動Chrome驅動 (第{attempt}次嘗試)")
                     if attempt < self.max_retries:
@@ -148,7 +218,20 @@ class YuantaETFScraper:
                         self.logger.info(f"⏳ 將在{delay}秒後重試...")
                         time.sleep(delay)
                         continue
-                    return False
+                    return None
+                
+                download_dir = etf_download_dir
+                if not self._set_download_dir(driver, download_dir):
+                    broken = True
+                    self.logger.error(f"❌ 無法切換ETF {etf_code} 的下載目錄 (第{attempt}次嘗試)")
+                    if attempt < self.max_retries:
+                        self.stats['retry_count'] += 1
+                        import random
+                        delay = self.retry_delay + random.randint(1, 3)
+                        self.logger.info(f"⏳ 將在{delay}秒後重試...")
+                        time.sleep(delay)
+                        continue
+                    break
                 
                 # 隨機延遲 (避免被檢測)
                 import random
@@ -192,10 +275,10 @@ class YuantaETFScraper:
                         self.logger.info(f"⏳ 將在{delay}秒後重試...")
                         time.sleep(delay)
                         continue
-                    return False
+                    return None
                 
                 # 記錄下載前的文件列表
-                files_before = set(os.listdir(self.download_dir))
+                files_before = set(os.listdir(download_dir))
                 
                 # 點擊按鈕
                 driver.execute_script("arguments[0].click();", excel_button)
@@ -208,13 +291,19 @@ class YuantaETFScraper:
                     time.sleep(check_interval)
                     waited_time += check_interval
                     
-                    files_after = set(os.listdir(self.download_dir))
-                    new_files = files_after - files_before
+                    files_after = set(os.listdir(download_dir))
+                    # 瀏覽器下載中的暫存檔不算完成
+                    new_files = [
+                        f for f in files_after - files_before
+                        if not f.endswith(('.crdownload', '.tmp'))
+                    ]
                     
                     if new_files:
                         self.logger.info(f"✅ ETF {etf_code} 下載完成，新文件: {new_files}")
                         self.stats['successful_downloads'] += 1
-                        return True
+                        file_path = max((os.path.join(download_dir, f) for f in new_files), key=os.path.getctime)
+                        self.metrics.add(etf_code, bytes_downloaded=os.path.getsize(file_path))
+                        return file_path
                     
                     if waited_time % 5 == 0:
                         self.logger.info(f"⏳ 等待下載中... ({waited_time}/{self.download_timeout}秒)")
@@ -227,9 +316,10 @@ class YuantaETFScraper:
                     self.logger.info(f"⏳ 將在{delay}秒後重試...")
                     time.sleep(delay)
                     continue
-                return False
-                
+                return None
+            
             except (WebDriverException, TimeoutException) as e:
+                broken = True
                 self.logger.error(f"❌ 下載ETF {etf_code} 時發生錯誤 (第{attempt}次嘗試): {e}")
                 if attempt < self.max_retries:
                     self.stats['retry_count'] += 1
@@ -238,8 +328,9 @@ class YuantaETFScraper:
                     self.logger.info(f"⏳ 將在{delay}秒後重試...")
                     time.sleep(delay)
                     continue
-                return False
+                return None
             except Exception as e:
+                broken = True
                 self.logger.error(f"❌ 下載ETF {etf_code} 時發生未知錯誤 (第{attempt}次嘗試): {e}")
                 if attempt < self.max_retries:
                     self.stats['retry_count'] += 1
@@ -248,20 +339,21 @@ class YuantaETFScraper:
                     self.logger.info(f"⏳ 將在{delay}秒後重試...")
                     time.sleep(delay)
                     continue
-                return False
+                return None
             finally:
                 if driver:
-                    try:
-                        driver.quit()
-                    except:
-                        pass
+                    self._release_driver(driver, broken)
         
         self.logger.error(f"❌ ETF {etf_code} 下載失敗，已達到最大重試次數 ({self.max_retries})")
         self.stats['failed_downloads'] += 1
-        return False
+        return None
     
-    def analyze_csv_file(self, file_path, etf_code):
-        """分析CSV文件並提取數據"""
+    def analyze_csv_file(self, file_path, etf_code, on_written=None):
+        """分析CSV文件並提取數據
+        
+        背景寫入時排入佇列即回傳 True，實際寫入完成後以寫入結果 (WRITE_*) 呼叫 on_written
+        """
+        parse_started = time.perf_counter()
         try:
             self.logger.info(f"分析文件: {file_path}")
             
@@ -285,6 +377,7 @@ class YuantaETFScraper:
             
             if stock_data_start is None:
                 self.logger.warning(f"未找到股票數據表格: {etf_code}")
+                self.metrics.set_outcome(etf_code, OUTCOME_PARSE_FAILED, "未找到股票數據表格")
                 return False
             
             # 提取股票數據
@@ -300,6 +393,7 @@ class YuantaETFScraper:
             
             if not stock_lines:
                 self.logger.warning(f"未找到股票數據: {etf_code}")
+                self.metrics.set_outcome(etf_code, OUTCOME_PARSE_FAILED, "未找到股票數據")
                 return False
             
             # 準備持股數據
@@ -315,76 +409,202 @@ class YuantaETFScraper:
                     }
                     holdings.append(holding)
             
+            self.metrics.add(etf_code, rows_parsed=len(holdings))
+            self.metrics.add_phase(etf_code, "parse", time.perf_counter() - parse_started)
+            
+            # 背景寫入：排入佇列後立即返回，重複檢查由批次寫入處理
+            if self.writer:
+                self.writer.submit(etf_code, holdings, date, on_done=on_written)
+                self.logger.info(f"ETF {etf_code} 已排入寫入佇列: {len(holdings)} 筆持股數據")
+                return True
+            
             # 檢查重複數據
             duplicate_check = self.etf_manager.check_duplicate_holdings(etf_code, holdings, date)
             self.logger.info(f"ETF {etf_code} 重複檢查: {duplicate_check['message']}")
             
             if duplicate_check['is_duplicate']:
                 self.logger.info(f"ETF {etf_code} 數據重複，跳過保存")
+                self.metrics.set_outcome(etf_code, OUTCOME_SKIPPED)
                 return True
             
             # 保存到MongoDB
-            success = self.etf_manager.save_holdings(etf_code, holdings, date)
+            with self.metrics.phase(etf_code, "write"):
+                status = self.etf_manager.write_holdings_snapshots([{
+                    "etf_ticker": etf_code,
+                    "holdings": holdings,
+                    "date": date
+                }]).get((etf_code, date), WRITE_FAILED)
             
-            if success:
+            if status == WRITE_QUARANTINED:
+                self.logger.warning(f"ETF {etf_code} 數據未通過寫入前檢查，已移至隔離區")
+                self.metrics.set_outcome(etf_code, OUTCOME_QUARANTINED, "未通過寫入前檢查")
+                return False
+            elif status != WRITE_FAILED:
                 self.logger.info(f"ETF {etf_code} 數據保存成功: {len(holdings)} 筆持股數據")
+                self.metrics.set_outcome(etf_code, OUTCOME_SUCCESS)
                 return True
             else:
                 self.logger.error(f"ETF {etf_code} 數據保存失敗")
+                self.metrics.set_outcome(etf_code, OUTCOME_WRITE_FAILED, "數據保存失敗")
                 return False
-                
+        
         except Exception as e:
             self.logger.error(f"分析ETF {etf_code} 文件時發生錯誤: {e}")
+            self.metrics.set_outcome(etf_code, OUTCOME_PARSE_FAILED, str(e))
             return False
     
-    def scrape_all_etfs(self):
-        """抓取所有ETF數據 (帶重試機制)"""
-        self.logger.info("🚀 開始抓取所有元大ETF數據")
+    def process_etf(self, etf_code, on_written=None):
+        """下載並分析一檔ETF，回傳結果描述 (背景寫入時的 on_written 見 analyze_csv_file)"""
+        etf_start_time = time.time()
         
-        results = {}
-        total_start_time = time.time()
+        # 下載數據 (已包含重試機制)
+        with self.metrics.phase(etf_code, "download"):
+            downloaded_file = self.download_etf_data(etf_code)
         
-        for i, etf_code in enumerate(self.etf_list, 1):
-            self.logger.info(f"📊 處理ETF {etf_code} ({i}/{len(self.etf_list)})")
-            
-            etf_start_time = time.time()
-            
-            # 下載數據 (已包含重試機制)
-            download_success = self.download_etf_data(etf_code)
-            
-            if download_success:
-                # 找到最新下載的文件
-                files = os.listdir(self.download_dir)
-                csv_files = [f for f in files if f.endswith('.csv')]
+        if downloaded_file:
+            if downloaded_file.endswith('.csv'):
+                # 分析文件
+                analysis_success = self.analyze_csv_file(downloaded_file, etf_code, on_written)
                 
-                if csv_files:
-                    latest_file = max([os.path.join(self.download_dir, f) for f in csv_files], 
-                                     key=os.path.getctime)
-                    
-                    # 分析文件
-                    analysis_success = self.analyze_csv_file(latest_file, etf_code)
-                    
-                    if analysis_success:
-                        results[etf_code] = "✅ 成功"
-                        self.logger.info(f"✅ ETF {etf_code} 處理完成")
-                    else:
-                        results[etf_code] = "❌ 分析失敗"
-                        self.logger.error(f"❌ ETF {etf_code} 分析失敗")
+                if analysis_success:
+                    status = "✅ 成功"
+                    self.logger.info(f"✅ ETF {etf_code} 處理完成")
                 else:
-                    results[etf_code] = "❌ 文件未找到"
-                    self.logger.error(f"❌ ETF {etf_code} 下載文件未找到")
+                    status = "❌ 分析失敗"
+                    self.logger.error(f"❌ ETF {etf_code} 分析失敗")
             else:
-                results[etf_code] = "❌ 下載失敗"
-                self.logger.error(f"❌ ETF {etf_code} 下載失敗")
+                status = "❌ 文件未找到"
+                self.logger.error(f"❌ ETF {etf_code} 下載文件未找到")
+                self.metrics.set_outcome(etf_code, OUTCOME_DOWNLOAD_FAILED, f"非CSV文件: {downloaded_file}")
+        else:
+            status = "❌ 下載失敗"
+            self.logger.error(f"❌ ETF {etf_code} 下載失敗")
+            self.metrics.set_outcome(etf_code, OUTCOME_DOWNLOAD_FAILED, "已達到最大重試次數")
+        
+        etf_time = time.time() - etf_start_time
+        self.logger.info(f"⏱️ ETF {etf_code} 處理耗時: {etf_time:.2f}秒")
+        return status
+    
+    def _work(self, run_date, results, write_failures):
+        """工作執行緒：持續取出任務直到沒有待執行與執行中的任務，或要求停止
+        
+        其他 worker 仍持有任務時會等待，對方失聯 (租約過期) 時接手其任務
+        """
+        worker = f"{self.worker_id}/{threading.current_thread().name}"
+        while self.stop_event is None or not self.stop_event.is_set():
+            task = self.etf_manager.claim_scrape_task(self.issuer, run_date, worker, self.task_lease_seconds)
+            if task is None:
+                # 領取失敗 (例如資料庫暫時無法連線) 時仍有 pending 任務，稍後重試
+                if not any(self.etf_manager.get_scrape_tasks(self.issuer, run_date, status)
+                           for status in (TASK_RUNNING, TASK_PENDING)):
+                    return
+                time.sleep(self.task_poll_seconds)
+                continue
+            
+            etf_code = task['etf_ticker']
+            self.logger.info(f"📊 處理ETF {etf_code} (第{task['attempts']}次執行)")
+            heartbeat = Heartbeat(
+                # 背景寫入時心跳會延續到下一個任務開始之後，task_id 需在此綁定
+                lambda task_id=task['task_id']: self.etf_manager.heartbeat_scrape_task(
+                    task_id, worker, self.task_lease_seconds),
+                max(1, self.task_lease_seconds // 4),
+                lease_seconds=self.task_lease_seconds,
+                name=f"{threading.current_thread().name}-heartbeat"
+            )
+            
+            def on_written(write_status, task=task, heartbeat=heartbeat):
+                """背景寫入完成 (在寫入執行緒)：依實際寫入結果結束任務，被隔離的快照與同步寫入相同處理"""
+                etf_code = task['etf_ticker']
+                if write_status == WRITE_QUARANTINED:
+                    status = "❌ 分析失敗"
+                    self.logger.warning(f"ETF {etf_code} 數據未通過寫入前檢查，已移至隔離區")
+                    self.metrics.set_outcome(etf_code, OUTCOME_QUARANTINED, "未通過寫入前檢查")
+                elif write_status == WRITE_FAILED:
+                    status = "❌ 寫入失敗"
+                    self.logger.error(f"❌ ETF {etf_code} 寫入MongoDB失敗")
+                    self.metrics.set_outcome(etf_code, OUTCOME_WRITE_FAILED, "背景寫入失敗")
+                else:
+                    status = "✅ 成功"
+                if "✅" not in status:
+                    write_failures[etf_code] = status
+                self._finish_task(task, worker, heartbeat, status)
+            
+            heartbeat.start()
+            try:
+                status = self.process_etf(etf_code, on_written)
+            except Exception as e:
+                status = f"❌ 未預期的錯誤: {e}"
+                self.logger.error(f"❌ ETF {etf_code} 處理時發生未預期的錯誤: {e}")
             
-            etf_time = time.time() - etf_start_time
-            self.logger.info(f"⏱️ ETF {etf_code} 處理耗時: {etf_time:.2f}秒")
+            results[etf_code] = status
+            # 背景寫入時資料只是排入佇列，任務保持執行中並持續延長租約，寫入完成後由 on_written 結束
+            if not (self.writer and "✅" in status):
+                self._finish_task(task, worker, heartbeat, status)
             
-        # 避免請求過於頻繁 (隨機延遲)
-        if i < len(self.etf_list):
+            # 避免請求過於頻繁 (隨機延遲)
             import random
-            delay = random.uniform(2, 5)
-            time.sleep(delay)
+            time.sleep(random.uniform(2, 5))
+    
+    def _finish_task(self, task, worker, heartbeat, status):
+        """停止心跳並依結果把任務標記為完成或失敗"""
+        heartbeat.stop()
+        if "✅" in status:
+            finished = self.etf_manager.finish_scrape_task(task['task_id'], TASK_DONE, worker=worker)
+        else:
+            finished = self.etf_manager.finish_scrape_task(task['task_id'], TASK_FAILED, status, worker=worker)
+        if not finished or heartbeat.lost.is_set():
+            self.logger.warning(f"⚠️ ETF {task['etf_ticker']} 的任務租約已被其他 worker 接手，本次結果不更新任務狀態")
+    
+    def scrape_all_etfs(self, workers=None, enqueue=True, run_date=None):
+        """抓取所有ETF數據 (帶重試機制)
+        
+        每檔ETF是一個抓取任務，狀態存在資料庫；同一天重跑時只處理失敗或尚未完成的ETF。
+        workers 個執行緒同時處理 (預設 SCRAPER_WORKERS)，各自下載到獨立目錄。
+        enqueue=False 時只處理已建立的任務 (多台機器分散執行時，由 scrape_worker.py 使用)
+        """
+        self.logger.info("🚀 開始抓取所有元大ETF數據")
+        self.metrics = RunMetricsRecorder(self.etf_manager, self.issuer)
+        
+        results = {}
+        write_failures = {}
+        total_start_time = time.time()
+        run_date = run_date or datetime.now().strftime('%Y-%m-%d')
+        
+        if enqueue:
+            pending = self.etf_manager.enqueue_scrape_tasks(self.issuer, run_date, self.etf_list)
+            if pending < 0:
+                self.logger.error("❌ 無法建立抓取任務，請檢查資料庫連線")
+                return results
+        else:
+            pending = len(self.etf_manager.get_scrape_tasks(self.issuer, run_date, TASK_PENDING))
+        if pending < len(self.etf_list):
+            self.logger.info(f"📋 今日已完成或處理中 {len(self.etf_list) - pending} 檔，本次處理其餘 {pending} 檔")
+        
+        workers = max(1, min(workers or env_int("SCRAPER_WORKERS", 1), pending or 1))
+        threads = [
+            threading.Thread(target=self._work, args=(run_date, results, write_failures), name=f"scraper-worker-{i}")
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        if self.stop_event is not None and self.stop_event.is_set():
+            self.logger.warning("⏹️ 已要求停止，未執行的ETF保留在任務佇列，下次執行時繼續")
+        
+        # 等待背景寫入完成 (任務狀態已由各任務的 on_written 更新)，寫入失敗或被隔離的ETF更新結果
+        if self.writer:
+            self.writer.flush()
+            results.update(write_failures)
+        
+        # 先前已完成或因停止而未執行的ETF
+        for task in self.etf_manager.get_scrape_tasks(self.issuer, run_date):
+            if task['etf_ticker'] not in results:
+                if task['status'] == TASK_DONE:
+                    results[task['etf_ticker']] = "✅ 成功 (先前或其他 worker 已完成)"
+                else:
+                    results[task['etf_ticker']] = "⏸️ 未執行"
         
         total_time = time.time() - total_start_time
         
@@ -415,6 +635,9 @@ class YuantaETFScraper:
         
         self.logger.info("=" * 60)
         
+        # 執行指標一次寫入
+        self.metrics.finish()
+        
         return results
 
 def main():